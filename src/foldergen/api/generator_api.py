@@ -1,5 +1,7 @@
 from pathlib import Path
+from typing import Optional
 from .plan_api import make_plan
+from ..core.events import RunObserver
 from ..core.fs_ops import apply_plan
 from ..core.models import BuildPlan
 
@@ -7,21 +9,27 @@ def preview(
     template_path: str | Path,
     base_dir: str | Path,
     vars_path: str | Path,
+    *,
+    observer: Optional[RunObserver] = None,
 ) -> BuildPlan:
-    return make_plan(template_path, base_dir, vars_path)
+    return make_plan(template_path, base_dir, vars_path, observer=observer)
 
 def simulate(
     template_path: str | Path,
     base_dir: str | Path,
     vars_path: str | Path,
+    *,
+    observer: Optional[RunObserver] = None,
 ) -> None:
-    plan = make_plan(template_path, base_dir, vars_path)
-    apply_plan(plan, simulate=True)
+    plan = make_plan(template_path, base_dir, vars_path, observer=observer)
+    apply_plan(plan, simulate=True, observer=observer)
 
 def build(
     template_path: str | Path,
     base_dir: str | Path,
     vars_path: str | Path,
+    *,
+    observer: Optional[RunObserver] = None,
 ) -> None:
-    plan = make_plan(template_path, base_dir, vars_path)
-    apply_plan(plan, simulate=False)
+    plan = make_plan(template_path, base_dir, vars_path, observer=observer)
+    apply_plan(plan, simulate=False, observer=observer)
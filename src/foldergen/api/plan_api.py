@@ -1,28 +1,57 @@
 from __future__ import annotations
 
 import os
-import json
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional, Tuple
 from pathlib import Path
-from ..core.validator import validate_template_dict, find_missing_vars
-from ..core.plan_builder import build_plan
-from ..core.models import BuildPlan
+from ..core import json_io
+from ..core.events import RunObserver, observed_stats
+from ..core.validator import analyze_template
+from ..core.plan_builder import build_plan, iter_plan_items
+from ..core.models import BuildPlan, BuildPlanItem
+from ..core.stats import RunStats, phase
 
 
 def load_json(path: str | Path) -> Dict[str, Any]:
     if not os.path.isfile(path):
         raise FileNotFoundError(f"--vars should be a file, got: {path}")
 
-    with open(path, "r", encoding="utf-8") as fr:
-        return json.load(fr)
+    return json_io.load_file(path)
+
+
+def _load_checked(template_path: str | Path, vars_path: str | Path, stats: Optional[RunStats]):
+    with phase(stats, "load"):
+        template = load_json(template_path)
+        context: Dict[str, Any] = load_json(vars_path)
+    with phase(stats, "validate"):
+        analysis = analyze_template(template, context,
+                                    source_root=os.path.dirname(os.path.abspath(template_path)))
+    if not analysis.valid:
+        raise ValueError(analysis.errors[0])
+    if analysis.missing_vars:
+        raise KeyError(f"Missing variables in context: {sorted(analysis.missing_vars)}")
+    return template, context, analysis
 
 
 def make_plan(template_path: str | Path, base_dir: str | Path, vars_path: str | Path, *,
-              max_expand: int = 50_000) -> BuildPlan:
-    template = load_json(template_path)
-    context: Dict[str, Any] = load_json(vars_path)
-    validate_template_dict(template)
-    missing = find_missing_vars(template, context)
-    if missing:
-        raise KeyError(f"Missing variables in context: {sorted(missing)}")
-    return build_plan(template, str(base_dir), context, max_expand=max_expand)
+              max_expand: int = 50_000, stats: Optional[RunStats] = None,
+              shard: Optional[Tuple[int, int]] = None, jobs: Optional[int] = None,
+              observer: Optional[RunObserver] = None) -> BuildPlan:
+    """observer：load / validate / plan 阶段结束与计划条目（按批）的回调，见 core.events.RunObserver。"""
+    stats = observed_stats(stats, observer)
+    template, context, analysis = _load_checked(template_path, vars_path, stats)
+    plan = build_plan(template, str(base_dir), context, max_expand=max_expand, stats=stats, shard=shard,
+                      source_root=os.path.dirname(os.path.abspath(template_path)), jobs=jobs, observer=observer)
+    plan.analysis = analysis  # 供 --warn-unused-vars 等复用，无需重新读盘/遍历
+    return plan
+
+
+def iter_plan(template_path: str | Path, base_dir: str | Path, vars_path: str | Path, *,
+              max_expand: int = 50_000, stats: Optional[RunStats] = None,
+              shard: Optional[Tuple[int, int]] = None, jobs: Optional[int] = None,
+              observer: Optional[RunObserver] = None) -> Iterator[BuildPlanItem]:
+    """与 make_plan 相同的加载与校验，但按模板顺序惰性产出条目（可提前停止）。"""
+    stats = observed_stats(stats, observer)
+    template, context, _ = _load_checked(template_path, vars_path, stats)
+    return iter_plan_items(template, str(base_dir), context, max_expand=max_expand, stats=stats, shard=shard,
+                           source_root=os.path.dirname(os.path.abspath(template_path)), jobs=jobs,
+                           observer=observer)
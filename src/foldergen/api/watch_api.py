@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from .plan_api import _load_checked
+from ..core.models import BuildPlan
+from ..core.path_table import PathTable, StatusIndex
+from ..core.plan_builder import NodeRenderCache, build_plan
+from ..core.watch import DirSnapshot
+
+
+@dataclass
+class WatchUpdate:
+    """一轮轮询的结果：是否需要重绘，以及本轮增量工作量（用于状态行）。"""
+    changed: bool = False
+    replanned: bool = False
+    nodes_rendered: int = 0  # 重新展开的模板节点数
+    nodes_reused: int = 0  # 命中缓存的模板节点数
+    dirs_rescanned: int = 0  # 重新列出/删除的目录数
+    items_reclassified: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None  # 模板/变量暂时无效（编辑中途）时的错误；保留上一次的计划
+
+
+@dataclass
+class WatchSession:
+    """
+    watch 命令的增量状态：
+    - 模板/变量文件按 (mtime, size) 轮询，变化时重新加载，只重新展开内容变化的节点（NodeRenderCache）；
+    - base 目录用 DirSnapshot 增量刷新，只对子项发生变化的目录下的计划条目重新判定状态。
+    """
+    template_path: str
+    vars_path: str
+    base_dir: str
+    max_expand: int = 50_000
+    follow_symlinks: bool = False
+    plan: BuildPlan = field(default_factory=BuildPlan)
+    status: StatusIndex = field(default_factory=lambda: StatusIndex(PathTable()))
+
+    def __post_init__(self):
+        self.base_dir = os.path.abspath(self.base_dir)  # 计划路径与快照路径统一为绝对路径
+        self._cache = NodeRenderCache()
+        self._snapshot = DirSnapshot(self.base_dir, follow_symlinks=self.follow_symlinks)
+        self._sigs: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._by_parent: Dict[str, List[Tuple[int, str]]] = {}  # 父目录 -> [(计划路径 ID, 类型)]
+        self._started = False
+
+    def _file_sig(self, path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _inputs_changed(self) -> bool:
+        changed = False
+        for p in (self.template_path, self.vars_path):
+            sig = self._file_sig(p)
+            if self._sigs.get(p, ()) != sig:
+                self._sigs[p] = sig
+                changed = True
+        return changed
+
+    def _replan(self, upd: WatchUpdate) -> None:
+        template, context, analysis = _load_checked(self.template_path, self.vars_path, None)
+        plan = build_plan(template, str(self.base_dir), context, max_expand=self.max_expand,
+                          source_root=os.path.dirname(os.path.abspath(self.template_path)),
+                          node_cache=self._cache, analysis=analysis)
+        plan.analysis = analysis
+        upd.nodes_rendered, upd.nodes_reused = self._cache.misses, self._cache.hits
+        self._cache.prune()
+        self.plan = plan
+        self._by_parent = {}
+        table = PathTable()
+        for it in plan.items:
+            pid = table.intern(it.path)
+            self._by_parent.setdefault(os.path.dirname(table.paths[pid]), []).append((pid, it.type))
+        self.status = StatusIndex(table)
+        upd.replanned = True
+
+    def _classify(self, pid: int, typ: str) -> str:
+        found = self._snapshot.kind(self.status.table.paths[pid])
+        if found is None:
+            return "missing"
+        return "existing" if found == typ else "conflict"
+
+    def poll(self) -> WatchUpdate:
+        t0 = time.perf_counter()
+        upd = WatchUpdate()
+        if self._inputs_changed():
+            try:
+                self._replan(upd)
+            except (OSError, ValueError, KeyError) as e:
+                upd.error = str(e)  # JSON 写到一半等情况：保留上一次的计划，等下次保存
+                upd.changed = True
+        if not self._started:
+            touched = self._snapshot.scan()
+            self._started = True
+        else:
+            touched = self._snapshot.refresh()
+        upd.dirs_rescanned = len(touched)
+
+        if upd.replanned:
+            # 计划变了：全部重新判定（纯集合查找，不发起系统调用）
+            for entries in self._by_parent.values():
+                for pid, typ in entries:
+                    self.status.set(pid, self._classify(pid, typ))
+            upd.items_reclassified = len(self.status.table)
+        else:
+            # 只重新判定子项发生变化的目录下的计划条目
+            for d in touched:
+                for pid, typ in self._by_parent.get(d, ()):
+                    self.status.set(pid, self._classify(pid, typ))
+                    upd.items_reclassified += 1
+        upd.changed = upd.changed or upd.replanned or bool(touched)
+        upd.seconds = time.perf_counter() - t0
+        return upd
@@ -1,15 +1,108 @@
+import io
 import json
-from typing import List
+import os
+from typing import List, Optional
 
 import click
 from pathlib import Path
-from ..api import plan_api, generator_api
-from ..core.checker import audit_filesystem
+from ..api import plan_api
+from ..core import json_io
+from ..core.checker import audit_fail_fast, audit_filesystem
+from ..core.fs_ops import apply_plan, apply_plan_atomic
+from ..core.manifest import iter_manifest
+from ..core.models import BuildPlan
+from ..core.path_table import PathTable, StatusIndex
+from ..core.report_io import select_sections, summarize_subtrees, write_report_json, write_report_jsonl
+from ..core.stats import RunStats, phase
+from ..core.tree_view import TreeNode, build_trie, iter_tree_lines
 
 
 @click.group(help="Generate folder structures from template strings.")
-def main():
-    pass
+@click.option("--stats", "show_stats", is_flag=True,
+              help="Print per-phase wall time, item/syscall counts and peak memory to stderr.")
+@click.option("--stats-json", "stats_json", type=click.Path(dir_okay=False), default=None,
+              help="Write per-phase stats as JSON to this file.")
+@click.option("--stats-memory", is_flag=True,
+              help="Measure per-phase peak Python heap with tracemalloc (slower; default reports RSS high-water).")
+@click.option("--profile", "profile_path", type=click.Path(dir_okay=False), default=None,
+              help="Dump a cProfile/pstats file of the whole command to this path.")
+@click.option("--json-backend", type=click.Choice(json_io.BACKENDS), default="auto", show_default=True,
+              envvar="FOLDERGEN_JSON_BACKEND",
+              help="JSON encoder/decoder: orjson if installed (auto), or force orjson / the stdlib json module.")
+@click.pass_context
+def main(ctx, show_stats, stats_json, stats_memory, profile_path, json_backend):
+    try:
+        json_io.set_backend(json_backend)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--json-backend")
+    if show_stats or stats_json or stats_memory:
+        stats = RunStats(trace_memory=stats_memory)
+        ctx.obj = stats
+        ctx.call_on_close(lambda: _report_stats(stats, show_stats, stats_json))
+    if profile_path:
+        import cProfile
+        prof = cProfile.Profile()
+
+        def _dump_profile():
+            prof.disable()
+            Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(profile_path)
+            click.echo(f"Profile written to: {profile_path}", err=True)
+
+        ctx.call_on_close(_dump_profile)
+        prof.enable()
+
+
+def _run_stats() -> Optional[RunStats]:
+    # 子命令共享 group 上创建的 RunStats（未开启统计时为 None）
+    ctx = click.get_current_context(silent=True)
+    return ctx.obj if ctx is not None else None
+
+
+def _parse_shard(ctx, param, value):
+    # "--shard 2/4" -> (2, 4)；i 从 1 开始
+    if value is None:
+        return None
+    try:
+        i, n = (int(x) for x in value.split("/", 1))
+    except Exception:
+        raise click.BadParameter("expected i/N, e.g. 1/4")
+    if n < 1 or not 1 <= i <= n:
+        raise click.BadParameter("expected 1 <= i <= N")
+    return i, n
+
+
+_shard_option = click.option(
+    "--shard", callback=_parse_shard, default=None, metavar="i/N",
+    help="Only process the i-th of N balanced, contiguous slices of the plan (1-based).")
+
+_compact_option = click.option(
+    "--compact", is_flag=True, help="Write JSON/JSONL without indentation or spaces (smaller, faster to write).")
+
+_plan_jobs_option = click.option(
+    "--plan-jobs", type=click.IntRange(min=0), default=1, show_default=True,
+    help="Worker processes for template expansion (0 = all CPUs); the plan order is unchanged.")
+
+
+def _check_plan_source(template_path, vars_path, from_manifest, shard=None) -> None:
+    # 计划来源二选一：--template/--vars 展开，或 --from-manifest 读取现成清单
+    if from_manifest:
+        if template_path or vars_path:
+            raise click.UsageError("--from-manifest cannot be combined with --template/--vars.")
+        if shard:
+            raise click.UsageError("--shard only applies to template expansion; shard the manifest instead.")
+    elif not (template_path and vars_path):
+        raise click.UsageError("Missing --template/--vars (or use --from-manifest).")
+
+
+def _report_stats(stats: RunStats, show: bool, json_path: Optional[str]) -> None:
+    if show:
+        click.echo(stats.format_table(), err=True)
+    if json_path:
+        Path(json_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(json_path, "w", encoding="utf-8") as fw:
+            json.dump(stats.to_dict(), fw, ensure_ascii=False, indent=2)
+        click.echo(f"Stats written to: {json_path}", err=True)
 
 
 @main.command(help="Show build plan or export a manifest.")
@@ -26,6 +119,8 @@ def main():
 @click.option("--with-status", is_flag=True,
               help="Include status (existing/missing/conflict/planned) and name issues in manifest.")
 @click.option("--warn-unused-vars", is_flag=True, help="Warn if keys in --vars are not used by the template.")
+@click.option("--warn-case-collisions", is_flag=True,
+              help="Warn about sibling paths that differ only by case (e.g. Docs vs docs), on any host OS.")
 @click.option("--max-expand", type=int, default=50000, show_default=True,
               help="Maximum allowed generator expansion per node.")
 @click.option("--portable",
@@ -33,46 +128,56 @@ def main():
               default="auto", show_default=True)
 @click.option("--max-path-len", default=240, show_default=True, type=int)
 @click.option("--follow-symlinks/--no-follow-symlinks", default=False, show_default=True)
+@_shard_option
+@_plan_jobs_option
+@_compact_option
 def plan(template_path, vars_path, base_dir, relative, export_manifest, manifest_format,
-         with_status, portable, max_path_len, follow_symlinks, warn_unused_vars, max_expand, ):
-    p = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand)
+         with_status, portable, max_path_len, follow_symlinks, warn_unused_vars, warn_case_collisions, max_expand,
+         shard, plan_jobs, compact):
+    stats = _run_stats()
+    p = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand, stats=stats, shard=shard,
+                           jobs=plan_jobs)
     # 未使用变量警告
     if warn_unused_vars:
-        from ..api import plan_api as _pa
-        template = _pa.load_json(template_path)
-        ctx = _pa.load_json(vars_path)
-        from ..core.validator import find_unused_vars
-        unused = sorted(find_unused_vars(template, ctx))
+        unused = sorted(p.analysis.unused_vars)
         if unused:
             click.secho(f"Warning: unused vars: {unused}", fg="yellow")
+    if warn_case_collisions:
+        from ..core.checker import find_case_collisions
+        for group in find_case_collisions(os.path.normpath(it.path) for it in p.items):
+            click.secho(f"Warning: case collision: {group}", fg="yellow", err=True)
 
-    status_map = issues_map = None
+    status_index = None
     if with_status:
         from ..core.checker import audit_filesystem
+        table = PathTable()
         rep = audit_filesystem(
             p, base_dir,
             follow_symlinks=follow_symlinks,
             max_path_len=max_path_len,
             portable=portable,
+            stats=stats,
+            path_table=table,
         )
-        status_map, issues_map = _build_status_maps(rep)
-
-    manifest = p.to_manifest(base_dir=base_dir, relative=relative,
-                             status_map=status_map, issues_map=issues_map)
-
-    if export_manifest:
-        out_path = Path(export_manifest)
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        if manifest_format == "json":
-            with open(out_path, "w", encoding="utf-8") as fw:
-                json.dump(manifest, fw, ensure_ascii=False, indent=2)
-        else:  # jsonl
-            with open(out_path, "w", encoding="utf-8") as fw:
-                for row in manifest:
-                    fw.write(json.dumps(row, ensure_ascii=False) + "\n")
-        click.echo(f"Manifest written to: {out_path}")
-    else:
-        click.echo(json.dumps(manifest, ensure_ascii=False, indent=2))
+        status_index = StatusIndex.from_report(rep, table)
+
+    with phase(stats, "output") as rec:
+        manifest = p.to_manifest(base_dir=base_dir, relative=relative, status=status_index)
+        rec.items = len(manifest)
+
+        if export_manifest:
+            out_path = Path(export_manifest)
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            if manifest_format == "json":
+                with open(out_path, "w", encoding="utf-8") as fw:
+                    fw.write(json_io.dumps(manifest, compact=compact))
+            else:  # jsonl
+                with open(out_path, "w", encoding="utf-8") as fw:
+                    for row in manifest:
+                        fw.write(json_io.dumps_line(row, compact=compact) + "\n")
+            click.echo(f"Manifest written to: {out_path}")
+        else:
+            click.echo(json_io.dumps(manifest, compact=compact))
 
 
 @main.command(help="Simulate generation (print operations, no writes).")
@@ -82,15 +187,40 @@ def plan(template_path, vars_path, base_dir, relative, export_manifest, manifest
 @click.option("--quiet", is_flag=True, help="Only print final summary.")
 @click.option("--summary", is_flag=True, help="Print summary after listing.")
 @click.option("--max-expand", type=int, default=50000, show_default=True)
-def simulate(template_path, vars_path, base_dir, quiet, summary, max_expand):
-    plan = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand)
-    dirs = [i.path for i in plan.items if i.type == "dir"]
-    files = [i.path for i in plan.items if i.type == "file"]
-    if not quiet:
-        for d in dirs: click.echo(f"[dir ] {d}")
-        for f in files: click.echo(f"[file] {f}")
-    if summary or quiet:
-        click.secho(f"Summary: dirs={len(dirs)}, files={len(files)}", fg="cyan")
+@click.option("--virtual", is_flag=True,
+              help="Run the real build against an in-memory copy of --base, then check the result in memory.")
+def simulate(template_path, vars_path, base_dir, quiet, summary, max_expand, virtual):
+    stats = _run_stats()
+    plan = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand, stats=stats)
+    with phase(stats, "output") as rec:
+        dirs = [i.path for i in plan.items if i.type == "dir"]
+        files = [i.path for i in plan.items if i.type == "file"]
+        if not quiet:
+            for d in dirs: click.echo(f"[dir ] {d}")
+            for f in files: click.echo(f"[file] {f}")
+        if summary or quiet:
+            click.secho(f"Summary: dirs={len(dirs)}, files={len(files)}", fg="cyan")
+        rec.items = len(plan.items)
+    if virtual:
+        _simulate_virtual(plan, base_dir, stats)
+
+
+def _simulate_virtual(plan: BuildPlan, base_dir: str, stats: Optional[RunStats]) -> None:
+    # 真实构建逻辑跑在 base 目录结构的内存副本上（只读磁盘），再在内存中做一次 check
+    from ..core.fs_backend import MemoryFS
+    with phase(stats, "virtual.load") as rec:
+        mem = MemoryFS.from_disk(base_dir)
+        rec.items = len(mem.dirs) + len(mem.files)
+    try:
+        apply_plan(plan, stats=stats, fs=mem, echo=False)
+    except OSError as e:
+        click.secho(f"Virtual build failed: {e}", fg="red", err=True)
+        raise SystemExit(1)
+    rep = audit_filesystem(plan, base_dir, stats=stats, echo=False, fs=mem)
+    c = rep.counts
+    click.secho(f"Virtual build: created dirs={mem.created_dirs}, files={mem.created_files}; "
+                f"after build: missing={c['missing_dirs'] + c['missing_files']}, conflicts={c['conflicts']}, "
+                f"name_issues={c['name_issues']}, outside_base={c['outside_base_issues']}", fg="cyan")
 
 
 @main.command(help="Apply plan and write to filesystem.")
@@ -99,18 +229,68 @@ def simulate(template_path, vars_path, base_dir, quiet, summary, max_expand):
 @click.option("--base", "base_dir", required=True, type=click.Path(file_okay=False))
 @click.option("--assume-yes", is_flag=True, help="Do not ask for confirmation.")
 @click.option("--max-expand", type=int, default=50000, show_default=True)
-def build(template_path, vars_path, base_dir, assume_yes, max_expand):
-    plan = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand)
+@click.option("--link-mode", type=click.Choice(["copy", "reflink", "hardlink"]), default="copy", show_default=True,
+              help="How to seed files that declare a 'source': kernel copy, copy-on-write clone, or hard link "
+                   "(falls back to copy when unsupported).")
+@click.option("--jobs", type=int, default=1, show_default=True,
+              help="Parallel writer threads for file creation/seeding/rendering (directories stay ordered).")
+@click.option("--atomic", is_flag=True,
+              help="Build each top-level root in a staging dir and publish it with one rename; "
+                   "an interrupted build resumes from its write-ahead journal.")
+@click.option("--journal", "journal_path", type=click.Path(dir_okay=False), default=None,
+              help="Journal file for --atomic (default: <base>/.foldergen-journal.jsonl).")
+@click.option("--checkpoint", "checkpoint_path", type=click.Path(dir_okay=False), default=None,
+              help="Periodically record the completed plan prefix here; rerunning the same build "
+                   "skips that prefix without probing it. Removed on success.")
+@click.option("--max-ops-per-sec", type=click.FloatRange(min=0, min_open=True), default=None,
+              help="Token-bucket limit on filesystem operations per second (mkdir/create/stat), "
+                   "to spare shared storage.")
+@click.option("--adaptive", is_flag=True,
+              help="Adapt write concurrency between 1 and --jobs, backing off when per-op latency rises.")
+@_shard_option
+@_plan_jobs_option
+def build(template_path, vars_path, base_dir, assume_yes, max_expand, link_mode, jobs, atomic, journal_path,
+          checkpoint_path, max_ops_per_sec, adaptive, shard, plan_jobs):
+    # 选项冲突在展开计划、确认提示之前报出
+    if atomic:
+        if jobs > 1:
+            raise click.UsageError("--atomic builds sequentially; drop --jobs.")
+        if checkpoint_path:
+            raise click.UsageError("--atomic keeps its own journal; use --journal instead of --checkpoint.")
+        if max_ops_per_sec or adaptive:
+            raise click.UsageError("--atomic does not support --max-ops-per-sec / --adaptive.")
+    elif adaptive and jobs <= 1:
+        raise click.UsageError("--adaptive needs --jobs N (N > 1) as its concurrency ceiling.")
+    stats = _run_stats()
+    plan = plan_api.make_plan(template_path, base_dir, vars_path, max_expand=max_expand, stats=stats, shard=shard,
+                              jobs=plan_jobs)
     if not assume_yes:
         total = len(plan.items)
         click.confirm(f"This will create {total} entries. Continue?", abort=True)
-    generator_api.build(template_path, base_dir, vars_path)
-    # generator_api.build(template_path=template_path, base_dir=base_dir, vars_path=vars_path)
+    # 直接落盘已生成的计划，避免 generator_api.build 再展开一遍模板
+    if atomic:
+        seeded = apply_plan_atomic(plan, base_dir, stats=stats, link_mode=link_mode, journal_path=journal_path)
+    else:
+        throttled = None
+        if max_ops_per_sec or adaptive:
+            from ..core.fs_backend import ThrottledFS
+            throttled = ThrottledFS(max_ops_per_sec=max_ops_per_sec, max_concurrency=jobs if adaptive else None,
+                                    adaptive=adaptive)
+        seeded = apply_plan(plan, simulate=False, stats=stats, link_mode=link_mode, jobs=jobs,
+                            checkpoint_path=checkpoint_path, fs=throttled)
+        if throttled is not None:
+            click.secho(throttled.summary(), fg="cyan")
+    if seeded.files:
+        click.secho(seeded.summary(), fg="cyan")
 
 
 @main.command(help="Check filesystem against template plan and report issues.")
-@click.option("--template", "template_path", required=True, type=click.Path(exists=True, dir_okay=False))
-@click.option("--vars", "vars_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--template", "template_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Template file (required unless --from-manifest is given).")
+@click.option("--vars", "vars_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Vars file (required unless --from-manifest is given).")
+@click.option("--from-manifest", "from_manifest", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Use a manifest from `plan --export-manifest` (JSONL streamed via mmap) instead of the template.")
 @click.option("--base", "base_dir", required=True, type=click.Path(file_okay=False))
 @click.option("--follow-symlinks/--no-follow-symlinks", default=False, show_default=True)
 @click.option("--max-path-len", default=240, show_default=True, type=int, help="Max path length to warn.")
@@ -118,73 +298,210 @@ def build(template_path, vars_path, base_dir, assume_yes, max_expand):
               type=click.Choice(["auto", "windows", "posix", "mac", "all", "none"]),
               default="auto", show_default=True,
               help="Name portability rules to apply.")
-@click.option("--format", "fmt", type=click.Choice(["json", "table"]), default="json", show_default=True)
+@click.option("--format", "fmt", type=click.Choice(["json", "jsonl", "table", "summary"]), default="json",
+              show_default=True,
+              help="json: one object (streamed); jsonl: one record per item; summary: counts per category and subtree.")
+@click.option("--echo/--no-echo", default=True, show_default=True,
+              help="Include the planned/existing echo lists (--no-echo skips collecting them; counts are kept).")
 @click.option("--strict", is_flag=True, help="Non-zero exit if any issue found (good for CI).")
+@click.option("--fail-fast", is_flag=True,
+              help="Stream the plan, probe the disk per path and stop at the first problem "
+                   "(or after --max-report problems). Implies --strict; extras are not checked.")
+@click.option("--max-report", type=click.IntRange(min=1), default=None,
+              help="Keep at most N items per category (counts stay complete).")
 @click.option("--filter", "filter_status", default=None, help="Filter statuses in output: e.g. 'missing,conflict'.")
-def check(template_path, vars_path, base_dir, follow_symlinks, max_path_len, portable, fmt, strict, filter_status):
-    plan = plan_api.make_plan(template_path, base_dir, vars_path)
-    rep = audit_filesystem(
-        plan,
-        base_dir,
-        follow_symlinks=follow_symlinks,
-        max_path_len=max_path_len,
-        portable=portable,  # ⬅ 传入
-    )
-
-    # 状态过滤（仅影响 table/json 输出，不改变 rep 内部）
-    if filter_status:
-        want = {s.strip().lower() for s in filter_status.split(",") if s.strip()}
-
-    if fmt == "json":
-        def _ser(obj):
-            if hasattr(obj, "__dict__"):
-                return obj.__dict__
-            return str(obj)
-
-        click.echo(json.dumps(rep, default=_ser, ensure_ascii=False, indent=2))
+@click.option("--snapshot", "snapshot_path", default=None, type=click.Path(dir_okay=False),
+              help="Directory index (mtime/inode + listings) reused across runs: only changed dirs are re-listed.")
+@click.option("--memory-items", type=click.IntRange(min=1000), default=None,
+              help="Bounded-memory audit: keep at most N paths in RAM, spilling sorted runs to temp files "
+                   "(combine with --no-echo/--max-report for a fixed footprint).")
+@click.option("--spill-dir", type=click.Path(file_okay=False, exists=True), default=None,
+              help="Directory for --memory-items temp files (default: system temp dir).")
+@_shard_option
+@_plan_jobs_option
+@_compact_option
+def check(template_path, vars_path, from_manifest, base_dir, follow_symlinks, max_path_len, portable, fmt, echo,
+          strict, fail_fast, max_report, filter_status, snapshot_path, memory_items, spill_dir, shard, plan_jobs,
+          compact):
+    stats = _run_stats()
+    _check_plan_source(template_path, vars_path, from_manifest, shard)
+    if fail_fast and snapshot_path:
+        raise click.UsageError("--snapshot has no effect with --fail-fast (it does not walk the tree).")
+    if memory_items and (fail_fast or snapshot_path):
+        raise click.UsageError("--memory-items cannot be combined with --fail-fast or --snapshot.")
+    if from_manifest:
+        # 清单逐行流入审计，不构造 BuildPlan，也不需要模板/变量与展开开销
+        plan = iter_manifest(from_manifest, base_dir)
+    elif fail_fast or memory_items:
+        # 惰性展开：fail-fast 发现问题即停止，其余条目不会生成；有界内存模式不驻留完整计划
+        plan = plan_api.iter_plan(template_path, base_dir, vars_path, stats=stats, shard=shard, jobs=plan_jobs)
     else:
-        # 精简表格输出
-        def _h(title):
-            click.secho(f"\n== {title} ==", bold=True)
-
-        _h("Planned")
-        click.echo(f"dirs={len(rep.planned_dirs)}, files={len(rep.planned_files)}")
-        if rep.duplicate_planned_paths:
-            _h("Duplicate Planned Paths")
-            for p in rep.duplicate_planned_paths:
-                click.echo(p)
-        if rep.outside_base_issues:
-            _h("Outside Base Issues")
-            for p in rep.outside_base_issues: click.echo(p)
-        if rep.name_issues:
-            _h("Name Issues")
-            for ni in rep.name_issues: click.echo(f"{ni.path}  -> {ni.reason}")
-        _h("Missing")
-        for p in rep.missing_dirs: click.echo(f"[dir ] {p}")
-        for p in rep.missing_files: click.echo(f"[file] {p}")
-        _h("Conflicts (type mismatch)")
-        for c in rep.conflicts: click.echo(f"{c.path}  expected={c.expected}  found={c.found}")
-        _h("Existing (as planned)")
-        for p in rep.existing_dirs[:10]: click.echo(f"[dir ] {p}")
-        for p in rep.existing_files[:10]: click.echo(f"[file] {p}")
-        if len(rep.existing_dirs) > 10 or len(rep.existing_files) > 10:
-            click.echo("... (use --format json to see all)")
-        _h("Extras on Disk")
-        for p in rep.extra_dirs[:10]: click.echo(f"[dir ] {p}")
-        for p in rep.extra_files[:10]: click.echo(f"[file] {p}")
-        if rep.permission_issues:
-            _h("Permission Issues")
-            for s in rep.permission_issues: click.echo(s)
+        plan = plan_api.make_plan(template_path, base_dir, vars_path, stats=stats, shard=shard, jobs=plan_jobs)
+    # 状态过滤（仅影响输出，不改变 rep 内部）；summary / fail-fast 只需计数，不收集回显列表
+    echo = echo and fmt != "summary" and not fail_fast
+    try:
+        sections = select_sections(echo=echo, filter_status=filter_status)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--filter")
+    if fail_fast:
+        strict = True
+        sections = [f for f in sections if f not in ("extra_dirs", "extra_files")]  # 不扫描磁盘树，无从判断多余项
+        rep = audit_fail_fast(
+            plan,
+            base_dir,
+            follow_symlinks=follow_symlinks,
+            max_path_len=max_path_len,
+            portable=portable,
+            max_report=max_report or 1,
+            stats=stats,
+        )
+    else:
+        rep = audit_filesystem(
+            plan,
+            base_dir,
+            follow_symlinks=follow_symlinks,
+            max_path_len=max_path_len,
+            portable=portable,  # ⬅ 传入
+            stats=stats,
+            echo=echo,
+            max_report=max_report,
+            snapshot_path=snapshot_path,
+            memory_items=memory_items,
+            spill_dir=spill_dir,
+        )
+
+    with phase(stats, "output"):
+        out = click.get_text_stream("stdout")
+        if fmt == "json":
+            # 列表不完整（--no-echo / --max-report / --filter）时附带计数，merge 据此拒绝不完整的分片报告
+            write_report_json(rep, out, sections, compact=compact,
+                              with_counts=not echo or max_report is not None or bool(filter_status))
+        elif fmt == "jsonl":
+            write_report_jsonl(rep, out, sections, compact=compact)
+        elif fmt == "summary":
+            click.secho("== Counts ==", bold=True)
+            for name, n in rep.counts.items():
+                if name in sections or name in ("planned_dirs", "planned_files", "existing_dirs", "existing_files"):
+                    click.echo(f"{name:<26}{n:>10}")
+            subtrees = summarize_subtrees(rep)
+            if subtrees:
+                click.secho("\n== Issues by subtree ==", bold=True)
+                click.echo(f"{'subtree':<40}{'missing':>9}{'conflict':>9}{'extra':>9}{'name':>9}")
+                for name, row in subtrees.items():
+                    click.echo(f"{name:<40}{row['missing']:>9}{row['conflict']:>9}{row['extra']:>9}{row['name']:>9}")
+        else:
+            # 精简表格输出
+            def _h(title):
+                click.secho(f"\n== {title} ==", bold=True)
+
+            show = set(sections)
+            _h("Planned")
+            click.echo(f"dirs={rep.counts['planned_dirs']}, files={rep.counts['planned_files']}")
+            if rep.duplicate_planned_paths and "duplicate_planned_paths" in show:
+                _h("Duplicate Planned Paths")
+                for p in rep.duplicate_planned_paths:
+                    click.echo(p)
+            if rep.outside_base_issues and "outside_base_issues" in show:
+                _h("Outside Base Issues")
+                for p in rep.outside_base_issues: click.echo(p)
+            if rep.name_issues and "name_issues" in show:
+                _h("Name Issues")
+                for ni in rep.name_issues: click.echo(f"{ni.path}  -> {ni.reason}")
+            if "missing_dirs" in show:
+                _h("Missing")
+                for p in rep.missing_dirs: click.echo(f"[dir ] {p}")
+                for p in rep.missing_files: click.echo(f"[file] {p}")
+            if "conflicts" in show:
+                _h("Conflicts (type mismatch)")
+                for c in rep.conflicts: click.echo(f"{c.path}  expected={c.expected}  found={c.found}")
+            if "existing_dirs" in show:
+                _h("Existing (as planned)")
+                for p in rep.existing_dirs[:10]: click.echo(f"[dir ] {p}")
+                for p in rep.existing_files[:10]: click.echo(f"[file] {p}")
+                if len(rep.existing_dirs) > 10 or len(rep.existing_files) > 10:
+                    click.echo("... (use --format json to see all)")
+            if "extra_dirs" in show:
+                _h("Extras on Disk" + (" (provisional until shards are merged)" if shard else ""))
+                for p in rep.extra_dirs[:10]: click.echo(f"[dir ] {p}")
+                for p in rep.extra_files[:10]: click.echo(f"[file] {p}")
+            if rep.permission_issues and "permission_issues" in show:
+                _h("Permission Issues")
+                for s in rep.permission_issues: click.echo(s)
+            capped = [f"{k}={n}" for k, n in rep.counts.items()
+                      if k in show and not k.startswith(("planned_", "existing_")) and n > len(getattr(rep, k))]
+            if capped:
+                click.echo(f"\n(--max-report {max_report}: totals {', '.join(capped)})")
+        if fail_fast:
+            n = sum(rep.counts[k] for k in _STRICT_SECTIONS)
+            checked = rep.counts["planned_dirs"] + rep.counts["planned_files"]
+            click.echo(f"fail-fast: {'stopped at ' + str(n) + ' problem(s)' if n else 'no problems'} "
+                       f"after checking {checked} planned item(s); extras not checked.", err=True)
 
     if strict:
-        has_problem = any([
-            rep.missing_dirs, rep.missing_files,
-            rep.conflicts, rep.name_issues, rep.permission_issues,
-            rep.outside_base_issues, rep.duplicate_planned_paths
-        ])
+        has_problem = any(getattr(rep, k) for k in _STRICT_SECTIONS)
         raise SystemExit(2 if has_problem else 0)
 
 
+# --strict 判定失败的分类（多余项不算）
+_STRICT_SECTIONS = ("missing_dirs", "missing_files", "conflicts", "name_issues", "permission_issues",
+                    "outside_base_issues", "duplicate_planned_paths")
+
+
+@main.command(help="Merge per-shard manifests or `check --format json` reports.")
+@click.argument("inputs", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--out", "out_path", type=click.Path(dir_okay=False), default=None,
+              help="If set, write to file instead of stdout.")
+@click.option("--portable",
+              type=click.Choice(["auto", "windows", "posix", "mac", "all", "none"]),
+              default="auto", show_default=True,
+              help="Name portability rules for recomputing case collisions across shard reports (match `check`).")
+@_compact_option
+def merge(inputs, out_path, portable, compact):
+    from ..core.checker import merge_reports, report_from_dict
+    from ..core.report_io import report_from_records
+    # 按输入顺序读取：JSON 列表 / JSONL 为 manifest，JSON 对象为审计报告
+    manifests, reports = [], []
+    for path in inputs:
+        text = Path(path).read_text(encoding="utf-8")
+        try:
+            obj = json_io.loads(text)
+        except ValueError:
+            obj = [json_io.loads(line) for line in text.splitlines() if line.strip()]
+        if isinstance(obj, dict) and "base_dir" in obj:
+            reports.append(report_from_dict(obj))
+        elif isinstance(obj, list) and obj and isinstance(obj[0], dict) and obj[0].get("section") == "meta":
+            reports.append(report_from_records(obj))  # check --format jsonl
+        else:
+            manifests.append(obj if isinstance(obj, list) else [obj])  # 单行 JSONL
+    if manifests and reports:
+        raise click.UsageError("Cannot merge manifests and reports together.")
+
+    if reports:
+        try:
+            merged = merge_reports(reports, portable=portable)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        buf = io.StringIO()
+        if out_path and out_path.endswith(".jsonl"):
+            write_report_jsonl(merged, buf, select_sections(), compact=compact)
+        else:
+            write_report_json(merged, buf, select_sections(), compact=compact)
+        text = buf.getvalue().rstrip("\n")
+    else:
+        rows = [row for m in manifests for row in m]
+        if out_path and out_path.endswith(".jsonl"):
+            text = "\n".join(json_io.dumps_line(row, compact=compact) for row in rows)
+        else:
+            text = json_io.dumps(rows, compact=compact)
+
+    if out_path:
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(out_path).write_text(text, encoding="utf-8")
+        click.echo(f"Merged {len(inputs)} input(s) to: {out_path}")
+    else:
+        click.echo(text)
+
+
 def _print_tree_ascii(tree: dict, *, max_depth: int | None = None, _prefix: str = "", _is_last: bool = True,
                       _level: int = 0):
     """
@@ -211,11 +528,17 @@ def _print_tree_ascii(tree: dict, *, max_depth: int | None = None, _prefix: str
 
 
 @main.command(help="Print or export the folder plan as a tree.")
-@click.option("--template", "template_path", required=True, type=click.Path(exists=True, dir_okay=False))
-@click.option("--vars", "vars_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--template", "template_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Template file (required unless --from-manifest is given).")
+@click.option("--vars", "vars_path", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Vars file (required unless --from-manifest is given).")
+@click.option("--from-manifest", "from_manifest", default=None, type=click.Path(exists=True, dir_okay=False),
+              help="Use a manifest from `plan --export-manifest` (JSONL streamed via mmap) instead of the template.")
 @click.option("--base", "base_dir", required=True, type=click.Path(file_okay=False))
 @click.option("--relative/--absolute", default=True, show_default=True, help="Show paths relative to --base.")
 @click.option("--depth", type=int, default=None, help="Max depth to print (tree mode).")
+@click.option("--max-children", type=int, default=None,
+              help="Show at most N children per directory, collapsing the rest into '… and K more' (tree mode).")
 @click.option("--show-files/--no-show-files", default=True, show_default=True,
               help="Whether to include files in the tree object.")
 @click.option("--sort", type=click.Choice(["template", "alpha"]), default="template", show_default=True,
@@ -232,93 +555,132 @@ def _print_tree_ascii(tree: dict, *, max_depth: int | None = None, _prefix: str
 @click.option("--max-path-len", default=240, show_default=True, type=int,
               help="Max path length warning (same as `check`).")
 @click.option("--follow-symlinks/--no-follow-symlinks", default=False, show_default=True)
-def tree(template_path, vars_path, base_dir, relative, depth, show_files, sort, fmt, out_path,
-         status, portable, max_path_len, follow_symlinks):
-    plan = plan_api.make_plan(template_path, base_dir, vars_path)
+@_compact_option
+def tree(template_path, vars_path, from_manifest, base_dir, relative, depth, max_children, show_files, sort, fmt,
+         out_path, status, portable, max_path_len, follow_symlinks, compact):
+    stats = _run_stats()
+    _check_plan_source(template_path, vars_path, from_manifest)
+    if from_manifest:
+        with phase(stats, "load") as rec:
+            plan = BuildPlan(items=list(iter_manifest(from_manifest, base_dir)))
+            rec.items = len(plan.items)
+    else:
+        plan = plan_api.make_plan(template_path, base_dir, vars_path, stats=stats)
 
-    status_map = issues_map = None
+    status_index = None
     if status:
-        # 借用 checker 的审计逻辑
+        # 借用 checker 的审计逻辑；计划路径驻留在同一张 PathTable 中，状态按 ID 存取
         from ..core.checker import audit_filesystem
+        table = PathTable()
         rep = audit_filesystem(
             plan,
             base_dir,
             follow_symlinks=follow_symlinks,
             max_path_len=max_path_len,
             portable=portable,
+            stats=stats,
+            path_table=table,
         )
-        status_map, issues_map = _build_status_maps(rep)
-
-    # 生产输出
-    if fmt == "tree":
-        tree_obj = plan.to_tree(
-            base_dir=base_dir, relative=relative, include_files=show_files, sort=sort,
-            status_map=status_map, issues_map=issues_map
-        )
-        text = _render_ascii_tree(tree_obj, max_depth=depth, colorize=status)
-    elif fmt == "json":
-        obj = plan.to_tree(
-            base_dir=base_dir, relative=relative, include_files=show_files, sort=sort,
-            status_map=status_map, issues_map=issues_map
-        )
-        text = json.dumps(obj, ensure_ascii=False, indent=2)
-    else:  # yaml
-        obj = plan.to_tree(
-            base_dir=base_dir, relative=relative, include_files=show_files, sort=sort,
-            status_map=status_map, issues_map=issues_map
-        )
-        try:
-            import yaml
-            text = yaml.safe_dump(obj, allow_unicode=True, sort_keys=False)
-        except Exception:
-            text = _fallback_yaml(obj)
-
-    if out_path:
-        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-        Path(out_path).write_text(text, encoding="utf-8")
-        click.echo(f"Wrote {fmt} to: {out_path}")
-    else:
-        click.echo(text)
+        status_index = StatusIndex.from_report(rep, table)
+
+    with phase(stats, "output"):
+        # 生产输出
+        if fmt == "tree":
+            # 流式渲染：前缀树在构建时即按 --depth 截断，逐行输出，不构造整棵 dict / 整串文本
+            root = build_trie(plan.items, base_dir=base_dir, relative=relative, include_files=show_files,
+                              max_depth=depth, status=status_index)
+            lines = iter_tree_lines(root, max_depth=depth, max_children=max_children, sort=sort,
+                                    label=_tree_label(status))
+            if out_path:
+                Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(out_path, "w", encoding="utf-8") as fw:
+                    for line in lines:
+                        fw.write(line + "\n")
+                click.echo(f"Wrote {fmt} to: {out_path}")
+            else:
+                for line in lines:
+                    click.echo(line)
+            return
+        elif fmt == "json":
+            obj = plan.to_tree(
+                base_dir=base_dir, relative=relative, include_files=show_files, sort=sort,
+                status=status_index
+            )
+            text = json_io.dumps(obj, compact=compact)
+        else:  # yaml
+            obj = plan.to_tree(
+                base_dir=base_dir, relative=relative, include_files=show_files, sort=sort,
+                status=status_index
+            )
+            try:
+                import yaml
+                text = yaml.safe_dump(obj, allow_unicode=True, sort_keys=False)
+            except Exception:
+                text = _fallback_yaml(obj)
+
+        if out_path:
+            Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+            Path(out_path).write_text(text, encoding="utf-8")
+            click.echo(f"Wrote {fmt} to: {out_path}")
+        else:
+            click.echo(text)
 
 
-def _render_ascii_tree(tree: dict, *, max_depth: int | None = None, colorize: bool = False) -> str:
-    def color_name(name: str, status: str | None):
-        if not colorize or not status:
+@main.command(help="Poll template, vars and base; redraw the status tree whenever something changes.")
+@click.option("--template", "template_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--vars", "vars_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--base", "base_dir", required=True, type=click.Path(file_okay=False))
+@click.option("--interval", type=float, default=0.5, show_default=True, help="Polling interval in seconds.")
+@click.option("--depth", type=int, default=None, help="Max depth to print.")
+@click.option("--max-children", type=int, default=None,
+              help="Show at most N children per directory, collapsing the rest into '… and K more'.")
+@click.option("--show-files/--no-show-files", default=True, show_default=True)
+@click.option("--sort", type=click.Choice(["template", "alpha"]), default="template", show_default=True)
+@click.option("--max-expand", type=int, default=50000, show_default=True)
+@click.option("--follow-symlinks/--no-follow-symlinks", default=False, show_default=True)
+def watch(template_path, vars_path, base_dir, interval, depth, max_children, show_files, sort, max_expand, follow_symlinks):
+    import time
+    from ..api.watch_api import WatchSession
+    session = WatchSession(template_path, vars_path, base_dir, max_expand=max_expand,
+                           follow_symlinks=follow_symlinks)
+    try:
+        while True:
+            upd = session.poll()
+            if upd.changed:
+                root = build_trie(session.plan.items, base_dir=session.base_dir, include_files=show_files,
+                                  max_depth=depth, status=session.status)
+                click.clear()
+                for line in iter_tree_lines(root, max_depth=depth, max_children=max_children, sort=sort,
+                                            label=_tree_label(True)):
+                    click.echo(line)
+                click.secho(
+                    f"[watch] {time.strftime('%H:%M:%S')} "
+                    f"nodes re-expanded={upd.nodes_rendered} reused={upd.nodes_reused}, "
+                    f"dirs rescanned={upd.dirs_rescanned}, items re-checked={upd.items_reclassified}, "
+                    f"{upd.seconds * 1000:.1f} ms",
+                    fg="cyan", err=True,
+                )
+                if upd.error:
+                    click.secho(f"[watch] keeping previous plan: {upd.error}", fg="yellow", err=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def _tree_label(colorize: bool = False):
+    def label(n: TreeNode) -> str:
+        name = n.name or "."
+        if not colorize or not n.status:
             return name
         # 颜色：existing=green, missing=red, conflict=yellow, planned=white
-        if status == "existing":
+        if n.status == "existing":
             return click.style(name, fg="green")
-        if status == "missing":
-            return click.style(name, fg="red")
-        if status == "conflict":
-            return click.style(name, fg="yellow")
+        if n.status == "missing":
+            return click.style(name, fg="red") + " " + click.style("[missing]", fg="red")
+        if n.status == "conflict":
+            return click.style(name, fg="yellow") + " " + click.style("[conflict]", fg="yellow")
         return name  # planned/no-status
-
-    lines: List[str] = []
-
-    def rec(n: dict, prefix: str = "", is_last: bool = True, level: int = 0):
-        branch = "└─ " if is_last else "├─ "
-        raw_label = n.get("name") or "."
-        status = n.get("status")
-        label = color_name(raw_label, status)
-        suffix = ""
-        if colorize and status in ("missing", "conflict"):
-            suffix = " " + click.style(f"[{status}]", fg=("red" if status == "missing" else "yellow"))
-        if level == 0:
-            lines.append(label + suffix)
-        else:
-            lines.append(f"{prefix}{branch}{label}{suffix}")
-
-        if max_depth is not None and level >= max_depth:
-            return
-        kids = n.get("children", [])
-        for i, c in enumerate(kids):
-            last = (i == len(kids) - 1)
-            new_prefix = prefix + ("   " if is_last else "│  ")
-            rec(c, new_prefix, last, level + 1)
-
-    rec(tree)
-    return "\n".join(lines)
+    return label
 
 
 def _fallback_yaml(obj, indent=0):
@@ -346,33 +708,3 @@ def _fallback_yaml(obj, indent=0):
         return "\n".join(lines)
     else:
         return f"{sp}{obj}"
-
-
-def _build_status_maps(rep) -> tuple[dict, dict]:
-    import os
-    def _norm(p: str) -> str:
-        p = os.path.normpath(p)
-        if os.name == "nt":
-            p = os.path.normcase(p)
-        return p
-
-    status = {}
-
-    for p in rep.existing_dirs + rep.existing_files:
-        status[_norm(p)] = "existing"
-    for p in rep.missing_dirs + rep.missing_files:
-        status[_norm(p)] = "missing"
-    for c in rep.conflicts:
-        status[_norm(c.path)] = "conflict"
-
-    issues = {}
-    for ni in rep.name_issues:
-        key = _norm(ni.path)
-        issues.setdefault(key, []).append(ni.reason)
-
-    # 对未命中的计划项，默认 "planned"
-    for p in rep.planned_dirs + rep.planned_files:
-        key = _norm(p)
-        status.setdefault(key, "planned")
-
-    return status, issues
@@ -1,9 +1,20 @@
 from __future__ import annotations
 from dataclasses import dataclass
+import heapq
+import itertools
+import operator
 import os
+import stat
+import sys
 from pathlib import Path
-from typing import Iterable, Set, Tuple, Dict, Literal, Optional
-from .models import BuildPlan, AuditReport, ConflictItem, NameIssue
+from typing import Any, Iterable, Iterator, List, Set, Tuple, Dict, Literal, Optional, Union
+from .models import BuildPlan, BuildPlanItem, AuditReport, ConflictItem, NameIssue
+from .path_table import PathTable, norm_path as _norm
+from .events import RunObserver, iter_batches, observed_stats
+from .stats import RunStats, phase
+from .extsort import BloomFilter, ExternalSorter
+from .fs_backend import LOCAL_FS, FileSystem, LocalFS
+from .watch import DirSnapshot
 
 _WIN_ILLEGAL_CHARS = set('<>:"/\\|?*')  # Windows 文件名禁止字符（路径分隔由 os 负责）
 _WIN_RESERVED = {
@@ -114,14 +125,6 @@ def _iter_components_no_drive(path_str: str):
         yield comp
 
 
-def _norm(p: str) -> str:
-    # 统一规范化路径比较（大小写在 Windows 不敏感）
-    p = os.path.normpath(p)
-    if os.name == "nt":
-        p = os.path.normcase(p)
-    return p
-
-
 def _is_inside_base(base: Path, candidate: Path) -> bool:
     try:
         return base.resolve(strict=False) in candidate.resolve(strict=False).parents or base.resolve(
@@ -131,31 +134,58 @@ def _is_inside_base(base: Path, candidate: Path) -> bool:
         return str(candidate).startswith(str(base))
 
 
-def _gather_planned_sets(plan: BuildPlan) -> Tuple[Set[str], Set[str], Dict[str, int]]:
-    planned_dirs, planned_files = set(), set()
-    counts: Dict[str, int] = {}
-    for item in plan.items:
-        p = _norm(item.path)
-        counts[p] = counts.get(p, 0) + 1
+def _gather_planned_sets(items: Iterable[BuildPlanItem],
+                         table: Optional[PathTable] = None) -> Tuple[Set[str], Set[str], Set[str], int]:
+    """返回 (计划目录, 计划文件, 重复路径, 条目总数)；重复由集合成员判断，无需逐路径计数字典。"""
+    planned_dirs, planned_files, duplicates = set(), set(), set()
+    table = table if table is not None else PathTable()
+    paths = table.paths
+    n = 0
+    for item in items:
+        n += 1
+        p = paths[table.intern(item.path)]
+        if p in planned_dirs or p in planned_files:
+            duplicates.add(p)
         if item.type == "dir":
             planned_dirs.add(p)
         elif item.type == "file":
             planned_files.add(p)
-    return planned_dirs, planned_files, counts
+    return planned_dirs, planned_files, duplicates, n
 
 
-def _walk_actual(base_dir: str, follow_symlinks: bool) -> Tuple[Set[str], Set[str]]:
+def _walk_actual(base_dir: str, follow_symlinks: bool,
+                 fs: Optional[FileSystem] = None) -> Tuple[Set[str], Set[str]]:
     actual_dirs, actual_files = set(), set()
-    for root, dirs, files in os.walk(base_dir, followlinks=follow_symlinks):
-        # 当前 root 也算目录
-        actual_dirs.add(_norm(root))
-        for d in dirs:
-            actual_dirs.add(_norm(os.path.join(root, d)))
-        for f in files:
-            actual_files.add(_norm(os.path.join(root, f)))
+    top = _norm(base_dir)
+    # 从已规范化的 base 出发，os.walk 产出的 join(root, name) 本身即为规范形式（POSIX），无需逐项 normpath；
+    # Windows 仍需 normcase，base 为 "." 时 walk 会产出 "./x"，两种情况走逐项规范化
+    norm = _norm if (os.name == "nt" or top == os.curdir) else None
+    join = os.path.join
+    for root, dirs, files in (fs or LOCAL_FS).walk(top, followlinks=follow_symlinks):
+        if norm is None:
+            # 当前 root 也算目录
+            actual_dirs.add(root)
+            actual_dirs.update(join(root, d) for d in dirs)
+            actual_files.update(join(root, f) for f in files)
+        else:
+            actual_dirs.add(norm(root))
+            actual_dirs.update(norm(join(root, d)) for d in dirs)
+            actual_files.update(norm(join(root, f)) for f in files)
     return actual_dirs, actual_files
 
 
+def _walk_with_snapshot(base_dir: str, follow_symlinks: bool, snapshot_path: str) -> Tuple[Set[str], Set[str], int]:
+    """与 _walk_actual 结果一致，但借助 DirSnapshot 索引只重新列出变化的目录；返回 (目录, 文件, 系统调用数)。"""
+    snap = DirSnapshot.load(snapshot_path, base_dir, follow_symlinks=follow_symlinks)
+    if snap is None:
+        snap = DirSnapshot(base_dir, follow_symlinks=follow_symlinks)
+        snap.scan()
+        snap.save(snapshot_path)
+    elif snap.refresh():
+        snap.save(snapshot_path)  # 无目录变化时索引原样可用，不必重写
+    return snap.dirs, snap.files, snap.syscalls
+
+
 def _illegal_name_reasons_with_rules(name: str, rules: NameRules) -> Tuple[bool, str]:
     bad = []
 
@@ -206,121 +236,751 @@ def _check_path_length(paths: Iterable[str], max_len: int) -> Iterable[NameIssue
             yield NameIssue(path=p, reason=f"path too long (> {max_len})")
 
 
+def find_case_collisions(paths: Iterable[str]) -> List[List[str]]:
+    """
+    按目录层级建立大小写折叠索引：(casefold 后的父路径, casefold 后的组件名) -> 实际路径集合，O(n)。
+    同一父目录下仅大小写不同的兄弟项（如 Docs / docs）归为一组，与宿主 OS 无关；
+    仅因父目录冲突而重复的下级同名项（Docs/a 与 docs/a）不再单独成组。
+    返回按字典序排列的冲突组，可在 check 或 plan 阶段使用。
+    """
+    index: Dict[Tuple[str, str], Set[str]] = {}
+    for p in paths:
+        parent, name = os.path.split(p)
+        index.setdefault((parent.casefold(), name.casefold()), set()).add(p)
+    groups = [
+        sorted(members) for members in index.values()
+        if len(members) > 1 and len({os.path.basename(m) for m in members}) > 1
+    ]
+    groups.sort()
+    return groups
+
+
+_CASE_COLLISION = "case-collision with "
+
+
 # 大小写冲突（按规则决定是否检查）
 def _case_collisions(paths: Iterable[str], rules: Optional[NameRules]) -> Iterable[NameIssue]:
     # 仅当选择的可移植性规则要求“大小写不敏感”时（如 Windows / all / auto 且在 Windows）才做检查
     if not rules or not rules.case_insensitive:
         return []
-    seen: Dict[str, str] = {}
     issues = []
-    for p in paths:
-        key = os.path.normcase(p)  # 以大小写不敏感视角做键
-        if key in seen and seen[key] != p:
-            issues.append(NameIssue(path=p, reason=f"case-collision with {seen[key]}"))
-        else:
-            seen[key] = p
+    for group in find_case_collisions(paths):
+        first = group[0]
+        for p in group[1:]:
+            issues.append(NameIssue(path=p, reason=f"{_CASE_COLLISION}{first}"))
     return issues
 
 
+class _WriteProbe:
+    """
+    对每个缺失项找到“最近的已存在祖先目录”（创建时真正需要写入的目录），
+    每个不同的祖先只做一次存在性/可写性探测；walk 已见过的目录与已判定缺失的目录无需再 stat。
+    cache_limit：缓存条目上限（外部排序模式下保持内存有界），超出即清空，结果不变、只是多几次系统调用。
+    """
+
+    def __init__(self, known_dirs: Set[str], known_absent: Set[str], *, cache_limit: Optional[int] = None,
+                 fs: Optional[FileSystem] = None):
+        self.fs = fs or LOCAL_FS
+        self.known_dirs = known_dirs
+        self.known_absent = known_absent
+        self.cache_limit = cache_limit
+        self.nearest: Dict[str, Optional[str]] = {}  # 目录 -> 最近已存在祖先（None 表示到根都不存在）
+        self.writable: Dict[str, bool] = {}
+        self.blocked: Dict[str, int] = {}  # 不可写祖先 -> 受阻条目数
+        self.syscalls = 0
+
+    def _find_nearest(self, d: str) -> Optional[str]:
+        nearest = self.nearest
+        chain = []
+        cur: Optional[str] = d
+        while cur is not None and cur not in nearest:
+            if cur in self.known_dirs:
+                nearest[cur] = cur
+                break
+            if cur not in self.known_absent:
+                self.syscalls += 1
+                if self.fs.exists(cur):
+                    nearest[cur] = cur
+                    break
+            chain.append(cur)
+            parent = os.path.dirname(cur)
+            cur = parent if parent != cur else None
+        found = nearest[cur] if cur is not None else None
+        for c in chain:
+            nearest[c] = found
+        return found
+
+    def add(self, p: str) -> None:
+        if self.cache_limit is not None and len(self.nearest) > self.cache_limit:
+            self.nearest.clear()
+            self.writable.clear()
+        parent = os.path.dirname(p)
+        anc = self.nearest[parent] if parent in self.nearest else self._find_nearest(parent)
+        if anc is None:
+            return
+        ok = self.writable.get(anc)
+        if ok is None:
+            self.syscalls += 1
+            try:
+                ok = self.fs.access(anc, os.W_OK)
+            except Exception:
+                ok = True  # 忽略无法判断的情况
+            self.writable[anc] = ok
+        if not ok:
+            self.blocked[anc] = self.blocked.get(anc, 0) + 1
+
+
+def _probe_write_permissions(missing: Iterable[str], known_dirs: Set[str], known_absent: Set[str],
+                             fs: Optional[FileSystem] = None) -> Tuple[Dict[str, int], int]:
+    """返回 ({不可写祖先: 受阻条目数}, 实际发起的系统调用数)，见 _WriteProbe。"""
+    probe = _WriteProbe(known_dirs, known_absent, fs=fs)
+    for p in missing:
+        probe.add(p)
+    return probe.blocked, probe.syscalls
+
+
 def audit_filesystem(
-        plan: BuildPlan,
+        plan: Union[BuildPlan, Iterable[BuildPlanItem]],
         base_dir: str,
         *,
         follow_symlinks: bool = False,
         max_path_len: int = 240,
         portable: PortableMode = "auto",
+        stats: Optional[RunStats] = None,
+        path_table: Optional[PathTable] = None,
+        echo: bool = True,
+        max_report: Optional[int] = None,
+        snapshot_path: Optional[str] = None,
+        memory_items: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        fs: Optional[FileSystem] = None,
+        observer: Optional[RunObserver] = None,
+) -> AuditReport:
+    """
+    path_table：传入后计划路径驻留其中，报告里的路径与表中 ID 一一对应，
+    后续可用 StatusIndex.from_report 按 ID 生成状态，无需再规范化字符串。
+    echo=False：不收集/排序 planned_* 与 existing_* 回显列表（只记录在 counts 中），省时省内存。
+    max_report：每个分类最多保留排序后的前 N 项（只做部分排序）；counts 仍为完整计数。
+    snapshot_path：磁盘扫描结果与各目录 (mtime, inode) 的索引文件；存在且匹配时只重新列出
+    mtime/inode 变化的目录，其余沿用缓存的列表，扫描后写回。
+    memory_items：有界内存模式。计划与磁盘路径溢出为临时文件中的有序段（spill_dir，默认系统临时目录），
+    归并后一趟比对得出各分类，内存中最多驻留约 memory_items 条路径（另加每条约 1 字节的布隆过滤器
+    与报告本身；配合 echo=False / max_report 即为固定内存）。结果与内存模式一致。
+    fs：扫描所用的文件系统后端（默认本地磁盘；如 MemoryFS 可在内存中完成 “构建后校验”）。
+    非本地后端只支持默认的内存审计（不可与 snapshot_path / memory_items 同用）。
+    observer：各 check.* 阶段结束时回调 on_phase_end；审计完成后报告中的问题按分类分批经 on_issues 回调
+    （与报告一致，受 max_report 限制）。
+    """
+    if fs is not None and not isinstance(fs, LocalFS) and (snapshot_path or memory_items is not None):
+        raise ValueError("snapshot_path/memory_items only work on the local filesystem.")
+    stats = observed_stats(stats, observer)
+    if memory_items is not None:
+        if snapshot_path or path_table is not None:
+            raise ValueError("memory_items cannot be combined with snapshot_path/path_table.")
+        with phase(stats, "check") as rec:
+            rep = _audit_external(plan, base_dir, follow_symlinks=follow_symlinks, max_path_len=max_path_len,
+                                  portable=portable, stats=stats, echo=echo, max_report=max_report,
+                                  memory_items=memory_items, spill_dir=spill_dir)
+            rec.items = rep.counts["planned_dirs"] + rep.counts["planned_files"]
+    else:
+        with phase(stats, "check") as rec:
+            rep = _audit(plan, base_dir, follow_symlinks=follow_symlinks, max_path_len=max_path_len,
+                         portable=portable, stats=stats, path_table=path_table, echo=echo, max_report=max_report,
+                         snapshot_path=snapshot_path, fs=fs)
+            rec.items = rep.counts["planned_dirs"] + rep.counts["planned_files"]
+    if observer is not None:
+        for kind in _ISSUE_FIELDS:
+            for chunk in iter_batches(getattr(rep, kind), observer.batch_size):
+                observer.on_issues(kind, chunk)
+    return rep
+
+
+def _audit(
+        plan: Union[BuildPlan, Iterable[BuildPlanItem]],
+        base_dir: str,
+        *,
+        follow_symlinks: bool,
+        max_path_len: int,
+        portable: PortableMode,
+        stats: Optional[RunStats],
+        path_table: Optional[PathTable] = None,
+        echo: bool = True,
+        max_report: Optional[int] = None,
+        snapshot_path: Optional[str] = None,
+        fs: Optional[FileSystem] = None,
 ) -> AuditReport:
     base = Path(base_dir)
     rep = AuditReport(base_dir=str(base_dir))
 
-    planned_dirs, planned_files, counts = _gather_planned_sets(plan)
-    rep.planned_dirs = sorted(planned_dirs)
-    rep.planned_files = sorted(planned_files)
+    with phase(stats, "check.gather") as rec:
+        # 也接受条目迭代器（如 manifest.iter_manifest），无需先构造 BuildPlan
+        items = plan.items if isinstance(plan, BuildPlan) else plan
+        planned_dirs, planned_files, duplicates, n_items = _gather_planned_sets(items, path_table)
+        all_planned = planned_dirs | planned_files
+        if echo and max_report is None:
+            rep.planned_dirs = sorted(planned_dirs)
+            rep.planned_files = sorted(planned_files)
+            # 已排序的目录/文件两路归并，后续检查按确定顺序遍历，且无需再拼接列表
+            all_sorted = list(heapq.merge(rep.planned_dirs, rep.planned_files))
+        else:
+            all_sorted = sorted(all_planned)
+            if echo:
+                rep.planned_dirs = _first_sorted(planned_dirs, max_report)
+                rep.planned_files = _first_sorted(planned_files, max_report)
 
-    rep.duplicate_planned_paths = sorted(p for p, c in counts.items() if c > 1)
+        rep.duplicate_planned_paths = _first_sorted(duplicates, max_report)
+        rec.items = n_items
 
     # 目录逃逸检查
-    for p in list(planned_dirs) + list(planned_files):
-        cand = Path(p)
-        if not _is_inside_base(base, cand):
-            rep.outside_base_issues.append(p)
+    with phase(stats, "check.outside_base") as rec:
+        if fs is None:
+            for p in all_planned:
+                cand = Path(p)
+                if not _is_inside_base(base, cand):
+                    rep.outside_base_issues.append(p)
+        else:
+            # 经后端解析真实路径（MemoryFS 无链接，即词法判断）
+            base_real = fs.realpath(str(base))
+            base_prefix = base_real.rstrip(os.sep) + os.sep
+            for p in all_planned:
+                real = fs.realpath(p)
+                if real != base_real and not real.startswith(base_prefix):
+                    rep.outside_base_issues.append(p)
+        rec.items = len(all_planned)
 
     # 可移植性规则选择
     rules = _select_rules(portable)
 
     # 名称/长度/大小写冲突（按规则）
-    rep.name_issues.extend(_check_name_issues(planned_dirs | planned_files, rules))
-    rep.name_issues.extend(_check_path_length(planned_dirs | planned_files, max_path_len))
-    rep.name_issues.extend(_case_collisions(planned_dirs | planned_files, rules))
+    with phase(stats, "check.names") as rec:
+        rep.name_issues.extend(_check_name_issues(all_sorted, rules))
+        rep.name_issues.extend(_check_path_length(all_sorted, max_path_len))
+        rep.name_issues.extend(_case_collisions(all_sorted, rules))
+        rec.items = len(rep.name_issues)
 
     # 实际磁盘扫描
-    if not base.exists():
-        rep.permission_issues.append(f"base dir not found: {base}")
-        # 仍然继续做“缺失”分类
-        actual_dirs, actual_files = set(), set()
-    else:
-        try:
-            actual_dirs, actual_files = _walk_actual(str(base), follow_symlinks=follow_symlinks)
-        except PermissionError as e:
-            rep.permission_issues.append(f"walk permission error: {e}")
+    with phase(stats, "check.walk") as rec:
+        walked = False  # 只有完整扫描过，"不在 actual 中" 才等价于 "磁盘上不存在"
+        if not (base.exists() if fs is None else fs.exists(str(base))):
+            rep.permission_issues.append(f"base dir not found: {base}")
+            # 仍然继续做“缺失”分类
             actual_dirs, actual_files = set(), set()
-
-    # 计划 → 实际：缺失 / 已存在 / 类型冲突
-    for d in planned_dirs:
-        if d in actual_dirs:
-            rep.existing_dirs.append(d)
-        elif d in actual_files:
-            rep.conflicts.append(ConflictItem(path=d, expected="dir", found="file"))
+            syscalls = 0
         else:
-            rep.missing_dirs.append(d)
+            try:
+                if snapshot_path:
+                    actual_dirs, actual_files, syscalls = _walk_with_snapshot(
+                        str(base_dir), follow_symlinks, snapshot_path)
+                else:
+                    actual_dirs, actual_files = _walk_actual(str(base), follow_symlinks=follow_symlinks, fs=fs)
+                    syscalls = len(actual_dirs)  # 每个目录一次 scandir
+                walked = True
+            except PermissionError as e:
+                rep.permission_issues.append(f"walk permission error: {e}")
+                actual_dirs, actual_files = set(), set()
+                syscalls = 0
+        rec.items = len(actual_dirs) + len(actual_files)
+        rec.syscalls = 1 + syscalls  # base.exists() + 扫描
+
+    # 集合差一次算出各分类：计划 → 实际（缺失 / 已存在 / 类型冲突），实际 → 计划（多余项，排除 base 自身）
+    with phase(stats, "check.classify") as rec:
+        absent_dirs = planned_dirs - actual_dirs
+        absent_files = planned_files - actual_files
+        dir_conflicts = absent_dirs & actual_files
+        file_conflicts = absent_files & actual_dirs
+        missing_dirs = absent_dirs - dir_conflicts
+        missing_files = absent_files - file_conflicts
+        extra_dirs = actual_dirs - all_planned
+        extra_dirs.discard(_norm(str(base)))
+        extra_files = actual_files - all_planned
+        rec.items = len(all_planned) + len(actual_dirs) + len(actual_files)
+
+    # 权限快速检查：对缺失项最近的已存在祖先目录做可写性探测（轻量，非强制）
+    with phase(stats, "check.permissions") as rec:
+        blocked, rec.syscalls = _probe_write_permissions(
+            itertools.chain(missing_dirs, missing_files), actual_dirs,
+            missing_dirs if walked else set(), fs)
+        for d, n in blocked.items():
+            rep.permission_issues.append(f"no write permission to parent: {d} (blocks {n} missing items)")
+        rec.items = len(missing_dirs) + len(missing_files)
+
+    # 排序整理：每个结果集只排序一次；max_report 时只取前 N 项（部分排序）
+    with phase(stats, "check.sort"):
+        existing_dirs = planned_dirs & actual_dirs
+        existing_files = planned_files & actual_files
+        if echo:
+            rep.existing_dirs = _first_sorted(existing_dirs, max_report)
+            rep.existing_files = _first_sorted(existing_files, max_report)
+        rep.missing_dirs = _first_sorted(missing_dirs, max_report)
+        rep.missing_files = _first_sorted(missing_files, max_report)
+        rep.extra_dirs = _first_sorted(extra_dirs, max_report)
+        rep.extra_files = _first_sorted(extra_files, max_report)
+        rep.conflicts = [
+            ConflictItem(path=p, expected="dir" if p in dir_conflicts else "file",
+                         found="file" if p in dir_conflicts else "dir")
+            for p in _first_sorted(dir_conflicts | file_conflicts, max_report)
+        ]
+        permission_issues = set(rep.permission_issues)
+        outside_issues = set(rep.outside_base_issues)
+        rep.permission_issues = _first_sorted(permission_issues, max_report)
+        rep.outside_base_issues = _first_sorted(outside_issues, max_report)
+        # name_issues 可能有重复（dict 保序去重）
+        name_issues = list({(ni.path, ni.reason): ni for ni in rep.name_issues}.values())
+        rep.name_issues = name_issues[:max_report] if max_report is not None else name_issues
+
+    rep.counts = {
+        "planned_dirs": len(planned_dirs), "planned_files": len(planned_files),
+        "existing_dirs": len(existing_dirs), "existing_files": len(existing_files),
+        "missing_dirs": len(missing_dirs), "missing_files": len(missing_files),
+        "extra_dirs": len(extra_dirs), "extra_files": len(extra_files),
+        "conflicts": len(dir_conflicts) + len(file_conflicts),
+        "permission_issues": len(permission_issues), "name_issues": len(name_issues),
+        "outside_base_issues": len(outside_issues), "duplicate_planned_paths": len(duplicates),
+    }
+    return rep
 
-    for f in planned_files:
-        if f in actual_files:
-            rep.existing_files.append(f)
-        elif f in actual_dirs:
-            rep.conflicts.append(ConflictItem(path=f, expected="file", found="dir"))
-        else:
-            rep.missing_files.append(f)
 
-    # 实际 → 计划：多余项
-    all_planned = planned_dirs | planned_files
-    rep.extra_dirs = sorted(x for x in actual_dirs if x not in all_planned)
-    rep.extra_files = sorted(x for x in actual_files if x not in all_planned)
+_DIR, _FILE = 0, 1
+_PLANNED, _ACTUAL = 0, 1
+
 
-    # 权限快速检查：尝试对缺失项的父目录做可写性探测（轻量，非强制）
-    for p in rep.missing_dirs + rep.missing_files:
-        parent = Path(p).parent
+def _iter_walk(base_dir: str, follow_symlinks: bool) -> Iterator[Tuple[str, int, bool]]:
+    """
+    与 _walk_actual 相同的扫描（os.walk 语义：指向目录的链接算目录，不跟随时不进入），
+    但逐项产出 (规范化路径, _DIR/_FILE, 是否符号链接)，不驻留集合。
+    """
+    top = _norm(base_dir)
+    norm = _norm if (os.name == "nt" or top == os.curdir) else None
+    yield top, _DIR, False
+    stack = [top]
+    while stack:
+        d = stack.pop()
         try:
-            if parent.exists() and not os.access(parent, os.W_OK):
-                rep.permission_issues.append(f"no write permission to parent: {parent}")
-        except Exception:
-            # 忽略无法判断的情况
-            pass
-
-    # 排序整理
-    rep.missing_dirs.sort()
-    rep.missing_files.sort()
-    rep.existing_dirs.sort()
-    rep.existing_files.sort()
-    rep.extra_dirs.sort()
-    rep.extra_files.sort()
-    rep.conflicts.sort(key=lambda c: c.path)
-    rep.permission_issues = sorted(set(rep.permission_issues))
-    rep.outside_base_issues = sorted(set(rep.outside_base_issues))
-    # name_issues 可能有重复
-    seen = set()
-    uniq = []
-    for ni in rep.name_issues:
-        key = (ni.path, ni.reason)
-        if key not in seen:
-            seen.add(key)
-            uniq.append(ni)
-    rep.name_issues = uniq
-
-    # 计算多余项时，排除 base 自身
-    base_norm = _norm(str(base))
-    all_planned = planned_dirs | planned_files
-    rep.extra_dirs = sorted(x for x in actual_dirs if x not in all_planned and x != base_norm)
-    rep.extra_files = sorted(x for x in actual_files if x not in all_planned)
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                p = norm(e.path) if norm else e.path
+                try:
+                    is_dir = e.is_dir()
+                except OSError:
+                    is_dir = False
+                try:
+                    link = e.is_symlink()
+                except OSError:
+                    link = False
+                yield p, (_DIR if is_dir else _FILE), link
+                if is_dir and (follow_symlinks or not link):
+                    stack.append(p)
+
+
+def _audit_external(
+        plan: Union[BuildPlan, Iterable[BuildPlanItem]],
+        base_dir: str,
+        *,
+        follow_symlinks: bool,
+        max_path_len: int,
+        portable: PortableMode,
+        stats: Optional[RunStats],
+        echo: bool,
+        max_report: Optional[int],
+        memory_items: int,
+        spill_dir: Optional[str],
+) -> AuditReport:
+    """
+    有界内存审计：计划条目 (路径, 计划, 类型) 与磁盘条目 (路径, 实际, 类型, 是否链接) 送入同一个外部排序器，
+    按路径归并后逐组判定（归并连接）。重复路径即同组内的多条计划记录，各分类天然按路径有序，无需再排序。
+    大小写冲突先用布隆过滤器筛出可能冲突的 casefold 键，再重放一遍有序流只收集这些候选。
+    各类缓存超过 memory_items 即清空，只影响系统调用次数，不影响结果。
+    """
+    base = Path(base_dir)
+    rep = AuditReport(base_dir=str(base_dir))
+    rules = _select_rules(portable)
+    cap = max_report if max_report is not None else sys.maxsize
+    counts = dict.fromkeys(REPORT_LIST_FIELDS, 0)
+
+    def keep(field: str, value: Any) -> None:
+        counts[field] += 1
+        lst = getattr(rep, field)
+        if len(lst) < cap:
+            lst.append(value)
+
+    sorter = ExternalSorter(memory_items, tmp_dir=spill_dir)
+    try:
+        with phase(stats, "check.gather") as rec:
+            items = plan.items if isinstance(plan, BuildPlan) else plan
+            for item in items:
+                sorter.add((_norm(item.path), _PLANNED, _DIR if item.type == "dir" else _FILE, False))
+            rec.items = n_planned = sorter.count
+
+        with phase(stats, "check.walk") as rec:
+            if not base.exists():
+                rep.permission_issues.append(f"base dir not found: {base}")
+            else:
+                try:
+                    for p, kind, link in _iter_walk(str(base), follow_symlinks):
+                        sorter.add((p, _ACTUAL, kind, link))
+                except PermissionError as e:
+                    rep.permission_issues.append(f"walk permission error: {e}")
+            rec.items = sorter.count - n_planned
+
+        base_norm = _norm(str(base))
+        base_real = _norm(os.path.realpath(base))
+        base_prefix = base_real.rstrip(os.sep) + os.sep
+        # 子项的存在性已由有序流完全确定的路径（已扫描的目录、缺失项、文件）-> 真实路径
+        listed: Dict[str, str] = {}
+        comp_reasons: Dict[str, str] = {}
+        dir_reasons: Dict[str, List[str]] = {}
+        probe = _WriteProbe(set(), set(), cache_limit=memory_items)
+        bloom = BloomFilter(sorter.count) if rules is not None and rules.case_insensitive else None
+        case_keys: Set[str] = set()
+        illegal: List[NameIssue] = []
+        too_long: List[NameIssue] = []
+        n_illegal = n_long = 0
+
+        def comp_reason(name: str) -> str:
+            r = comp_reasons.get(name)
+            if r is None:
+                if len(comp_reasons) > memory_items:
+                    comp_reasons.clear()
+                r = comp_reasons[name] = _illegal_name_reasons_with_rules(name, rules)[1]
+            return r
+
+        def name_reasons(parent: str, name: str) -> List[str]:
+            pr = dir_reasons.get(parent)
+            if pr is None:
+                if len(dir_reasons) > memory_items:
+                    dir_reasons.clear()
+                pr = dir_reasons[parent] = [r for c in _iter_components_no_drive(parent) for r in (comp_reason(c),) if r]
+            r = comp_reason(name) if name else ""
+            return list(dict.fromkeys(pr + [r])) if r else pr
+
+        with phase(stats, "check.classify") as rec:
+            for path, group in itertools.groupby(sorter, key=operator.itemgetter(0)):
+                planned = 0
+                ptypes: Set[int] = set()
+                actual: Optional[int] = None
+                link = False
+                for _, src, kind, lk in group:
+                    if src == _PLANNED:
+                        planned += 1
+                        ptypes.add(kind)
+                    else:
+                        actual, link = kind, lk
+
+                parent, name = os.path.split(path)
+                if planned or actual == _DIR:
+                    # 父目录已登记时：本项不是链接即可由父目录真实路径拼出，无需 realpath
+                    pr = None if link else listed.get(parent)
+                    if path == base_norm:
+                        real = base_real
+                    elif pr is not None:
+                        real = os.path.join(pr, name)
+                    else:
+                        real = _norm(os.path.realpath(path))
+                    if not (link and actual == _DIR and not follow_symlinks):  # 未跟随的目录链接：子项未被扫描
+                        if len(listed) > memory_items:
+                            listed.clear()
+                        listed[path] = real
+
+                if not planned:
+                    if actual is not None and path != base_norm:
+                        keep("extra_dirs" if actual == _DIR else "extra_files", path)
+                    continue
+
+                if planned > 1:
+                    keep("duplicate_planned_paths", path)
+                if real != base_real and not real.startswith(base_prefix):
+                    keep("outside_base_issues", path)
+
+                if rules is not None:
+                    for reason in name_reasons(parent, name):
+                        n_illegal += 1
+                        if len(illegal) < cap:
+                            illegal.append(NameIssue(path=path, reason=reason))
+                    if bloom is not None and bloom.add(path.casefold()):
+                        case_keys.add(path.casefold())
+                if len(path) > max_path_len:
+                    n_long += 1
+                    if len(too_long) < cap:
+                        too_long.append(NameIssue(path=path, reason=f"path too long (> {max_path_len})"))
+
+                for kind in sorted(ptypes):
+                    label = "dirs" if kind == _DIR else "files"
+                    counts["planned_" + label] += 1
+                    if echo and len(getattr(rep, "planned_" + label)) < cap:
+                        getattr(rep, "planned_" + label).append(path)
+                    if actual == kind:
+                        counts["existing_" + label] += 1
+                        if echo and len(getattr(rep, "existing_" + label)) < cap:
+                            getattr(rep, "existing_" + label).append(path)
+                    elif actual is None:
+                        keep("missing_" + label, path)
+                        probe.add(path)
+                    else:
+                        keep("conflicts", ConflictItem(path=path, expected="dir" if kind == _DIR else "file",
+                                                       found="dir" if actual == _DIR else "file"))
+            rec.items = sorter.count
+            rec.syscalls = probe.syscalls
+
+        with phase(stats, "check.names") as rec:
+            case_issues: List[NameIssue] = []
+            if case_keys:
+                # 第二趟：重放有序流，只收集候选键下的计划路径（误判的候选会自然落空）
+                groups: Dict[str, Set[str]] = {}
+                for path, src, _, _ in sorter:
+                    if src == _PLANNED:
+                        key = path.casefold()
+                        if key in case_keys:
+                            groups.setdefault(key, set()).add(path)
+                for group in sorted(sorted(m) for m in groups.values()
+                                    if len(m) > 1 and len({os.path.basename(x) for x in m}) > 1):
+                    for p in group[1:]:
+                        case_issues.append(NameIssue(path=p, reason=f"{_CASE_COLLISION}{group[0]}"))
+            rep.name_issues = (illegal + too_long + case_issues)[:cap]
+            counts["name_issues"] = n_illegal + n_long + len(case_issues)
+            rec.items = counts["name_issues"]
+    finally:
+        sorter.close()
+
+    for d, n in probe.blocked.items():
+        rep.permission_issues.append(f"no write permission to parent: {d} (blocks {n} missing items)")
+    permission_issues = sorted(set(rep.permission_issues))
+    counts["permission_issues"] = len(permission_issues)
+    rep.permission_issues = permission_issues[:cap]
+    rep.counts = {f: counts[f] for f in (
+        "planned_dirs", "planned_files", "existing_dirs", "existing_files", "missing_dirs", "missing_files",
+        "extra_dirs", "extra_files", "conflicts", "permission_issues", "name_issues", "outside_base_issues",
+        "duplicate_planned_paths")}
+    return rep
+
+
+def _first_sorted(values: Iterable[str], cap: Optional[int]) -> List[str]:
+    """排序后的全部或前 cap 项；只要前 N 项时用堆选取，不做整体排序。"""
+    if cap is not None and len(values) > cap:
+        return heapq.nsmallest(cap, values)
+    return sorted(values)
+
+
+def audit_fail_fast(
+        plan: Union[BuildPlan, Iterable[BuildPlanItem]],
+        base_dir: str,
+        *,
+        follow_symlinks: bool = False,
+        max_path_len: int = 240,
+        portable: PortableMode = "auto",
+        max_report: int = 1,
+        stats: Optional[RunStats] = None,
+        observer: Optional[RunObserver] = None,
+) -> AuditReport:
+    """
+    CI 门禁用的流式审计：逐条消费计划（可为惰性迭代器，提前停止时其余条目不会生成），
+    对每个计划路径按需 lstat，不遍历整棵磁盘树；累计发现 max_report 个问题
+    （缺失 / 类型冲突 / 命名 / 越界 / 重复）即停止。
+    与 audit_filesystem 的判定一致，但不报告多余项，也不做可写性探测；
+    counts 只覆盖已检查的部分。observer：每发现一个问题立即回调 on_issues（问题数受 max_report 限制，无需攒批）。
+    """
+    stats = observed_stats(stats, observer)
+    on_issues = observer.on_issues if observer is not None else None
+    rep = AuditReport(base_dir=str(base_dir))
+    rules = _select_rules(portable)
+    base_real = _norm(os.path.realpath(base_dir))
+    base_prefix = base_real.rstrip(os.sep) + os.sep
+    seen: Set[str] = set()
+    absent: Set[str] = set()  # 已确定“磁盘上看不到其子项”的目录（缺失、是文件或未跟随的链接）
+    real_dirs: Dict[str, str] = {}  # 目录 -> 解析符号链接后的真实路径
+    comp_reasons: Dict[str, str] = {}
+    dir_reasons: Dict[str, List[str]] = {}
+    folded: Dict[Tuple[str, str], str] = {}
+    n_dirs = n_files = existing_dirs = existing_files = 0
+    syscalls = 0
+    issues = 0
+
+    def found(kind: str, value: Any) -> None:
+        nonlocal issues
+        getattr(rep, kind).append(value)
+        issues += 1
+        if on_issues is not None:
+            on_issues(kind, [value])
+
+    def comp_reason(name: str) -> str:
+        r = comp_reasons.get(name)
+        if r is None:
+            r = comp_reasons[name] = _illegal_name_reasons_with_rules(name, rules)[1]
+        return r
+
+    def name_reasons(parent: str, name: str) -> List[str]:
+        # 父目录各组件的问题按目录缓存，每条路径只需检查最后一个组件
+        pr = dir_reasons.get(parent)
+        if pr is None:
+            pr = dir_reasons[parent] = [r for c in _iter_components_no_drive(parent) for r in (comp_reason(c),) if r]
+        r = comp_reason(name) if name else ""
+        return pr + [r] if r else pr
+
+    walk_top = _norm(base_dir)
+    walk_prefix = walk_top.rstrip(os.sep) + os.sep
+
+    def in_walk(p: str) -> bool:
+        # 完整审计的 os.walk 能产出的路径（base 为 "." 时为不以 ".." 开头的相对路径）
+        if walk_top == os.curdir:
+            return not os.path.isabs(p) and p.split(os.sep, 1)[0] != os.pardir
+        return p == walk_top or p.startswith(walk_prefix)
+
+    def real_dir(d: str) -> str:
+        r = real_dirs.get(d)
+        if r is None:
+            r = real_dirs[d] = _norm(os.path.realpath(d))
+        return r
+
+    with phase(stats, "check") as rec:
+        syscalls += 1
+        if not os.path.exists(base_dir):
+            found("permission_issues", f"base dir not found: {Path(base_dir)}")
+        items = plan.items if isinstance(plan, BuildPlan) else plan
+        for item in items:
+            if issues >= max_report:
+                break
+            p = _norm(item.path)
+            is_dir = item.type == "dir"
+            if is_dir:
+                n_dirs += 1
+            else:
+                n_files += 1
+            if p in seen:
+                found("duplicate_planned_paths", p)
+                continue
+            seen.add(p)
+            parent, name = os.path.split(p)
+
+            if rules is not None:
+                for reason in name_reasons(parent, name):
+                    found("name_issues", NameIssue(path=p, reason=reason))
+                if rules.case_insensitive:
+                    first = folded.setdefault((parent.casefold(), name.casefold()), p)
+                    if first != p and os.path.basename(first) != name:
+                        found("name_issues", NameIssue(path=p, reason=f"{_CASE_COLLISION}{first}"))
+            if len(p) > max_path_len:
+                found("name_issues", NameIssue(path=p, reason=f"path too long (> {max_path_len})"))
+
+            # 按需探测磁盘：父目录已知不可见时无需系统调用
+            st = None
+            if parent not in absent:
+                syscalls += 1
+                try:
+                    st = os.lstat(p)
+                except OSError:
+                    pass
+            link = st is not None and stat.S_ISLNK(st.st_mode)
+            real = _norm(os.path.realpath(p)) if link else os.path.join(real_dir(parent), name)
+            if is_dir and not link:
+                real_dirs[p] = real  # 子项的真实路径直接由父目录拼出，无需逐个 realpath
+            if real != base_real and not real.startswith(base_prefix):
+                found("outside_base_issues", p)
+                if not in_walk(p):
+                    st = None  # 与完整审计一致：字面上不在 base 下的路径不会被扫描到
+            if link:
+                syscalls += 1
+                try:
+                    on_disk_dir = stat.S_ISDIR(os.stat(p).st_mode)  # 与 os.walk 一致：指向目录的链接算目录
+                except OSError:
+                    on_disk_dir = False
+            else:
+                on_disk_dir = st is not None and stat.S_ISDIR(st.st_mode)
+
+            if st is None:
+                found("missing_dirs" if is_dir else "missing_files", p)
+                if is_dir:
+                    absent.add(p)
+            elif is_dir != on_disk_dir:
+                found("conflicts", ConflictItem(path=p, expected=item.type, found="dir" if on_disk_dir else "file"))
+                if is_dir:
+                    absent.add(p)
+            elif is_dir:
+                existing_dirs += 1
+                if link and not follow_symlinks:
+                    absent.add(p)  # 未跟随的目录链接：完整审计不会进入其中
+            else:
+                existing_files += 1
+        rec.items = n_dirs + n_files
+        rec.syscalls = syscalls
+
+    rep.counts = {
+        "planned_dirs": n_dirs, "planned_files": n_files,
+        "existing_dirs": existing_dirs, "existing_files": existing_files,
+        **report_counts(rep, echo=False),
+    }
+    return rep
 
+
+def report_counts(rep: AuditReport, *, echo: bool = True) -> Dict[str, int]:
+    """按分类统计条目数（与 AuditReport 字段同名）；echo=False 时不含 planned_*/existing_*。"""
+    names = [f for f in REPORT_LIST_FIELDS if echo or f not in ECHO_FIELDS]
+    return {f: len(getattr(rep, f)) for f in names}
+
+
+# AuditReport 中的列表字段（报告分段的固定顺序）；ECHO_FIELDS 为只在回显时收集的部分
+REPORT_LIST_FIELDS = (
+    "planned_dirs", "planned_files", "missing_dirs", "missing_files", "existing_dirs", "existing_files",
+    "extra_dirs", "extra_files", "conflicts", "permission_issues", "name_issues", "outside_base_issues",
+    "duplicate_planned_paths",
+)
+ECHO_FIELDS = {"planned_dirs", "planned_files", "existing_dirs", "existing_files"}
+_ISSUE_FIELDS = tuple(f for f in REPORT_LIST_FIELDS if f not in ECHO_FIELDS)
+
+
+def report_from_dict(d: Dict[str, Any]) -> AuditReport:
+    """从 check --format json 的输出还原 AuditReport（用于分片报告合并）。"""
+    rep = AuditReport(**{k: v for k, v in d.items() if k not in ("conflicts", "name_issues")})
+    rep.conflicts = [ConflictItem(**c) for c in d.get("conflicts", [])]
+    rep.name_issues = [NameIssue(**ni) for ni in d.get("name_issues", [])]
     return rep
+
+
+def merge_reports(reports: List[AuditReport], *, portable: PortableMode = "auto") -> AuditReport:
+    """
+    合并 check --shard 产出的各分片报告：
+    - 计划/缺失/已存在/冲突/问题项取并集；
+    - 多余项取交集（某路径只有在所有分片里都不属于计划时才是真正多余）；
+    - 跨分片重复规划的路径补记到 duplicate_planned_paths；
+    - 大小写冲突按 portable 规则在全部计划路径上重新计算（分片各自只能看到本段内的冲突）。
+    输入须为完整报告：任一分类条数少于其 counts（--no-echo / --max-report / --filter 产出）时抛 ValueError。
+    """
+    if not reports:
+        raise ValueError("No reports to merge.")
+    for i, r in enumerate(reports, 1):
+        short = [f for f in REPORT_LIST_FIELDS if len(getattr(r, f)) < r.counts.get(f, 0)]
+        if short:
+            raise ValueError(f"Report {i} is incomplete ({', '.join(short)} shorter than counts); "
+                             f"re-run check without --no-echo / --max-report / --filter to merge shards.")
+    out = AuditReport(base_dir=reports[0].base_dir)
+    seen_planned: Set[str] = set()
+    dups: Set[str] = set()
+    extra_dirs: Optional[Set[str]] = None
+    extra_files: Optional[Set[str]] = None
+    for r in reports:
+        for p in r.planned_dirs + r.planned_files:
+            if p in seen_planned:
+                dups.add(p)
+        seen_planned.update(r.planned_dirs, r.planned_files)
+        extra_dirs = set(r.extra_dirs) if extra_dirs is None else extra_dirs & set(r.extra_dirs)
+        extra_files = set(r.extra_files) if extra_files is None else extra_files & set(r.extra_files)
+        dups.update(r.duplicate_planned_paths)
+
+    def union(attr: str) -> List[str]:
+        return sorted(set().union(*(getattr(r, attr) for r in reports)))
+
+    for attr in ("planned_dirs", "planned_files", "missing_dirs", "missing_files",
+                 "existing_dirs", "existing_files", "permission_issues", "outside_base_issues"):
+        setattr(out, attr, union(attr))
+    out.extra_dirs = sorted(extra_dirs)
+    out.extra_files = sorted(extra_files)
+    out.duplicate_planned_paths = sorted(dups)
+    conflicts = {(c.path, c.expected, c.found): c for r in reports for c in r.conflicts}
+    out.conflicts = sorted(conflicts.values(), key=lambda c: c.path)
+    name_issues = {(ni.path, ni.reason): ni for r in reports for ni in r.name_issues
+                   if not ni.reason.startswith(_CASE_COLLISION)}
+    out.name_issues = list(name_issues.values())
+    out.name_issues.extend(_case_collisions(sorted(seen_planned), _select_rules(portable)))
+    out.counts = report_counts(out)
+    return out
@@ -0,0 +1,74 @@
+# src/foldergen/core/events.py
+from __future__ import annotations
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+from .models import BuildPlanItem
+from .stats import PhaseStats, RunStats
+
+T = TypeVar("T")
+
+
+class RunObserver:
+    """
+    plan / build / check 的进度回调。子类只需覆盖关心的方法（默认什么都不做）。
+    条目与问题按批回调（每批最多 batch_size 条），每条的开销只是一次列表追加；
+    批内条目按产出/完成顺序排列。回调在调用方线程中执行（并行构建时为主线程）。
+    回调抛出的任何异常都会中止当前运行并原样抛出（build 带检查点时先保存已完成前缀），可用于提前停止。
+    """
+
+    batch_size: int = 1024
+
+    def on_items_planned(self, items: Sequence[BuildPlanItem]) -> None:
+        """计划展开出的一批条目（模板顺序）。"""
+
+    def on_items_created(self, items: Sequence[BuildPlanItem]) -> None:
+        """已落盘（或已写入所用后端）的一批目录/文件；已存在而跳过的文件同样计入。"""
+
+    def on_issues(self, kind: str, values: Sequence[Any]) -> None:
+        """一批审计问题；kind 为 AuditReport 的字段名（missing_files、conflicts 等），values 为其元素。"""
+
+    def on_phase_end(self, phase: PhaseStats) -> None:
+        """一个阶段正常结束（名称、累计耗时、条目数等同 --stats 中的一行）。"""
+
+
+class EventBuffer:
+    """把逐条事件攒成批再交给 callback；用完须调用 flush() 交出最后不满一批的部分。"""
+
+    def __init__(self, callback: Callable[[List[Any]], None], size: int):
+        self.callback = callback
+        self.size = max(1, size)
+        self.items: List[Any] = []
+
+    def add(self, item: Any) -> None:
+        self.items.append(item)
+        if len(self.items) >= self.size:
+            self.flush()
+
+    def extend(self, items: Iterable[Any]) -> None:
+        self.items.extend(items)
+        if len(self.items) >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.items:
+            items, self.items = self.items, []
+            self.callback(items)
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def observed_stats(stats: Optional[RunStats], observer: Optional[RunObserver]) -> Optional[RunStats]:
+    """让阶段结束事件经 RunStats 派发：没有 stats 时新建一个只为回调服务的。"""
+    if observer is None:
+        return stats
+    if stats is None:
+        stats = RunStats()
+    stats.observer = observer
+    return stats
@@ -0,0 +1,127 @@
+# src/foldergen/core/extsort.py
+from __future__ import annotations
+import heapq
+import marshal
+import math
+import os
+import tempfile
+from typing import Any, Iterable, Iterator, List, Optional
+
+
+class ExternalSorter:
+    """
+    固定内存的外部排序：内存中最多保留 max_items 条记录，满了就排序后溢出为临时文件（一个有序段），
+    迭代时对各段做 k 路归并。记录可以是 str / 元组等 marshal 支持、可比较的值。
+    段文件按块 marshal 写入，归并时每段只驻留一块；段数超过 fan_in 时先把最早的段两两归并，限制同时打开的文件数。
+    未发生溢出时等价于内存排序。可多次迭代；用完调用 close()（或用 with）删除临时文件。
+    """
+
+    def __init__(self, max_items: int = 1_000_000, *, tmp_dir: Optional[str] = None, fan_in: int = 64):
+        if max_items < 1:
+            raise ValueError("max_items must be >= 1")
+        self.max_items = max_items
+        self.tmp_dir = tmp_dir
+        self.fan_in = max(2, fan_in)
+        # 归并时每段驻留一块：块大小随预算缩放，fan_in 个段合计约占 max_items 的一半
+        self.block = max(16, min(4096, max_items // (2 * self.fan_in)))
+        self.count = 0
+        self._buf: List[Any] = []
+        self._runs: List[str] = []
+
+    @property
+    def spilled(self) -> int:
+        return len(self._runs)
+
+    def add(self, rec: Any) -> None:
+        self._buf.append(rec)
+        self.count += 1
+        if len(self._buf) >= self.max_items:
+            self._spill()
+
+    def extend(self, recs: Iterable[Any]) -> None:
+        for rec in recs:
+            self.add(rec)
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self._runs:
+            self._buf.sort()
+            return iter(self._buf)
+        if self._buf:
+            self._spill()
+        while len(self._runs) > self.fan_in:
+            head, self._runs = self._runs[:self.fan_in], self._runs[self.fan_in:]
+            self._runs.append(self._write_run(heapq.merge(*map(self._read_run, head))))
+            for p in head:
+                os.remove(p)
+        return heapq.merge(*map(self._read_run, self._runs))
+
+    def close(self) -> None:
+        for p in self._runs:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        self._runs = []
+        self._buf = []
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _spill(self) -> None:
+        self._buf.sort()
+        self._runs.append(self._write_run(self._buf))
+        self._buf = []
+
+    def _write_run(self, recs: Iterable[Any]) -> str:
+        fd, path = tempfile.mkstemp(prefix="foldergen-run-", suffix=".bin", dir=self.tmp_dir)
+        block: List[Any] = []
+        with os.fdopen(fd, "wb") as fw:
+            for rec in recs:
+                block.append(rec)
+                if len(block) >= self.block:
+                    marshal.dump(block, fw)
+                    block = []
+            if block:
+                marshal.dump(block, fw)
+        return path
+
+    @staticmethod
+    def _read_run(path: str) -> Iterator[Any]:
+        with open(path, "rb") as fr:
+            while True:
+                try:
+                    block = marshal.load(fr)
+                except EOFError:
+                    return
+                yield from block
+
+
+class BloomFilter:
+    """
+    位数组布隆过滤器（纯标准库）：add() 返回“加入前是否可能已存在”。
+    误判只会多报“可能存在”，不会漏报；每条约占 -ln(p)/ln(2)^2 位（p=1% 时约 1.2 字节）。
+    使用进程内的 hash()，不可跨进程持久化。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, key: str) -> bool:
+        # 双重哈希：由一个 64 位哈希的高低两半派生 k 个位置
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits, size = self.bits, self.size
+        present = True
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
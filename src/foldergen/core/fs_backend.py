@@ -0,0 +1,564 @@
+# src/foldergen/core/fs_backend.py
+from __future__ import annotations
+import os
+import stat as _stat
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .path_table import norm_path as _norm
+
+_WRITE_BUFFER = 64 * 1024
+_TMP_SUFFIX = ".foldergen-tmp"  # write_text 的临时文件后缀（与目标同目录，保证 os.replace 不跨设备）
+
+# MemoryFS.stat 的返回值：只含审计/构建用到的字段
+MemStat = namedtuple("MemStat", "st_mode st_size st_ino st_mtime_ns")
+
+
+class FileSystem(ABC):
+    """
+    构建与审计使用的最小文件系统接口（全部为同步调用，错误以 OSError 子类抛出，与 os 一致）；
+    后端须实现全部抽象方法，缺少任何一个在实例化时即报 TypeError：
+    mkdir / touch / write_text / copy_file 负责写入，scandir / stat / access / exists / walk / realpath 负责读取。
+    walk 的默认实现基于 scandir，语义同 os.walk（自顶向下；指向目录的链接算目录，不跟随时不进入）。
+    """
+
+    @abstractmethod
+    def mkdir(self, path: str, *, exist_ok: bool = True) -> None:
+        """创建目录及缺失的父目录（同 os.makedirs）。"""
+
+    @abstractmethod
+    def touch(self, path: str) -> None:
+        """创建空文件（已存在则截断）；父目录须已存在。"""
+
+    @abstractmethod
+    def write_text(self, path: str, chunks: Iterable[str]) -> int:
+        """按片段写入 UTF-8 文本（覆盖），返回写入字符数；片段迭代或写入中途出错时 path 不得留下半截内容。"""
+
+    @abstractmethod
+    def copy_file(self, src: str, dst: str, mode: str = "copy") -> str:
+        """用本地文件 src 的内容创建 dst，返回实际方式（"reflink" | "hardlink" | "copy"）。"""
+
+    @abstractmethod
+    def scandir(self, path: str) -> Iterator:
+        ...
+
+    @abstractmethod
+    def stat(self, path: str, *, follow_symlinks: bool = True):
+        ...
+
+    @abstractmethod
+    def access(self, path: str, mode: int) -> bool:
+        ...
+
+    @abstractmethod
+    def realpath(self, path: str) -> str:
+        ...
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def walk(self, top: str, followlinks: bool = False) -> Iterator[Tuple[str, List[str], List[str]]]:
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            try:
+                entries = list(self.scandir(root))
+            except OSError:
+                continue
+            dirs, files, descend = [], [], []
+            for e in entries:
+                try:
+                    is_dir = e.is_dir()
+                except OSError:
+                    is_dir = False
+                (dirs if is_dir else files).append(e.name)
+                if is_dir and (followlinks or not e.is_symlink()):
+                    descend.append(os.path.join(root, e.name))
+            yield root, dirs, files
+            stack.extend(reversed(descend))
+
+
+class LocalFS(FileSystem):
+    """本地磁盘：直接转发到 os（默认后端，行为与直接调用 os 完全相同）。"""
+
+    def mkdir(self, path: str, *, exist_ok: bool = True) -> None:
+        os.makedirs(path, exist_ok=exist_ok)
+
+    def touch(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as fw:
+            fw.write("")  # 空文件
+
+    def write_text(self, path: str, chunks: Iterable[str]) -> int:
+        # 经 64KiB 缓冲写入同目录临时文件，成功后 os.replace 原子改名；
+        # 渲染失败不会留下半截文件（否则重跑时会因 exists 被跳过）
+        tmp = path + _TMP_SUFFIX
+        written = 0
+        try:
+            with open(tmp, "w", encoding="utf-8", buffering=_WRITE_BUFFER) as fw:
+                for chunk in chunks:
+                    written += fw.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return written
+
+    def copy_file(self, src: str, dst: str, mode: str = "copy") -> str:
+        from .fs_ops import seed_file
+        return seed_file(src, dst, mode)
+
+    def scandir(self, path: str) -> Iterator:
+        return os.scandir(path)
+
+    def stat(self, path: str, *, follow_symlinks: bool = True):
+        return os.stat(path, follow_symlinks=follow_symlinks)
+
+    def access(self, path: str, mode: int) -> bool:
+        return os.access(path, mode)
+
+    def realpath(self, path: str) -> str:
+        return os.path.realpath(path)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def walk(self, top: str, followlinks: bool = False) -> Iterator[Tuple[str, List[str], List[str]]]:
+        return os.walk(top, followlinks=followlinks)
+
+
+LOCAL_FS = LocalFS()
+
+
+class _MemEntry:
+    __slots__ = ("name", "path", "_dir")
+
+    def __init__(self, name: str, path: str, is_dir: bool):
+        self.name, self.path, self._dir = name, path, is_dir
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return self._dir
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return not self._dir
+
+    def is_symlink(self) -> bool:
+        return False
+
+
+class MemoryFS(FileSystem):
+    """
+    内存中的虚拟目录树（无符号链接）：目录 -> {子项名: 是否目录}，文件 -> 大小（不保存内容）。
+    路径按 norm_path 规范化；"/"（或盘符根）与 "." 视为已存在的根目录。
+    readonly 中的目录不可写：在其下创建子项抛 PermissionError，access(W_OK) 返回 False。
+    created_dirs / created_files 统计本实例上新建的条目数（dry build 的结果）。
+    """
+
+    def __init__(self, *, readonly: Iterable[str] = ()):
+        self._children: Dict[str, Dict[str, bool]] = {}
+        self._files: Dict[str, int] = {}
+        self._stamps: Dict[str, Tuple[int, int]] = {}  # 路径 -> (inode, mtime_ns)
+        self.readonly: Set[str] = {_norm(p) for p in readonly}
+        self.created_dirs = 0
+        self.created_files = 0
+        self._clock = 0
+        self._lock = threading.Lock()  # apply_plan(jobs>1) 会从多个线程写入
+
+    @classmethod
+    def from_disk(cls, base_dir: str, *, follow_symlinks: bool = False) -> "MemoryFS":
+        """复制本地 base_dir 的目录结构（文件大小记为 0）；base_dir 不存在时返回空树。"""
+        fs = cls()
+        if not os.path.isdir(base_dir):
+            return fs
+        fs.mkdir(base_dir)
+        for root, dirs, files in os.walk(_norm(base_dir), followlinks=follow_symlinks):
+            for d in dirs:
+                fs._add(_norm(os.path.join(root, d)), True)
+            for f in files:
+                fs._add(_norm(os.path.join(root, f)), False)
+        fs.created_dirs = fs.created_files = 0
+        return fs
+
+    @property
+    def dirs(self) -> Set[str]:
+        return set(self._children)
+
+    @property
+    def files(self) -> Set[str]:
+        return set(self._files)
+
+    def _is_root(self, p: str) -> bool:
+        return p == os.curdir or os.path.dirname(p) == p
+
+    def _is_dir(self, p: str) -> bool:
+        return p in self._children or self._is_root(p)
+
+    def _parent(self, p: str) -> str:
+        return os.path.dirname(p) or os.curdir
+
+    def _add(self, p: str, is_dir: bool, size: int = 0) -> None:
+        parent = self._parent(p)
+        self._children.setdefault(parent, {})[os.path.basename(p)] = is_dir
+        # 与真实目录一致：子项增删改变父目录 mtime；新条目分配递增的 inode
+        self._clock += 1
+        self._stamps[parent] = (self._stamps.get(parent, (0, 0))[0], self._clock)
+        self._stamps[p] = (self._clock, self._clock)
+        if is_dir:
+            self._children.setdefault(p, {})
+            self.created_dirs += 1
+        else:
+            self._files[p] = size
+            self.created_files += 1
+
+    def _check_parent(self, p: str) -> None:
+        parent = self._parent(p)
+        if parent in self._files:
+            raise NotADirectoryError(f"Not a directory: '{parent}'")
+        if not self._is_dir(parent):
+            raise FileNotFoundError(f"No such file or directory: '{p}'")
+        if parent in self.readonly:
+            raise PermissionError(f"Permission denied: '{p}'")
+
+    def mkdir(self, path: str, *, exist_ok: bool = True) -> None:
+        p = _norm(path)
+        with self._lock:
+            if p in self._files:
+                raise FileExistsError(f"File exists: '{path}'")
+            if self._is_dir(p):
+                if not exist_ok:
+                    raise FileExistsError(f"File exists: '{path}'")
+                return
+            chain = []
+            cur = p
+            while not self._is_dir(cur):
+                if cur in self._files:
+                    raise NotADirectoryError(f"Not a directory: '{cur}'")
+                chain.append(cur)
+                cur = self._parent(cur)
+            for d in reversed(chain):
+                self._check_parent(d)
+                self._add(d, True)
+
+    def _put_file(self, path: str, size: int) -> None:
+        p = _norm(path)
+        with self._lock:
+            if self._is_dir(p):
+                raise IsADirectoryError(f"Is a directory: '{path}'")
+            if p in self._files:
+                self._files[p] = size
+                return
+            self._check_parent(p)
+            self._add(p, False, size)
+
+    def touch(self, path: str) -> None:
+        self._put_file(path, 0)
+
+    def write_text(self, path: str, chunks: Iterable[str]) -> int:
+        written = size = 0
+        for chunk in chunks:
+            written += len(chunk)
+            size += len(chunk.encode("utf-8"))
+        self._put_file(path, size)
+        return written
+
+    def copy_file(self, src: str, dst: str, mode: str = "copy") -> str:
+        # 源文件来自本地模板库：按真实大小记录，不复制内容
+        if not os.path.isfile(src):
+            raise FileNotFoundError(f"source not found: {src}")
+        self._put_file(dst, os.path.getsize(src))
+        return "copy"
+
+    def scandir(self, path: str) -> Iterator[_MemEntry]:
+        p = _norm(path)
+        if p in self._files:
+            raise NotADirectoryError(f"Not a directory: '{path}'")
+        if not self._is_dir(p):
+            raise FileNotFoundError(f"No such file or directory: '{path}'")
+        prefix = "" if p == os.curdir else p.rstrip(os.sep) + os.sep
+        return iter([_MemEntry(name, prefix + name, is_dir)
+                     for name, is_dir in list(self._children.get(p, {}).items())])
+
+    def stat(self, path: str, *, follow_symlinks: bool = True) -> MemStat:
+        p = _norm(path)
+        ino, mtime = self._stamps.get(p, (0, 0))
+        if p in self._files:
+            return MemStat(_stat.S_IFREG | 0o644, self._files[p], ino, mtime)
+        if self._is_dir(p):
+            return MemStat(_stat.S_IFDIR | 0o755, 0, ino, mtime)
+        raise FileNotFoundError(f"No such file or directory: '{path}'")
+
+    def access(self, path: str, mode: int) -> bool:
+        p = _norm(path)
+        if not (p in self._files or self._is_dir(p)):
+            return False
+        return not (mode & os.W_OK and p in self.readonly)
+
+    def realpath(self, path: str) -> str:
+        return _norm(os.path.abspath(path))  # 无符号链接：按词法规范化
+
+    def exists(self, path: str) -> bool:
+        p = _norm(path)
+        return p in self._files or self._is_dir(p)
+
+    def walk(self, top: str, followlinks: bool = False) -> Iterator[Tuple[str, List[str], List[str]]]:
+        # 直接读子项表，免去 scandir 的条目对象
+        top = _norm(top)
+        if not self._is_dir(top) or top in self._files:
+            return
+        stack = [top]
+        while stack:
+            root = stack.pop()
+            children = self._children.get(root, {})
+            dirs = [n for n, d in children.items() if d]
+            files = [n for n, d in children.items() if not d]
+            yield root, dirs, files
+            prefix = "" if root == os.curdir else root.rstrip(os.sep) + os.sep
+            stack.extend(prefix + d for d in reversed(dirs))
+
+
+class RecordingFS(FileSystem):
+    """
+    包装另一个后端，按操作统计调用次数与耗时（walk 按每个列出的目录记一次 "scandir"）。
+    keep_log=True 时另外按顺序记录 (操作, 路径)。用于把基准测试的 I/O 耗时与 CPU 耗时分开。
+    """
+
+    def __init__(self, inner: Optional[FileSystem] = None, *, keep_log: bool = False):
+        self.inner = inner or LOCAL_FS
+        self.keep_log = keep_log
+        self.log: List[Tuple[str, str]] = []
+        self.counts: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def io_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def _record(self, op: str, path: str, seconds: float) -> None:
+        with self._lock:
+            self.counts[op] = self.counts.get(op, 0) + 1
+            self.seconds[op] = self.seconds.get(op, 0.0) + seconds
+            if self.keep_log:
+                self.log.append((op, path))
+
+    def _call(self, op: str, path: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._record(op, path, time.perf_counter() - t0)
+
+    def summary(self) -> str:
+        parts = [f"{op}={self.counts[op]} ({self.seconds[op]:.3f}s)" for op in sorted(self.counts)]
+        return f"I/O {self.io_seconds:.3f}s: " + (", ".join(parts) or "no calls")
+
+    def mkdir(self, path: str, *, exist_ok: bool = True) -> None:
+        self._call("mkdir", path, self.inner.mkdir, path, exist_ok=exist_ok)
+
+    def touch(self, path: str) -> None:
+        self._call("touch", path, self.inner.touch, path)
+
+    def write_text(self, path: str, chunks: Iterable[str]) -> int:
+        return self._call("write_text", path, self.inner.write_text, path, chunks)
+
+    def copy_file(self, src: str, dst: str, mode: str = "copy") -> str:
+        return self._call("copy_file", dst, self.inner.copy_file, src, dst, mode)
+
+    def scandir(self, path: str) -> Iterator:
+        return self._call("scandir", path, self.inner.scandir, path)
+
+    def stat(self, path: str, *, follow_symlinks: bool = True):
+        return self._call("stat", path, self.inner.stat, path, follow_symlinks=follow_symlinks)
+
+    def access(self, path: str, mode: int) -> bool:
+        return self._call("access", path, self.inner.access, path, mode)
+
+    def realpath(self, path: str) -> str:
+        return self._call("realpath", path, self.inner.realpath, path)
+
+    def exists(self, path: str) -> bool:
+        return self._call("stat", path, self.inner.exists, path)
+
+    def walk(self, top: str, followlinks: bool = False) -> Iterator[Tuple[str, List[str], List[str]]]:
+        it = self.inner.walk(top, followlinks=followlinks)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                entry = next(it)
+            except StopIteration:
+                return
+            self._record("scandir", entry[0], time.perf_counter() - t0)
+            yield entry
+
+
+class ThrottledFS(FileSystem):
+    """
+    包装另一个后端，限制打到共享存储（NAS 等）上的操作速率与并发，所有操作（含 stat 探测）都计入：
+    - max_ops_per_sec：令牌桶限速，桶容量 burst（默认约 0.1 秒的配额）；各线程按到达顺序预约令牌，在锁外等待；
+    - max_concurrency：同时在途的操作数上限。adaptive=True 时上限在 [1, max_concurrency] 间按 AIMD 调整：
+      从 1 开始，每完成 window 个操作比较该窗口的平均延迟与基线（迄今最低的窗口平均延迟），
+      超过基线 × tolerance 时减为 3/4，否则加 1。延迟只计后端调用本身，不含令牌与并发等待。
+    summary() 报告实际吞吐、令牌等待与并发调整情况。
+    """
+
+    def __init__(self, inner: Optional[FileSystem] = None, *, max_ops_per_sec: Optional[float] = None,
+                 burst: Optional[float] = None, max_concurrency: Optional[int] = None, adaptive: bool = False,
+                 window: int = 32, tolerance: float = 2.0):
+        if max_ops_per_sec is not None and max_ops_per_sec <= 0:
+            raise ValueError("max_ops_per_sec must be > 0")
+        if adaptive and not max_concurrency:
+            raise ValueError("adaptive concurrency needs max_concurrency as its ceiling")
+        self.inner = inner or LOCAL_FS
+        self.rate = max_ops_per_sec
+        self.burst = max(1.0, burst if burst is not None else (max_ops_per_sec or 0) * 0.1)
+        self.max_concurrency = max(1, max_concurrency) if max_concurrency else None
+        self.adaptive = adaptive
+        self.window = max(1, window)
+        self.tolerance = tolerance
+        self.limit = 1 if adaptive else (self.max_concurrency or 0)
+        self.lowest_limit = self.highest_limit = self.limit
+        self.backoffs = 0
+        self.baseline: Optional[float] = None
+        self.ops = 0
+        self.op_seconds = 0.0  # 后端调用耗时之和
+        self.token_wait = 0.0  # 各线程为令牌桶等待的时间之和
+        self._tokens = self.burst
+        self._refill_at = time.monotonic()
+        self._inflight = 0
+        self._win_n = 0
+        self._win_sum = 0.0
+        self._first: Optional[float] = None
+        self._last = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def elapsed(self) -> float:
+        return self._last - self._first if self._first is not None else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """实际达到的操作数/秒（首个操作到达到最后一个操作完成的墙钟时间）。"""
+        span = self.elapsed
+        return self.ops / span if span > 0 else 0.0
+
+    def summary(self) -> str:
+        mean_ms = self.op_seconds / self.ops * 1000 if self.ops else 0.0
+        parts = [f"I/O {self.ops} ops in {self.elapsed:.2f}s, {self.throughput:.0f} ops/s achieved"]
+        if self.rate:
+            parts.append(f"limit {self.rate:g}/s, token waits {self.token_wait:.2f}s summed over threads")
+        if self.adaptive:
+            parts.append(f"concurrency {self.limit}/{self.max_concurrency} "
+                         f"(range {self.lowest_limit}-{self.highest_limit}, {self.backoffs} back-offs)")
+        elif self.max_concurrency:
+            parts.append(f"concurrency {self.max_concurrency}")
+        parts.append(f"mean op latency {mean_ms:.2f} ms")
+        return "; ".join(parts)
+
+    def _acquire(self) -> float:
+        cond = self._cond
+        wait = 0.0
+        with cond:
+            if self._first is None:
+                self._first = time.perf_counter()
+            if self.rate:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refill_at) * self.rate)
+                self._refill_at = now
+                self._tokens -= 1  # 可透支：排在后面的线程等更久，整体速率不超过 rate
+                if self._tokens < 0:
+                    wait = -self._tokens / self.rate
+                    self.token_wait += wait
+        if wait > 0:
+            time.sleep(wait)
+        if self.limit:
+            with cond:
+                while self._inflight >= self.limit:
+                    cond.wait()
+                self._inflight += 1
+        return time.perf_counter()
+
+    def _release(self, t0: float) -> None:
+        t1 = time.perf_counter()
+        latency = t1 - t0
+        with self._cond:
+            self.ops += 1
+            self.op_seconds += latency
+            self._last = max(self._last, t1)
+            if not self.limit:
+                return
+            self._inflight -= 1
+            if self.adaptive:
+                self._win_n += 1
+                self._win_sum += latency
+                if self._win_n >= self.window:
+                    self._adjust(self._win_sum / self._win_n)
+                    self._win_n = 0
+                    self._win_sum = 0.0
+            self._cond.notify_all()
+
+    def _adjust(self, avg: float) -> None:
+        base = self.baseline
+        if base is not None and avg > base * self.tolerance:
+            new = max(1, self.limit * 3 // 4)
+            if new < self.limit:
+                self.limit = new
+                self.backoffs += 1
+                self.lowest_limit = min(self.lowest_limit, new)
+        elif self.limit < self.max_concurrency:
+            self.limit += 1
+            self.highest_limit = max(self.highest_limit, self.limit)
+        self.baseline = avg if base is None else min(avg, base)
+
+    def _call(self, fn, *args, **kwargs):
+        t0 = self._acquire()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release(t0)
+
+    def mkdir(self, path: str, *, exist_ok: bool = True) -> None:
+        self._call(self.inner.mkdir, path, exist_ok=exist_ok)
+
+    def touch(self, path: str) -> None:
+        self._call(self.inner.touch, path)
+
+    def write_text(self, path: str, chunks: Iterable[str]) -> int:
+        return self._call(self.inner.write_text, path, chunks)
+
+    def copy_file(self, src: str, dst: str, mode: str = "copy") -> str:
+        return self._call(self.inner.copy_file, src, dst, mode)
+
+    def scandir(self, path: str) -> Iterator:
+        return self._call(self.inner.scandir, path)
+
+    def stat(self, path: str, *, follow_symlinks: bool = True):
+        return self._call(self.inner.stat, path, follow_symlinks=follow_symlinks)
+
+    def access(self, path: str, mode: int) -> bool:
+        return self._call(self.inner.access, path, mode)
+
+    def realpath(self, path: str) -> str:
+        return self._call(self.inner.realpath, path)
+
+    def exists(self, path: str) -> bool:
+        return self._call(self.inner.exists, path)
+
+    def walk(self, top: str, followlinks: bool = False) -> Iterator[Tuple[str, List[str], List[str]]]:
+        it = self.inner.walk(top, followlinks=followlinks)
+        while True:
+            t0 = self._acquire()  # 每列出一个目录算一次操作
+            try:
+                entry = next(it)
+            except StopIteration:
+                return
+            finally:
+                self._release(t0)
+            yield entry
@@ -1,17 +1,349 @@
 import os
-from typing import Iterable
+import shutil
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Deque, Dict, Iterable, List, Literal, Optional, Tuple
+from .events import EventBuffer, RunObserver, observed_stats
+from .fs_backend import LOCAL_FS, FileSystem
+from .journal import BuildCheckpoint, BuildJournal, plan_fingerprint
 from .models import BuildPlan, BuildPlanItem
+from .parser import load_content_template
+from .stats import RunStats, phase
 
-def apply_plan(plan: BuildPlan, simulate: bool = False) -> None:
-    for item in plan.items:
-        if item.type == "dir":
-            if not simulate:
-                os.makedirs(item.path, exist_ok=True)
-            print(f"[dir ] {item.path}")
-        elif item.type == "file":
-            if not simulate:
-                os.makedirs(os.path.dirname(item.path), exist_ok=True)
-                if not os.path.exists(item.path):
-                    with open(item.path, "w", encoding="utf-8") as fw:
-                        fw.write("")  # 空文件
-            print(f"[file] {item.path}")
+try:  # 仅 Linux/Unix 提供；用于 reflink（FICLONE）
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+LinkMode = Literal["copy", "reflink", "hardlink"]
+
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
+@dataclass
+class SeedStats:
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    reflinked: int = 0
+    hardlinked: int = 0
+    copied: int = 0
+
+    rendered: int = 0
+
+    def record(self, how: str, size: int, seconds: float) -> None:
+        self.files += 1
+        self.bytes += size
+        self.seconds += seconds
+        if how == "reflink":
+            self.reflinked += 1
+        elif how == "hardlink":
+            self.hardlinked += 1
+        elif how == "render":
+            self.rendered += 1
+        else:
+            self.copied += 1
+
+    def merge(self, other: "SeedStats") -> None:
+        # 并行写入时各批次独立统计，最后在主线程合并
+        self.files += other.files
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.reflinked += other.reflinked
+        self.hardlinked += other.hardlinked
+        self.copied += other.copied
+        self.rendered += other.rendered
+
+    def summary(self) -> str:
+        mib = self.bytes / (1024 * 1024)
+        rate = mib / self.seconds if self.seconds > 0 else 0.0
+        return (f"Seeded {self.files} files ({mib:.1f} MiB) in {self.seconds:.2f}s, {rate:.1f} MiB/s "
+                f"[reflink={self.reflinked}, hardlink={self.hardlinked}, copy={self.copied}, "
+                f"rendered={self.rendered}]")
+
+
+def _copy_fd(src_fd: int, dst_fd: int, size: int) -> None:
+    # 优先走内核内拷贝：copy_file_range（同文件系统可能零拷贝）→ sendfile → 用户态缓冲拷贝
+    offset = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while offset < size:
+                n = copy_file_range(src_fd, dst_fd, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError:
+            if offset:  # 已部分写入时不能安全切换方式
+                raise
+        if offset >= size:
+            return
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None:
+        try:
+            while offset < size:
+                n = sendfile(dst_fd, src_fd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError:
+            if offset:
+                raise
+        if offset >= size:
+            return
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    with open(src_fd, "rb", closefd=False) as fr, open(dst_fd, "wb", closefd=False) as fw:
+        shutil.copyfileobj(fr, fw, 1024 * 1024)
+
+
+def seed_file(src: str, dst: str, mode: LinkMode = "copy") -> str:
+    """
+    用 src 的内容创建 dst，返回实际使用的方式（"reflink" | "hardlink" | "copy"）。
+    reflink / hardlink 不可用（跨设备、文件系统不支持等）时自动退化为普通拷贝。
+    """
+    if not os.path.isfile(src):
+        raise FileNotFoundError(f"source not found: {src}")
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except FileExistsError:
+            # 重跑时 dst 可能已是指向 src 的硬链接：不能再以 "wb" 打开（会截断源文件）
+            if os.path.samefile(src, dst):
+                return "hardlink"
+        except OSError:
+            pass
+    with open(src, "rb") as fr, open(dst, "wb") as fw:
+        if mode == "reflink" and fcntl is not None:
+            try:
+                fcntl.ioctl(fw.fileno(), _FICLONE, fr.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        _copy_fd(fr.fileno(), fw.fileno(), os.fstat(fr.fileno()).st_size)
+    return "copy"
+
+
+def write_rendered(template_path: str, dst: str, context: Dict[str, Any], *,
+                   fs: Optional[FileSystem] = None) -> int:
+    """按片段流式渲染内容模板写入 dst（本地经 64KiB 缓冲落盘，不拼接整串），返回写入字符数。"""
+    tpl = load_content_template(template_path)
+    return (fs or LOCAL_FS).write_text(dst, tpl.iter_render(context))
+
+
+def _write_file(item: BuildPlanItem, link_mode: LinkMode, context: Optional[Dict[str, Any]],
+                seeded: SeedStats, *, check_exists: bool = True, fs: FileSystem = LOCAL_FS) -> int:
+    # 创建单个文件条目，返回发起的系统调用数（估计值）
+    # check_exists=False 仅用于全新的暂存目录：已知不存在，省掉 exists 探测
+    fs.mkdir(os.path.dirname(item.path))
+    if check_exists and fs.exists(item.path):
+        return 2
+    t0 = time.perf_counter()
+    if item.source:
+        how = fs.copy_file(item.source, item.path, link_mode)
+        seeded.record(how, fs.stat(item.path).st_size, time.perf_counter() - t0)
+    elif item.template:
+        if context is None:
+            raise ValueError(f"No vars context to render content template: {item.template}")
+        size = write_rendered(item.template, item.path, context, fs=fs)
+        seeded.record("render", size, time.perf_counter() - t0)
+    else:
+        fs.touch(item.path)
+    return 3
+
+
+def _write_batch(batch: List[BuildPlanItem], link_mode: LinkMode,
+                 context: Optional[Dict[str, Any]], fs: FileSystem) -> Tuple[SeedStats, int]:
+    seeded = SeedStats()
+    syscalls = 0
+    for item in batch:
+        syscalls += _write_file(item, link_mode, context, seeded, fs=fs)
+    return seeded, syscalls
+
+
+def apply_plan(plan: BuildPlan, simulate: bool = False, *, stats: Optional[RunStats] = None,
+               link_mode: LinkMode = "copy", jobs: int = 1, batch_size: int = 256,
+               checkpoint_path: Optional[str] = None, fs: Optional[FileSystem] = None,
+               echo: bool = True, observer: Optional[RunObserver] = None) -> SeedStats:
+    """
+    jobs > 1 时目录仍在主线程按计划顺序创建（保证父目录先于子项），
+    文件按 batch_size 分批交给线程池并行写入；输出顺序与串行一致。
+    checkpoint_path：定期记录“已完成前缀”的计划序号；重跑同一计划时直接跳过该前缀
+    （不对其中条目做 exists 探测），全部完成后删除检查点。
+    fs：写入的文件系统后端（默认本地磁盘；MemoryFS 即为真实构建逻辑的 dry run）。echo=False 时不逐项打印。
+    observer：已完成的条目按批经 on_items_created 回调（并行时文件在其批次回收后上报）；simulate 时不回调。
+    """
+    fs = fs or LOCAL_FS
+    stats = observed_stats(stats, observer)
+    created = EventBuffer(observer.on_items_created, observer.batch_size) if observer and not simulate else None
+    seeded = SeedStats()
+    context = plan.context
+    checkpoint = None
+    if checkpoint_path and not simulate:
+        checkpoint = BuildCheckpoint.open(checkpoint_path, plan_fingerprint(plan))
+    start = checkpoint.done if checkpoint else -1
+    with phase(stats, "build") as rec:
+        pool = ThreadPoolExecutor(max_workers=jobs) if (jobs > 1 and not simulate) else None
+        outstanding: Deque[Tuple[Future, int, List[BuildPlanItem]]] = deque()  # (任务, 批次中最大的计划序号, 批次)，按提交顺序
+        batch: List[BuildPlanItem] = []
+        t_submit = None  # 并行模式下吞吐按墙钟计算（各线程耗时之和会高估）
+
+        def collect(fut: Future, last: int, done: List[BuildPlanItem]) -> None:
+            part, n = fut.result()
+            seeded.merge(part)
+            rec.syscalls += n
+            if checkpoint:
+                checkpoint.advance(last)
+            if created is not None:
+                created.extend(done)
+
+        def settle(idx: int) -> None:
+            # 回收已完成的前缀批次；没有在途文件时第 idx 项及之前都已完成
+            while outstanding and outstanding[0][0].done():
+                collect(*outstanding.popleft())
+            if checkpoint and not outstanding and not batch:
+                checkpoint.advance(idx)
+
+        try:
+            for idx, item in enumerate(plan.items):
+                if idx <= start:
+                    rec.items += 1
+                    continue  # 检查点之前的前缀已完成
+                if item.type == "dir":
+                    if not simulate:
+                        fs.mkdir(item.path)
+                        rec.syscalls += 1
+                        if created is not None:
+                            created.add(item)
+                    if echo:
+                        print(f"[dir ] {item.path}")
+                elif item.type == "file":
+                    if simulate:
+                        pass
+                    elif pool is None:
+                        rec.syscalls += _write_file(item, link_mode, context, seeded, fs=fs)
+                        if created is not None:
+                            created.add(item)
+                    else:
+                        batch.append(item)
+                        if len(batch) >= batch_size:
+                            t_submit = t_submit or time.perf_counter()
+                            outstanding.append((pool.submit(_write_batch, batch, link_mode, context, fs), idx,
+                                                batch))
+                            batch = []
+                    if not echo:
+                        pass
+                    elif item.source:
+                        print(f"[file] {item.path} <- {item.source}")
+                    elif item.template:
+                        print(f"[file] {item.path} <= {item.template}")
+                    else:
+                        print(f"[file] {item.path}")
+                rec.items += 1
+                settle(idx)
+            if pool is not None:
+                if batch:
+                    t_submit = t_submit or time.perf_counter()
+                    outstanding.append((pool.submit(_write_batch, batch, link_mode, context, fs),
+                                        len(plan.items) - 1, batch))
+                    batch = []
+                while outstanding:
+                    collect(*outstanding.popleft())
+                if t_submit is not None:
+                    seeded.seconds = time.perf_counter() - t_submit
+            if created is not None:
+                created.flush()
+        except BaseException:
+            if checkpoint:
+                checkpoint.save()  # 中断/出错：保存已确认完成的前缀，便于续建
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+    if checkpoint:
+        checkpoint.finish()
+    return seeded
+
+
+_STAGING_SUFFIX = ".foldergen-staging"
+JOURNAL_NAME = ".foldergen-journal.jsonl"
+
+
+def apply_plan_atomic(plan: BuildPlan, base_dir: str, *, stats: Optional[RunStats] = None,
+                      link_mode: LinkMode = "copy", journal_path: Optional[str] = None) -> SeedStats:
+    """
+    事务式构建：每个顶层根目录先在同级暂存目录（.<name>.foldergen-staging）中完整生成，
+    再用一次 os.rename 发布；base 下的顶层文件经临时文件 + os.replace 原子写入。
+    进度写入预写日志（默认 base/.foldergen-journal.jsonl），中断后重跑同一计划会：
+    - 跳过已发布的根；
+    - 在暂存目录中从最后提交的条目之后继续，而不是重新检查每个条目。
+    全部完成后删除日志。目标根目录已存在时无法整体发布，退化为就地补齐（仍记日志）。
+    """
+    base = os.path.abspath(base_dir)
+    os.makedirs(base, exist_ok=True)
+    journal = BuildJournal.open(journal_path or os.path.join(base, JOURNAL_NAME), plan_fingerprint(plan))
+
+    # 按顶层组件分组（保持计划顺序），记录每项在计划中的全局序号
+    groups: Dict[str, List[Tuple[int, BuildPlanItem]]] = {}
+    for idx, item in enumerate(plan.items):
+        rel = os.path.relpath(os.path.abspath(item.path), base)
+        top = rel.split(os.sep, 1)[0]
+        if top in (os.pardir, os.curdir):
+            journal.close()
+            raise ValueError(f"Atomic build requires every item inside --base: {item.path}")
+        groups.setdefault(top, []).append((idx, item))
+
+    seeded = SeedStats()
+    context = plan.context
+    try:
+        with phase(stats, "build") as rec:
+            for top, members in groups.items():
+                target = os.path.join(base, top)
+                is_root_dir = any(it.type == "dir" and os.path.abspath(it.path) == target for _, it in members)
+                if top in journal.published:
+                    for _, it in members:
+                        print(f"[skip] {it.path}")
+                    rec.items += len(members)
+                    continue
+                last = journal.last_done(top)
+                staging = os.path.join(base, f".{top}{_STAGING_SUFFIX}")
+                # 暂存目录存在说明上次在此根中途中断；目标已存在（且非本次发布）则只能就地补齐
+                in_place = is_root_dir and os.path.exists(target) and not os.path.exists(staging)
+                resumed = last >= 0
+                for idx, it in members:
+                    if idx <= last:
+                        rec.items += 1
+                        continue  # 已提交的前缀：不做任何探测
+                    if is_root_dir and not in_place:
+                        staged = replace(it, path=staging + os.path.abspath(it.path)[len(target):])
+                        if staged.type == "dir":
+                            os.makedirs(staged.path, exist_ok=True)
+                            rec.syscalls += 1
+                        else:
+                            rec.syscalls += _write_file(staged, link_mode, context, seeded, check_exists=resumed)
+                    elif it.type == "dir":
+                        os.makedirs(it.path, exist_ok=True)
+                        rec.syscalls += 1
+                    elif not is_root_dir and not os.path.exists(it.path):
+                        # base 下的顶层文件：写临时文件后原子替换
+                        tmp = replace(it, path=os.path.join(base, f".{top}{_STAGING_SUFFIX}"))
+                        _write_file(tmp, link_mode, context, seeded, check_exists=False)
+                        os.replace(tmp.path, it.path)
+                        rec.syscalls += 4
+                    else:
+                        rec.syscalls += _write_file(it, link_mode, context, seeded)
+                    print(f"[{'dir ' if it.type == 'dir' else 'file'}] {it.path}")
+                    journal.mark_done(top, idx)
+                    rec.items += 1
+                if is_root_dir and not in_place:
+                    os.rename(staging, target)  # 单次 rename 发布整个根
+                    rec.syscalls += 1
+                journal.mark_published(top)
+    except BaseException:
+        journal.close()  # 已完成的条目照常提交，便于下次续建
+        raise
+    journal.close(remove=True)
+    return seeded
@@ -1,6 +1,8 @@
 # src/foldergen/core/gen_syntax.py
 from __future__ import annotations
 import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from datetime import date, timedelta
 
 _GEN_PATTERN = re.compile(r"\{\{([^{}]+)\}\}")
@@ -86,7 +88,117 @@ def _range_date_count(start: date, stop: date, step_spec: str) -> int:
     return count
 
 
-def _expand_one(expr: str) -> list[str]:
+@dataclass(frozen=True)
+class GeneratorSpec(ABC):
+    """
+    解析后的单个 {{...}} 生成器（不可变、可哈希）。
+    一次计划展开内相同表达式只解析、展开一次（见 GeneratorCache）。
+    """
+    kind: str  # int | alpha | date | enum
+    expr: str  # 原始表达式，用于报错定位
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def values(self) -> tuple[str, ...]:
+        return tuple(self._generate())
+
+    @abstractmethod
+    def _generate(self) -> list[str]:
+        ...
+
+
+@dataclass(frozen=True)
+class IntSpec(GeneratorSpec):
+    start: int = 0
+    stop: int = 0
+    step: int = 1
+    pad: int | None = None
+
+    def _range(self) -> range:
+        return range(self.start, self.stop + (1 if self.step > 0 else -1), self.step)
+
+    def count(self) -> int:
+        return len(self._range())
+
+    def _generate(self) -> list[str]:
+        if self.pad is None:
+            return list(map(str, self._range()))
+        # 单个格式串批量补零（与 str.zfill 对负数的行为一致：-5 -> -05）
+        return list(map(f"{{:0{self.pad}d}}".format, self._range()))
+
+
+@dataclass(frozen=True)
+class AlphaSpec(GeneratorSpec):
+    start: int = 0  # ord 值
+    stop: int = 0
+    step: int = 1
+
+    def _range(self) -> range:
+        return range(self.start, self.stop + (1 if self.step > 0 else -1), self.step)
+
+    def count(self) -> int:
+        return len(self._range())
+
+    def _generate(self) -> list[str]:
+        return list(map(chr, self._range()))
+
+
+@dataclass(frozen=True)
+class DateSpec(GeneratorSpec):
+    start: date = date.min
+    stop: date = date.min
+    step: str = ""
+    fmt: str = "%Y%m%d"
+
+    def count(self) -> int:
+        return _range_date_count(self.start, self.stop, self.step)
+
+    def _generate(self) -> list[str]:
+        unit = self.step[-1].lower()
+        n = int(self.step[:-1])
+        cur, stop = self.start, self.stop
+        out = []
+        while (cur <= stop) if n > 0 else (cur >= stop):
+            out.append(cur.strftime(self.fmt))
+            if unit == "d":
+                cur = cur + timedelta(days=n)
+            elif unit == "m":
+                cur = _add_months(cur, n)
+            else:
+                cur = _add_months(cur, n * 12)
+        return out
+
+
+@dataclass(frozen=True)
+class EnumSpec(GeneratorSpec):
+    items: tuple[str, ...] = ()
+
+    def count(self) -> int:
+        return len(self.items)
+
+    def _generate(self) -> list[str]:
+        return list(self.items)
+
+
+def _parse_int(kv: dict, key: str, default: str | None, expr: str, message: str) -> int:
+    try:
+        return int(kv.get(key, default))
+    except Exception:
+        raise GeneratorSyntaxError(message, expr)
+
+
+def _parse_date(v: str, expr: str) -> date:
+    try:
+        y, m, d = [int(x) for x in v.split("-")]
+        return date(y, m, d)
+    except Exception:
+        raise GeneratorSyntaxError(f"invalid date (expected YYYY-MM-DD): {v}", expr)
+
+
+def parse_generator(expr: str) -> GeneratorSpec:
+    """解析 {{...}} 内部表达式为 GeneratorSpec，并做参数/步长预检。"""
     if ":" not in expr:
         raise GeneratorSyntaxError("Bad generator (missing type prefix like int/alpha/date)", expr)
     t, rest = expr.split(":", 1)
@@ -94,67 +206,36 @@ def _expand_one(expr: str) -> list[str]:
     kv = _parse_kv(rest)
 
     if typ == "int":
-        try:
-            start = int(kv.get("start"))
-            stop = int(kv.get("stop"))
-        except Exception:
-            raise GeneratorSyntaxError("int requires numeric start/stop", expr)
-        step = int(kv.get("step", "1"))
+        start = _parse_int(kv, "start", None, expr, "int requires numeric start/stop")
+        stop = _parse_int(kv, "stop", None, expr, "int requires numeric start/stop")
+        step = _parse_int(kv, "step", "1", expr, "int step must be an integer")
         pad = kv.get("pad")
-        pad_n = int(pad) if pad is not None else None
-        # 预检
-        _ = _range_int_count(start, stop, step)
-        # 实际生成
-        cur = start
-        cond = (lambda x: x <= stop) if step > 0 else (lambda x: x >= stop)
-        out = []
-        while cond(cur):
-            s = str(cur)
-            if pad_n is not None:
-                s = s.zfill(int(pad_n))
-            out.append(s)
-            cur += step
-        return out
+        if pad is not None:
+            pad = _parse_int(kv, "pad", None, expr, "int pad must be an integer")
+            if pad < 0:
+                raise GeneratorSyntaxError("int pad must be >= 0", expr)
+        _range_int_count(start, stop, step)  # 预检 step=0
+        return IntSpec(kind="int", expr=expr, start=start, stop=stop, step=step, pad=pad)
 
     elif typ == "alpha":
-        start = kv.get("start");
+        start = kv.get("start")
         stop = kv.get("stop")
         if not start or not stop or len(start) != 1 or len(stop) != 1:
             raise GeneratorSyntaxError("alpha requires single-char start/stop", expr)
-        a = ord(start);
-        b = ord(stop)
-        step = int(kv.get("step", "1"))
-        _ = _range_alpha_count(a, b, step)
-        rng = range(a, b + (1 if step > 0 else -1), step)
-        return [chr(c) for c in rng]
+        step = _parse_int(kv, "step", "1", expr, "alpha step must be an integer")
+        _range_alpha_count(ord(start), ord(stop), step)
+        return AlphaSpec(kind="alpha", expr=expr, start=ord(start), stop=ord(stop), step=step)
 
     elif typ == "date":
-        s = kv.get("start");
+        s = kv.get("start")
         e = kv.get("stop")
-        if not s or not e:
-            raise GeneratorSyntaxError("date requires start/stop", expr)
-        y1, m1, d1 = [int(x) for x in s.split("-")]
-        y2, m2, d2 = [int(x) for x in e.split("-")]
         step = kv.get("step", None)
-        fmt = kv.get("fmt", "%Y%m%d")
-        # 预检只算数量
-        _ = _range_date_count(date(y1, m1, d1), date(y2, m2, d2), step)
-        # 实际生成
-        cur = date(y1, m1, d1);
-        stop = date(y2, m2, d2)
-        unit = step[-1].lower();
-        n = int(step[:-1])
-        out = []
-        cmp = (lambda a, b: a <= b) if n > 0 else (lambda a, b: a >= b)
-        while cmp(cur, stop):
-            out.append(cur.strftime(fmt))
-            if unit == "d":
-                cur = cur + timedelta(days=n)
-            elif unit == "m":
-                cur = _add_months(cur, n)
-            else:
-                cur = _add_months(cur, n * 12)
-        return out
+        if not s or not e or not step:
+            raise GeneratorSyntaxError("date requires start/stop/step", expr)
+        spec = DateSpec(kind="date", expr=expr, start=_parse_date(s, expr), stop=_parse_date(e, expr),
+                        step=step, fmt=kv.get("fmt", "%Y%m%d"))
+        spec.count()  # 预检步长格式/单位
+        return spec
 
     elif typ == "enum":
         items_str = kv.get("items")
@@ -165,91 +246,97 @@ def _expand_one(expr: str) -> list[str]:
         raw_items = items_str.split(sep)
         if pad:
             raw_items = [x.strip() for x in raw_items]
-        return [x for x in raw_items if x]
-
+        return EnumSpec(kind="enum", expr=expr, items=tuple(x for x in raw_items if x))
 
     else:
         raise GeneratorSyntaxError(f"Unknown generator type: {typ}", expr)
 
 
-def expand_generators(s: str) -> list[str]:
-    tokens = list(_GEN_PATTERN.finditer(s))
-    if not tokens:
-        return [s]
-    parts = []
-    last = 0
-    gens = []
-    for m in tokens:
-        if m.start() > last:
-            parts.append(s[last:m.start()])
-        gens.append(m.group(1).strip())
-        parts.append(None)
-        last = m.end()
-    if last < len(s):
-        parts.append(s[last:])
-
-    out = [""]
-    gen_idx = 0
-    for p in parts:
-        if p is None:
-            try:
-                exp_list = _expand_one(gens[gen_idx])
-            except GeneratorSyntaxError as e:
-                raise
-            gen_idx += 1
-            out = [prefix + x for prefix in out for x in exp_list]
-        else:
-            out = [prefix + p for prefix in out]
-    return out
+def _expand_one(expr: str) -> list[str]:
+    return list(parse_generator(expr).values())
 
 
-def estimate_generators_count(s: str) -> int:
+class GeneratorCache:
+    """
+    一次计划展开内的生成器解析/展开缓存（由 _PlanExpander 持有，随其释放，不跨调用累积）。
+    相同表达式只解析一次，相同字符串（如每个父目录下的 LOD_{{int: ...}}）只展开一次。
+    """
+
+    def __init__(self):
+        self.specs: dict[str, GeneratorSpec] = {}
+        self.pieces: dict[str, tuple[tuple[str] | GeneratorSpec, ...]] = {}
+        self.spec_values: dict[GeneratorSpec, tuple[str, ...]] = {}
+        self.expanded: dict[str, tuple[str, ...]] = {}
+        self.counts: dict[str, int] = {}
+
+    def parse(self, expr: str) -> GeneratorSpec:
+        spec = self.specs.get(expr)
+        if spec is None:
+            spec = self.specs[expr] = parse_generator(expr)
+        return spec
+
+    def values(self, spec: GeneratorSpec) -> tuple[str, ...]:
+        vals = self.spec_values.get(spec)
+        if vals is None:
+            vals = self.spec_values[spec] = spec.values()
+        return vals
+
+    def split(self, s: str) -> tuple[tuple[str] | GeneratorSpec, ...]:
+        # 把字符串切成 字面量 / GeneratorSpec 片段序列
+        hit = self.pieces.get(s)
+        if hit is None:
+            pools: list = []
+            last = 0
+            for m in _GEN_PATTERN.finditer(s):
+                if m.start() > last:
+                    pools.append((s[last:m.start()],))
+                pools.append(self.parse(m.group(1).strip()))
+                last = m.end()
+            if last < len(s):
+                pools.append((s[last:],))
+            hit = self.pieces[s] = tuple(pools)
+        return hit
+
+    def expand(self, s: str) -> list[str]:
+        if "{{" not in s:
+            return [s]
+        hit = self.expanded.get(s)
+        if hit is None:
+            out = [""]
+            for p in self.split(s):
+                if isinstance(p, GeneratorSpec):
+                    vals = self.values(p)
+                    out = [prefix + x for prefix in out for x in vals]
+                else:
+                    lit = p[0]
+                    out = [prefix + lit for prefix in out]
+            hit = self.expanded[s] = tuple(out)
+        return list(hit)
+
+    def estimate(self, s: str) -> int:
+        hit = self.counts.get(s)
+        if hit is None:
+            total = 1
+            for p in self.split(s):
+                if isinstance(p, GeneratorSpec):
+                    if p.kind == "enum":
+                        total *= max(1, p.count())
+                    else:
+                        total *= p.count()
+                    if total > 1_000_000:
+                        break
+            hit = self.counts[s] = total
+        return hit
+
+
+def expand_generators(s: str, cache: GeneratorCache | None = None) -> list[str]:
+    """展开 s 中的全部 {{...}} 生成器（笛卡尔积）；cache 在多次调用间复用解析与展开结果。"""
+    return (cache or GeneratorCache()).expand(s)
+
+
+def estimate_generators_count(s: str, cache: GeneratorCache | None = None) -> int:
     """
     估算字符串 s 中所有 {{...}} 生成器展开的总组合数（笛卡尔积），不产生实际列表。
     无生成器则返回 1。
     """
-    tokens = list(_GEN_PATTERN.finditer(s))
-    if not tokens:
-        return 1
-    total = 1
-    for m in tokens:
-        expr = m.group(1).strip()
-        if ":" not in expr:
-            raise GeneratorSyntaxError("Bad generator (missing type)", expr)
-        typ, rest = expr.split(":", 1)
-        kv = _parse_kv(rest)
-        if typ.strip().lower() == "int":
-            start = int(kv.get("start"));
-            stop = int(kv.get("stop"))
-            step = int(kv.get("step", "1"))
-            total *= _range_int_count(start, stop, step)
-        elif typ.strip().lower() == "alpha":
-            s1 = kv.get("start");
-            s2 = kv.get("stop")
-            if not s1 or not s2 or len(s1) != 1 or len(s2) != 1:
-                raise GeneratorSyntaxError("alpha requires single-char start/stop", expr)
-            step = int(kv.get("step", "1"))
-            total *= _range_alpha_count(ord(s1), ord(s2), step)
-        elif typ.strip().lower() == "date":
-            s0 = kv.get("start");
-            s1 = kv.get("stop");
-            step = kv.get("step", None)
-            if not s0 or not s1 or not step:
-                raise GeneratorSyntaxError("date requires start/stop/step", expr)
-            y1, m1, d1 = [int(x) for x in s0.split("-")]
-            y2, m2, d2 = [int(x) for x in s1.split("-")]
-            total *= _range_date_count(date(y1, m1, d1), date(y2, m2, d2), step)
-
-        elif typ.strip().lower() == "enum":
-            items_str = kv.get("items")
-            if not items_str:
-                raise GeneratorSyntaxError("enum requires items parameter", expr)
-            sep = kv.get("sep", ",")
-            count = len([x for x in items_str.split(sep) if x.strip()])
-            total *= max(1, count)
-
-        else:
-            raise GeneratorSyntaxError(f"Unknown generator type: {typ}", expr)
-        if total > 1_000_000:
-            break
-    return total
+    return (cache or GeneratorCache()).estimate(s)
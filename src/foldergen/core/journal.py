@@ -0,0 +1,168 @@
+# src/foldergen/core/journal.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Set
+from .models import BuildPlan
+
+
+def plan_fingerprint(plan: BuildPlan) -> str:
+    """计划内容的稳定哈希（类型/路径/内容来源，按计划顺序），用于判断日志/检查点是否属于同一计划。"""
+    h = hashlib.sha256()
+    for it in plan.items:
+        h.update(f"{it.type}\0{it.path}\0{it.source or ''}\0{it.template or ''}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+class BuildJournal:
+    """
+    预写日志（JSONL）。每行一条记录：
+    - {"plan": 指纹}              —— 首行，标识计划
+    - {"root": R, "done": i}     —— 顶层根 R 已完成到计划第 i 项（含）
+    - {"published": R}           —— R 已从暂存目录原子发布
+    崩溃时最后一行可能写了一半，读取时忽略无法解析的行。
+    """
+
+    def __init__(self, path: str, fingerprint: str, *, commit_every: int = 256):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.commit_every = commit_every
+        self.published: Set[str] = set()
+        self.done: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._since_commit = 0
+        self._fw = None
+
+    @classmethod
+    def open(cls, path: str, fingerprint: str, **kwargs) -> "BuildJournal":
+        j = cls(path, fingerprint, **kwargs)
+        if os.path.exists(path):
+            j._load()
+            j._fw = open(path, "a", encoding="utf-8")
+        else:
+            j._fw = open(path, "w", encoding="utf-8")
+            j._append({"plan": fingerprint})
+            j._sync()
+        return j
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.done or self.published)
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as fr:
+            lines = fr.read().splitlines()
+        for n, line in enumerate(lines):
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # 崩溃时写了一半的尾行
+            if n == 0:
+                if rec.get("plan") != self.fingerprint:
+                    raise ValueError(f"Journal {self.path} belongs to a different plan; remove it to start over.")
+            elif "published" in rec:
+                self.published.add(rec["published"])
+            elif "done" in rec:
+                self.done[rec["root"]] = max(self.done.get(rec["root"], -1), rec["done"])
+
+    def last_done(self, root: str) -> int:
+        return self.done.get(root, -1)
+
+    def mark_done(self, root: str, index: int) -> None:
+        # 批量提交：每 commit_every 项落一次盘，崩溃最多重做一个批次
+        self._pending[root] = index
+        self._since_commit += 1
+        if self._since_commit >= self.commit_every:
+            self.commit()
+
+    def mark_published(self, root: str) -> None:
+        self.commit()
+        self.published.add(root)
+        self._append({"published": root})
+        self._sync()
+
+    def commit(self) -> None:
+        if not self._pending:
+            return
+        for root, index in self._pending.items():
+            self.done[root] = index
+            self._append({"root": root, "done": index})
+        self._pending.clear()
+        self._since_commit = 0
+        self._sync()
+
+    def close(self, *, remove: bool = False) -> None:
+        if self._fw is None:
+            return
+        self.commit()
+        self._fw.close()
+        self._fw = None
+        if remove:
+            os.remove(self.path)
+
+    def _append(self, rec: Dict) -> None:
+        self._fw.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _sync(self) -> None:
+        self._fw.flush()
+        os.fsync(self._fw.fileno())
+
+
+class BuildCheckpoint:
+    """
+    普通（非 --atomic）构建的检查点：单个 JSON 文件 {"plan": 指纹, "done": i}，
+    表示计划前 i+1 项（含第 i 项）已全部完成。每 every 项或 interval 秒
+    经临时文件 + os.replace 原子覆盖一次，崩溃后文件要么是旧值要么是新值。
+    """
+
+    def __init__(self, path: str, fingerprint: str, *, every: int = 256, interval: float = 5.0):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.every = every
+        self.interval = interval
+        self.done = -1
+        self._saved = -1
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def open(cls, path: str, fingerprint: str, **kwargs) -> "BuildCheckpoint":
+        cp = cls(path, fingerprint, **kwargs)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fr:
+                rec = json.load(fr)
+            if rec.get("plan") != fingerprint:
+                raise ValueError(f"Checkpoint {path} belongs to a different plan; remove it to start over.")
+            cp.done = cp._saved = int(rec.get("done", -1))
+        return cp
+
+    @property
+    def resumed(self) -> bool:
+        return self._saved >= 0
+
+    def advance(self, index: int) -> None:
+        # 只允许单调前进：index 之前的条目必须都已完成
+        if index <= self.done:
+            return
+        self.done = index
+        if (self.done - self._saved >= self.every
+                or time.monotonic() - self._last_save >= self.interval):
+            self.save()
+
+    def save(self) -> None:
+        if self.done == self._saved:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fw:
+            json.dump({"plan": self.fingerprint, "done": self.done}, fw)
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(tmp, self.path)
+        self._saved = self.done
+        self._last_save = time.monotonic()
+
+    def finish(self) -> None:
+        # 全部完成：检查点不再需要
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,70 @@
+# src/foldergen/core/json_io.py
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any, List, Union
+
+try:  # 可选依赖：装有 orjson 时用它做编解码，否则用标准库
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKENDS = ("auto", "orjson", "json")
+_backend = "orjson" if orjson is not None else "json"
+
+
+def set_backend(name: str) -> str:
+    """
+    选择 JSON 后端："auto"（有 orjson 用 orjson）、"orjson" 或 "json"（标准库）。返回实际生效的后端名。
+    两种后端的缩进（indent=2）与紧凑输出逐字节一致（浮点数写法可能不同）。
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}; expected one of {list(BACKENDS)}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON backend 'orjson' requested but orjson is not installed (pip install orjson).")
+    _backend = ("orjson" if orjson is not None else "json") if name == "auto" else name
+    return _backend
+
+
+def backend() -> str:
+    return _backend
+
+
+def available_backends() -> List[str]:
+    return ["orjson", "json"] if orjson is not None else ["json"]
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    if _backend == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN/Infinity、超过 64 位的整数等只有标准库接受的输入：交给标准库（或由它报错）
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def load_file(path: Union[str, Path]) -> Any:
+    with open(path, "rb") as fr:
+        return loads(fr.read())
+
+
+def dumps(obj: Any, *, compact: bool = False) -> str:
+    """整个 JSON 文档：默认与 json.dumps(indent=2, ensure_ascii=False) 相同；compact=True 时无空白。"""
+    if _backend == "orjson":
+        try:
+            return orjson.dumps(obj, option=0 if compact else orjson.OPT_INDENT_2).decode("utf-8")
+        except TypeError:
+            pass  # orjson 不支持的值（代理字符、非字符串键、超大整数等）：退回标准库
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def dumps_line(obj: Any, *, compact: bool = False) -> str:
+    """JSONL 的一行（不含换行）：默认沿用标准库的 ", " / ": " 分隔；compact=True 时无空白（可走 orjson）。"""
+    if compact:
+        return dumps(obj, compact=True)
+    return json.dumps(obj, ensure_ascii=False)
@@ -0,0 +1,43 @@
+# src/foldergen/core/manifest.py
+from __future__ import annotations
+import mmap
+import os
+from pathlib import Path
+from typing import Iterator
+from . import json_io
+from .models import BuildPlanItem
+
+
+def iter_manifest(path: str | Path, base_dir: str | Path) -> Iterator[BuildPlanItem]:
+    """
+    逐条读取 plan --export-manifest 产出的清单，产出绝对路径的 BuildPlanItem。
+    - JSONL：通过 mmap 逐行解析，不把整个文件读入内存；
+    - JSON（数组）：无法流式解析，退化为一次性加载。
+    解析走 json_io（装有 orjson 时用 orjson）。
+    相对路径按 base_dir 拼接；绝对路径（--absolute 导出）原样使用。
+    """
+    base = str(base_dir)
+    with open(path, "rb") as fr:
+        if os.fstat(fr.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # 首个非空白字节为 '[' 时视为 JSON 数组
+            head = mm[:64].lstrip()
+            if head.startswith(b"["):
+                rows = json_io.loads(mm[:])
+                for row in rows:
+                    yield _to_item(row, base)
+                return
+            for line in iter(mm.readline, b""):
+                if line.strip():
+                    yield _to_item(json_io.loads(line), base)
+
+
+def _to_item(row: dict, base: str) -> BuildPlanItem:
+    try:
+        typ, p = row["type"], row["path"]
+    except (KeyError, TypeError):
+        raise ValueError(f"Bad manifest row (needs 'type' and 'path'): {row!r}")
+    if not os.path.isabs(p):
+        p = os.path.join(base, p)
+    return BuildPlanItem(type=typ, path=p, source=row.get("source"), template=row.get("template"))
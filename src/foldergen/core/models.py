@@ -1,7 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, FrozenSet, List, Literal, Optional, Set, Tuple
 from pathlib import PurePath
+from .path_table import StatusIndex, norm_path
 
 
 @dataclass
@@ -9,17 +10,40 @@ class TemplateNode:
     name: str
     dirs: List["TemplateNode"] = field(default_factory=list)
     files: List[str] = field(default_factory=list)
+    # 与 files 一一对应：{"name": ..., "source": ...} 形式的文件条目给出内容来源，普通字符串条目为 None
+    file_sources: List[Optional[str]] = field(default_factory=list)
+    # 与 files 一一对应：{"name": ..., "template": ...} 形式给出内容模板（含 {var|filter} 占位符）
+    file_templates: List[Optional[str]] = field(default_factory=list)
 
 
 @dataclass
 class BuildPlanItem:
     type: str  # "dir" | "file"
     path: str  # 绝对路径（构建用）。如需相对路径，请使用 BuildPlan.to_relative()
+    source: Optional[str] = None  # 文件内容来源（绝对路径）；None 表示创建空文件
+    template: Optional[str] = None  # 文件内容模板（绝对路径），构建时用 BuildPlan.context 渲染
+
+
+@dataclass
+class TemplateAnalysis:
+    """
+    模板单遍分析结果（validator.analyze_template 产出），供各命令复用，避免重复读盘/遍历。
+    node_deps 的 key 为节点在模板中的下标路径，如 (0, 2) 表示第 1 个根节点的第 3 个子目录。
+    """
+    valid: bool = True
+    errors: List[str] = field(default_factory=list)
+    used_vars: Set[str] = field(default_factory=set)
+    missing_vars: Set[str] = field(default_factory=set)
+    unused_vars: Set[str] = field(default_factory=set)
+    generator_count: int = 0  # 模板中 {{...}} 生成器出现的总次数
+    node_deps: Dict[Tuple[int, ...], FrozenSet[str]] = field(default_factory=dict)  # 节点自身 name/files 引用的变量
 
 
 @dataclass
 class BuildPlan:
     items: List[BuildPlanItem] = field(default_factory=list)
+    analysis: Optional[TemplateAnalysis] = field(default=None, repr=False, compare=False)  # make_plan 时附带
+    context: Optional[Dict[str, Any]] = field(default=None, repr=False, compare=False)  # 渲染文件内容模板用
 
     def to_relative(self, base_dir: str) -> "BuildPlan":
         # 保持不变
@@ -31,8 +55,8 @@ class BuildPlan:
                 rel = str(p.relative_to(base))
             except Exception:
                 rel = str(p)
-            rel_items.append(BuildPlanItem(type=it.type, path=rel))
-        return BuildPlan(items=rel_items)
+            rel_items.append(BuildPlanItem(type=it.type, path=rel, source=it.source, template=it.template))
+        return BuildPlan(items=rel_items, analysis=self.analysis, context=self.context)
 
     def to_tree(
         self,
@@ -44,9 +68,10 @@ class BuildPlan:
         # ---- 新增：状态注入 ----
         status_map: Optional[Dict[str, str]] = None,          # 绝对路径 -> status（existing/missing/conflict/planned）
         issues_map: Optional[Dict[str, List[str]]] = None,    # 绝对路径 -> [issue strings]
+        status: Optional["StatusIndex"] = None,               # 按路径 ID 的状态数组（优先于上面两个字典）
     ) -> Dict[str, Any]:
         """
-        返回嵌套 dict 的树。若提供 status_map / issues_map，则每个节点附带:
+        返回嵌套 dict 的树。若提供 status / status_map / issues_map，则每个节点附带:
         - node["status"] = "existing"|"missing"|"conflict"|"planned"
         - node["issues"] = [...]
         注意：status_map/issue_map 的 key 以“绝对路径”匹配。
@@ -66,28 +91,32 @@ class BuildPlan:
         file_paths = [PurePath(it.path) for it in plan.items if it.type == "file"]
 
         # —— 状态解析：一个小工具，基于构造中的“当前绝对路径”取状态/问题
-        import os as _os
-        def _norm(p: str) -> str:
-            p = _os.path.normpath(p)
-            if _os.name == "nt":
-                p = _os.path.normcase(p)
-            return p
-
         def attach_status(node: Dict[str, Any], abs_path: Optional[str]):
-            if status_map and abs_path:
-                node["status"] = status_map.get(_norm(abs_path), "planned")
-            if issues_map and abs_path:
-                issues = issues_map.get(_norm(abs_path))
+            if not abs_path:
+                return
+            if status is not None:
+                # 路径已驻留在 PathTable 中：直接按 ID 取，无需规范化
+                node["status"] = status.status_of(abs_path)
+                issues = status.issues_of(abs_path)
                 if issues:
                     node["issues"] = issues
+                return
+            if status_map:
+                node["status"] = status_map.get(norm_path(abs_path), "planned")
+            if issues_map:
+                issues = issues_map.get(norm_path(abs_path))
+                if issues:
+                    node["issues"] = issues
+
+        # children 查找缓存：id(父节点) -> {(名称, 类型): 子节点}
+        child_index: Dict[int, Dict[Tuple[str, str], Dict[str, Any]]] = {}
 
-        # children 查找缓存
         def get_child(parent: Dict[str, Any], name: str, typ: str) -> Dict[str, Any]:
-            for c in parent["children"]:
-                if c["name"] == name and c["type"] == typ:
-                    return c
-            node = new_node(name, typ)
-            parent["children"].append(node)
+            index = child_index.setdefault(id(parent), {})
+            node = index.get((name, typ))
+            if node is None:
+                node = index[(name, typ)] = new_node(name, typ)
+                parent["children"].append(node)
             return node
 
         # 目录：逐级创建，并注入状态
@@ -139,26 +168,30 @@ class BuildPlan:
         # ---- 新增：是否附带状态 ----
         status_map: Optional[Dict[str, str]] = None,
         issues_map: Optional[Dict[str, List[str]]] = None,
+        status: Optional["StatusIndex"] = None,
     ) -> List[Dict[str, Any]]:
         """
-        扁平清单；若提供 status_map / issues_map，则每行附带 status / issues 字段。
+        扁平清单；若提供 status（或 status_map / issues_map），则每行附带 status / issues 字段。
         """
         plan = self.to_relative(base_dir) if (relative and base_dir) else self
 
-        import os as _os
-        def _norm(p: str) -> str:
-            p = _os.path.normpath(p)
-            if _os.name == "nt":
-                p = _os.path.normcase(p)
-            return p
-
         out = []
-        for it in plan.items:
+        for it_abs, it in zip(self.items, plan.items):
             row = {"type": it.type, "path": it.path}
-            if status_map or issues_map:
+            if it.source:
+                row["source"] = it.source
+            if it.template:
+                row["template"] = it.template
+            if status is not None:
+                # 用原始绝对路径按 ID 查（审计时已驻留），不再拼接 base_dir 或规范化
+                row["status"] = status.status_of(it_abs.path)
+                issues = status.issues_of(it_abs.path)
+                if issues:
+                    row["issues"] = issues
+            elif status_map or issues_map:
                 # 需要用绝对路径来查映射
                 abs_path = str(PurePath(base_dir) / it.path) if (relative and base_dir) else it.path
-                key = _norm(abs_path)
+                key = norm_path(abs_path)
                 if status_map:
                     row["status"] = status_map.get(key, "planned")
                 if issues_map:
@@ -200,3 +233,5 @@ class AuditReport:
     name_issues: List[NameIssue] = field(default_factory=list)  # 非法字符/过长/保留名/大小写冲突
     outside_base_issues: List[str] = field(default_factory=list)  # 计划路径逃逸到基准目录之外
     duplicate_planned_paths: List[str] = field(default_factory=list)  # 渲染后重复路径
+    # 各分类条目数；echo=False 审计时 planned_*/existing_* 列表不收集，只有这里的计数
+    counts: Dict[str, int] = field(default_factory=dict)
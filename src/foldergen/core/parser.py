@@ -1,5 +1,7 @@
+import os
 import re
-from typing import Any, Callable, Dict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple, Union
 
 # 简易过滤器注册（如 pad, slug）
 _FILTERS: Dict[str, Callable[..., str]] = {}
@@ -22,6 +24,104 @@ register_filter("slug", _filter_slug)
 
 # 模板占位形如 {key|filter(arg)} 或 {key}
 _PATTERN = re.compile(r"\{([^{}]+)\}")
+# 内容模板（JSON/YAML/代码等文件正文）：只有 {标识符} / {标识符|过滤器...} 是占位符，其余花括号原样输出；
+# {{标识符...}} 转义为字面量 {标识符...}
+_CONTENT_PATTERN = re.compile(r"\{\{(\s*[^\W\d][\w.\-]*\s*(?:\|[^{}\n]*)?)\}\}|\{(\s*[^\W\d][\w.\-]*\s*(?:\|[^{}\n]*)?)\}")
+
+class CompiledTemplate:
+    """
+    预编译的占位符模板：字面量片段与 (key, 过滤器链) 交替存放，
+    渲染时不再跑正则/拆分参数。文件内容渲染用 iter_render 流式产出片段。
+    content=True 为内容模板语法（见 _CONTENT_PATTERN）：非标识符的 {...} 视为字面量，{{x}} 输出 {x}。
+    """
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str, *, content: bool = False):
+        parts: List[Union[str, Tuple[str, Tuple[Tuple[str, tuple], ...]]]] = []
+        last = 0
+        for m in (_CONTENT_PATTERN if content else _PATTERN).finditer(text):
+            if content and m.group(1) is not None:
+                # 转义：去掉外层一对花括号后按字面量输出
+                parts.append(text[last:m.start()] + "{" + m.group(1) + "}")
+                last = m.end()
+                continue
+            if m.start() > last:
+                parts.append(text[last:m.start()])
+            parts.append(_parse_expr(m.group(2) if content else m.group(1)))
+            last = m.end()
+        if last < len(text):
+            parts.append(text[last:])
+        self.parts = tuple(parts)
+
+    def variables(self) -> Set[str]:
+        """模板引用的变量名。"""
+        return {part[0] for part in self.parts if part.__class__ is not str}
+
+    def iter_render(self, context: Dict[str, Any]) -> Iterator[str]:
+        for part in self.parts:
+            if part.__class__ is str:
+                yield part
+            else:
+                yield _eval_expr(part, context)
+
+    def render(self, context: Dict[str, Any]) -> str:
+        return "".join(self.iter_render(context))
+
+
+def _parse_expr(expr: str) -> Tuple[str, Tuple[Tuple[str, tuple], ...]]:
+    parts = [p.strip() for p in expr.strip().split("|")]
+    chain = []
+    for p in parts[1:]:
+        if "(" in p and p.endswith(")"):
+            fname = p[: p.index("(")].strip()
+            arg_str = p[p.index("(") + 1 : -1].strip()
+            args = []
+            if arg_str:
+                # 仅支持逗号分隔的简单参数（数字/字符串）
+                for raw in arg_str.split(","):
+                    raw = raw.strip()
+                    if raw.isdigit():
+                        args.append(int(raw))
+                    else:
+                        # 去掉可能的引号
+                        args.append(raw.strip("'\""))
+            chain.append((fname, tuple(args)))
+        else:
+            chain.append((p, ()))
+    return parts[0], tuple(chain)
+
+
+def _eval_expr(part: Tuple[str, Tuple[Tuple[str, tuple], ...]], context: Dict[str, Any]) -> str:
+    key, chain = part
+    if key not in context:
+        raise KeyError(f"Missing variable: {key}")
+    val: Any = context[key]
+    # 应用过滤器链（过滤器在渲染时查找，保证 register_filter 的后注册也生效）
+    for fname, args in chain:
+        fn = _FILTERS.get(fname)
+        if not fn:
+            raise ValueError(f"Unknown filter: {fname}")
+        val = fn(val, *args)
+    return str(val)
+
+
+@lru_cache(maxsize=8192)
+def compile_template(text: str) -> CompiledTemplate:
+    return CompiledTemplate(text)
+
+
+def load_content_template(path: str) -> CompiledTemplate:
+    """读取并编译内容模板；缓存按 (路径, mtime_ns, 大小) 区分，文件被修改后（如 watch 期间）自动重新编译。"""
+    st = os.stat(path)
+    return _compile_content_file(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _compile_content_file(path: str, mtime_ns: int, size: int) -> CompiledTemplate:
+    # 同一内容模板在成千上万个生成文件间只读取、编译一次
+    with open(path, "r", encoding="utf-8") as fr:
+        return CompiledTemplate(fr.read(), content=True)
+
 
 def render_string(template: str, context: Dict[str, Any]) -> str:
     """
@@ -31,40 +131,8 @@ def render_string(template: str, context: Dict[str, Any]) -> str:
     - {key|pad(3)}
     - {key|slug}
     多个过滤器串联也可：{key|slug|pad(10)}（会把slug结果再pad）
+    同一模板字符串只编译一次（见 compile_template）。
     """
-    def repl(m: re.Match) -> str:
-        expr = m.group(1).strip()
-        parts = [p.strip() for p in expr.split("|")]
-        key = parts[0]
-        if key not in context:
-            raise KeyError(f"Missing variable: {key}")
-        val: Any = context[key]
-
-        # 应用过滤器链
-        for p in parts[1:]:
-            if "(" in p and p.endswith(")"):
-                fname = p[: p.index("(")].strip()
-                arg_str = p[p.index("(") + 1 : -1].strip()
-                args = []
-                if arg_str:
-                    # 仅支持逗号分隔的简单参数（数字/字符串）
-                    for raw in arg_str.split(","):
-                        raw = raw.strip()
-                        if raw.isdigit():
-                            args.append(int(raw))
-                        else:
-                            # 去掉可能的引号
-                            args.append(raw.strip("'\""))
-                fn = _FILTERS.get(fname)
-                if not fn:
-                    raise ValueError(f"Unknown filter: {fname}")
-                val = fn(val, *args)
-            else:
-                fn = _FILTERS.get(p)
-                if not fn:
-                    raise ValueError(f"Unknown filter: {p}")
-                val = fn(val)
-
-        return str(val)
-
-    return _PATTERN.sub(repl, template)
+    if "{" not in template:
+        return template
+    return compile_template(template).render(context)
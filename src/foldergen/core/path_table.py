@@ -0,0 +1,117 @@
+# src/foldergen/core/path_table.py
+from __future__ import annotations
+import os
+from typing import Any, Dict, List, Optional
+
+
+def norm_path(p: str) -> str:
+    """统一的路径规范化（Windows 下大小写不敏感）。全项目只此一份。"""
+    p = os.path.normpath(p)
+    if os.name == "nt":
+        p = os.path.normcase(p)
+    return p
+
+
+class PathTable:
+    """
+    规范化路径 <-> 整数 ID 的驻留表。
+    同一路径只规范化一次：已规范化的字符串直接命中；原始写法（如计划条目的 path）另有缓存。
+    审计、状态、清单与树形输出共用同一张表，按 ID 索引数组即可，无需再做字符串规范化。
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []  # ID -> 规范化路径
+        self._ids: Dict[str, int] = {}  # 规范化路径 -> ID
+        self._raw: Dict[str, int] = {}  # 原始写法 -> ID
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def intern(self, p: str) -> int:
+        pid = self._ids.get(p)
+        if pid is not None:
+            return pid
+        pid = self._raw.get(p)
+        if pid is not None:
+            return pid
+        n = norm_path(p)
+        pid = self._ids.get(n)
+        if pid is None:
+            pid = self._ids[n] = len(self.paths)
+            self.paths.append(n)
+        if n != p:  # 本身已是规范形式的路径下次直接命中 _ids，无需再记原始写法
+            self._raw[p] = pid
+        return pid
+
+    def get(self, p: str) -> Optional[int]:
+        """查找但不新增；未驻留的路径返回 None。"""
+        pid = self._ids.get(p)
+        if pid is None:
+            pid = self._raw.get(p)
+            if pid is None:
+                pid = self._ids.get(norm_path(p))
+        return pid
+
+
+STATUS_NAMES = ("planned", "existing", "missing", "conflict")
+_STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+
+class StatusIndex:
+    """按路径 ID 存放的状态码数组与问题列表（取代 “规范化路径 -> 字符串” 的字典）。"""
+
+    def __init__(self, table: PathTable):
+        self.table = table
+        self.codes = bytearray(len(table))  # 0 = planned
+        self.issues: List[Optional[List[str]]] = [None] * len(table)
+
+    def _grow(self) -> None:
+        n = len(self.table)
+        if n > len(self.codes):
+            self.codes.extend(bytes(n - len(self.codes)))
+            self.issues.extend([None] * (n - len(self.issues)))
+
+    def set(self, pid: int, status: str) -> None:
+        if pid >= len(self.codes):
+            self._grow()
+        self.codes[pid] = _STATUS_CODES[status]
+
+    def add_issue(self, pid: int, reason: str) -> None:
+        if pid >= len(self.issues):
+            self._grow()
+        if self.issues[pid] is None:
+            self.issues[pid] = []
+        self.issues[pid].append(reason)
+
+    def status_of(self, p: str) -> str:
+        pid = self.table.get(p)
+        if pid is None or pid >= len(self.codes):
+            return "planned"
+        return STATUS_NAMES[self.codes[pid]]
+
+    def issues_of(self, p: str) -> Optional[List[str]]:
+        pid = self.table.get(p)
+        if pid is None or pid >= len(self.issues):
+            return None
+        return self.issues[pid]
+
+    @classmethod
+    def from_report(cls, rep: Any, table: PathTable) -> "StatusIndex":
+        """
+        由 AuditReport 生成状态数组。报告里的路径已由 checker 规范化并驻留在 table 中，
+        这里只做整数 ID 查找，不再规范化字符串。
+        """
+        idx = cls(table)
+        for p in rep.existing_dirs:
+            idx.set(table.intern(p), "existing")
+        for p in rep.existing_files:
+            idx.set(table.intern(p), "existing")
+        for p in rep.missing_dirs:
+            idx.set(table.intern(p), "missing")
+        for p in rep.missing_files:
+            idx.set(table.intern(p), "missing")
+        for c in rep.conflicts:
+            idx.set(table.intern(c.path), "conflict")
+        for ni in rep.name_issues:
+            idx.add_issue(table.intern(ni.path), ni.reason)
+        return idx
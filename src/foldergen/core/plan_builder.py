@@ -1,27 +1,163 @@
 # src/foldergen/core/plan_builder.py
 import os
-from typing import Any, Dict, List
-from .models import TemplateNode, BuildPlan, BuildPlanItem, Context
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from .models import TemplateNode, BuildPlan, BuildPlanItem, Context, TemplateAnalysis
 from .parser import render_string
-from .gen_syntax import expand_generators, estimate_generators_count, GeneratorSyntaxError
+from .gen_syntax import GeneratorCache, GeneratorSyntaxError
+from .events import RunObserver, iter_batches, observed_stats
+from .stats import RunStats, phase
+from .validator import collect_placeholders
+
+_Rendered = Tuple[List[str], List[str], List[Tuple[Optional[str], Optional[str]]]]
+
+
+class NodeRenderCache:
+    """
+    跨多次 build_plan 复用的节点展开/渲染结果（watch 模式用）。
+    key 由节点自身的 name/files/source/template 字符串与其引用变量的当前取值组成，
+    模板只改动某个节点、或 vars 只改动某个变量时，其余节点直接命中，无需重新展开生成器。
+    引用变量取自 TemplateAnalysis.node_deps（build_plan 传入 analysis 时），否则逐个字符串扫描。
+    同一缓存只应配合同一 source_root 使用。
+    """
+
+    def __init__(self):
+        self.entries: Dict[Any, _Rendered] = {}
+        self.hits = 0
+        self.misses = 0
+        self._used: set = set()
+
+    @staticmethod
+    def key(node: TemplateNode, context: Context, deps: Optional[FrozenSet[str]] = None) -> Any:
+        if deps is None:
+            strings = [node.name, *node.files, *(x for x in node.file_sources if x),
+                       *(x for x in node.file_templates if x)]
+            deps = set().union(*(collect_placeholders(x) for x in strings))
+        names = sorted(deps)
+        return (node.name, tuple(node.files), tuple(node.file_sources), tuple(node.file_templates),
+                tuple((v, repr(context.get(v))) for v in names))
+
+    def get(self, key: Any) -> Optional[_Rendered]:
+        hit = self.entries.get(key)
+        if hit is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used.add(key)
+        return hit
+
+    def put(self, key: Any, value: _Rendered) -> None:
+        self.entries[key] = value
+        self._used.add(key)
+
+    def prune(self) -> None:
+        # 丢弃自上次 prune 以来未被用到的条目（模板中已删除/改动的旧节点）
+        self.entries = {k: v for k, v in self.entries.items() if k in self._used}
+        self._used = set()
+        self.hits = self.misses = 0
 
 def _to_node(d: Dict[str, Any]) -> TemplateNode:
+    files, sources, templates = [], [], []
+    for f in d.get("files",[]) or []:
+        # 文件条目可以是字符串，或 {"name": ..., "source": ...}（从模板库复制内容）
+        # 或 {"name": ..., "template": ...}（渲染内容模板）
+        if isinstance(f, dict):
+            files.append(f.get("name", ""))
+            sources.append(f.get("source"))
+            templates.append(f.get("template"))
+        else:
+            files.append(f)
+            sources.append(None)
+            templates.append(None)
     return TemplateNode(
         name=d.get("name",""),
         dirs=[_to_node(x) for x in d.get("dirs",[]) or []],
-        files=list(d.get("files",[]) or [])
+        files=files,
+        file_sources=sources,
+        file_templates=templates,
     )
 
-def build_plan(template: Dict[str, Any], base_dir: str, context: Context, *, max_expand: int = 50_000) -> BuildPlan:
-    roots: List[TemplateNode] = [_to_node(x) for x in template.get("dirs",[]) or []]
-    plan = BuildPlan()
+def build_plan(template: Dict[str, Any], base_dir: str, context: Context, *, max_expand: int = 50_000,
+               stats: Optional[RunStats] = None, shard: Optional[Tuple[int, int]] = None,
+               source_root: Optional[str] = None, node_cache: Optional[NodeRenderCache] = None,
+               jobs: Optional[int] = None, observer: Optional[RunObserver] = None,
+               analysis: Optional[TemplateAnalysis] = None) -> BuildPlan:
+    """
+    文件条目的 source / template 支持 {var} 占位符；相对路径按 source_root（默认当前目录）解析。
+    shard=(i, n)（i 从 1 开始）时只产出完整计划中第 i 段连续区间的条目（共 n 段，条目数均衡）。
+    各分片按 i 顺序拼接即为完整计划；区间外的子树只按预计算的条目数跳过，不会生成路径。
+    node_cache：跨调用复用未变化节点的展开/渲染结果（见 NodeRenderCache）；
+    同时传入该模板的 analysis 时缓存 key 直接取其 node_deps，不再重新扫描占位符。
+    jobs > 1（0 表示 CPU 核数）时按根节点与首层生成器变体切块，在工作进程中展开，结果按模板顺序合并。
+    observer：条目按批经 on_items_planned 回调，"plan" 阶段结束时回调 on_phase_end。
+    """
+    stats = observed_stats(stats, observer)
+    plan = BuildPlan(context=context)
+    with phase(stats, "plan") as rec:
+        plan.items.extend(iter_plan_items(template, base_dir, context, max_expand=max_expand, stats=stats,
+                                          shard=shard, source_root=source_root, node_cache=node_cache, jobs=jobs,
+                                          observer=observer, analysis=analysis))
+        rec.items = len(plan.items)
+    return plan
+
+
+# 少于此条目数时进程启动与结果回传的开销超过收益，直接串行展开
+_PARALLEL_MIN_ITEMS = 20_000
+# 每个进程约分到的块数：块越多负载越均衡，但每块都有一次回传开销
+_CHUNKS_PER_JOB = 4
+_KINDS = ("file", "dir")
 
-    def guard_count(name: str, files: List[str]):
+
+def _raw_item(type: str, path: str, source: Optional[str] = None, template: Optional[str] = None) -> tuple:
+    return type, path, source, template
+
+
+class _PlanExpander:
+    """
+    一次模板展开的状态：节点展开/渲染结果、子树条目数，以及分片区间 [lo, hi) 与当前全局序号 pos。
+    串行展开与并行展开的每个工作进程各持一份；make 决定 walk 产出的条目形式。
+    """
+
+    def __init__(self, template: Dict[str, Any], base_dir: str, context: Context, *, max_expand: int,
+                 stats: Optional[RunStats] = None, source_root: Optional[str] = None,
+                 node_cache: Optional[NodeRenderCache] = None, make: Callable[..., Any] = BuildPlanItem,
+                 analysis: Optional[TemplateAnalysis] = None):
+        # 生成器解析/展开结果只在本次展开内复用；统计开启时把展开/渲染的耗时分别累加到子阶段
+        self.generators = GeneratorCache()
+        expand = self.generators.expand
+        self.expand = stats.timed("plan.expand", expand) if stats else expand
+        self.render = stats.timed("plan.render", render_string) if stats else render_string
+        self.base_dir = base_dir
+        self.context = context
+        self.max_expand = max_expand
+        self.source_root = source_root
+        self.node_cache = node_cache
+        self.make = make
+        self.roots: List[TemplateNode] = [_to_node(x) for x in template.get("dirs",[]) or []]
+        # id(节点) -> 该节点引用的变量（取自 analysis.node_deps，按模板下标路径对应）
+        self.node_deps: Dict[int, FrozenSet[str]] = {}
+        if node_cache is not None and analysis is not None:
+            stack = [((i,), r) for i, r in enumerate(self.roots)]
+            while stack:
+                path, node = stack.pop()
+                self.node_deps[id(node)] = analysis.node_deps[path]
+                stack.extend((path + (j,), c) for j, c in enumerate(node.dirs))
+        # 节点名/文件名只依赖全局 context，与父目录展开出的具体变体无关，
+        # 因此每个模板节点只需展开+渲染一次（相对片段），各父实例只做路径拼接
+        self.rendered: Dict[int, _Rendered] = {}
+        self.child_sizes: Dict[int, int] = {}
+        self.sharded = False
+        self.lo, self.hi = 0, sys.maxsize
+        self.pos = 0  # 当前条目在完整计划中的全局序号
+
+    def guard_count(self, name: str, files: List[str]):
         # 估算当前节点 name 与每个文件名生成器的组合（粗略上界）
-        count_name = estimate_generators_count(name) if name else 1
+        max_expand, estimate = self.max_expand, self.generators.estimate
+        count_name = estimate(name) if name else 1
         count_files = 1
         for f in files or []:
-            count_files *= max(1, estimate_generators_count(f))
+            count_files *= max(1, estimate(f))
             if count_name * count_files > max_expand:
                 break
         total = count_name * count_files
@@ -31,21 +167,251 @@ def build_plan(template: Dict[str, Any], base_dir: str, context: Context, *, max
                 f"name='{name}', files={files}"
             )
 
-    def walk(node: TemplateNode, cur: str):
-        guard_count(node.name, node.files)  # 规模守门
-        name_variants = expand_generators(node.name) if node.name else [""]
-        for nv in name_variants:
-            dirname = render_string(nv, context) if nv else ""
+    def render_source(self, src: Optional[str]) -> Optional[str]:
+        if not src:
+            return None
+        return os.path.abspath(os.path.join(self.source_root or os.curdir, self.render(src, self.context)))
+
+    def expand_node(self, node: TemplateNode) -> _Rendered:
+        self.guard_count(node.name, node.files)  # 规模守门
+        expand, render, context = self.expand, self.render, self.context
+        name_variants = expand(node.name) if node.name else [""]
+        dirnames = [render(nv, context) if nv else "" for nv in name_variants]
+        fnames, fsources = [], []
+        nones = [None] * len(node.files)
+        for f, src, tmpl in zip(node.files, node.file_sources or nones, node.file_templates or nones):
+            content = (self.render_source(src), self.render_source(tmpl))
+            for fv in expand(f):
+                fnames.append(render(fv, context))
+                fsources.append(content)
+        return dirnames, fnames, fsources
+
+    def render_node(self, node: TemplateNode) -> _Rendered:
+        hit = self.rendered.get(id(node))
+        if hit is None:
+            node_cache = self.node_cache
+            if node_cache is None:
+                hit = self.expand_node(node)
+            else:
+                key = node_cache.key(node, self.context, self.node_deps.get(id(node)))
+                hit = node_cache.get(key)
+                if hit is None:
+                    hit = self.expand_node(node)
+                    node_cache.put(key, hit)
+            self.rendered[id(node)] = hit
+        return hit
+
+    def children_size(self, node: TemplateNode) -> int:
+        # 单个父实例下所有子目录子树产出的条目数（与父的具体变体无关）
+        hit = self.child_sizes.get(id(node))
+        if hit is None:
+            hit = self.child_sizes[id(node)] = sum(self.subtree_size(c) for c in node.dirs)
+        return hit
+
+    def subtree_size(self, node: TemplateNode) -> int:
+        dirnames, fnames, _ = self.render_node(node)
+        if not dirnames:
+            return 0
+        per_variant = len(fnames) + self.children_size(node)
+        return sum((1 if d else 0) + per_variant for d in dirnames)
+
+    def set_shard(self, shard: Tuple[int, int]) -> None:
+        i, n = shard
+        if n < 1 or not 1 <= i <= n:
+            raise ValueError(f"Invalid shard {i}/{n}: expected 1 <= i <= N")
+        total = sum(self.subtree_size(r) for r in self.roots)
+        self.sharded = True
+        self.lo, self.hi = total * (i - 1) // n, total * i // n
+
+    def node_at(self, node_path: Tuple[int, ...]) -> TemplateNode:
+        node = self.roots[node_path[0]]
+        for j in node_path[1:]:
+            node = node.dirs[j]
+        return node
+
+    def walk(self, node: TemplateNode, cur: str, first: int = 0, last: Optional[int] = None) -> Iterator[Any]:
+        # first/last：只展开该节点的部分名称变体（并行切块用）
+        make, lo, hi = self.make, self.lo, self.hi
+        dirnames, fnames, fsources = self.render_node(node)
+        if last is not None:
+            dirnames = dirnames[first:last]
+        for dirname in dirnames:
+            if self.pos >= hi:
+                return
+            if self.sharded:
+                n = (1 if dirname else 0) + len(fnames) + self.children_size(node)
+                if self.pos + n <= lo:
+                    self.pos += n  # 整个变体子树都在分片之前，直接跳过
+                    continue
             cur_path = os.path.join(cur, dirname) if dirname else cur
             if dirname:
-                plan.items.append(BuildPlanItem(type="dir", path=cur_path))
-            for f in node.files:
-                for fv in expand_generators(f):
-                    fname = render_string(fv, context)
-                    plan.items.append(BuildPlanItem(type="file", path=os.path.join(cur_path, fname)))
+                if lo <= self.pos < hi:
+                    yield make("dir", cur_path)
+                self.pos += 1
+            for fname, (src, tmpl) in zip(fnames, fsources):
+                if lo <= self.pos < hi:
+                    yield make("file", os.path.join(cur_path, fname), src, tmpl)
+                self.pos += 1
             for child in node.dirs:
-                walk(child, cur_path)
+                yield from self.walk(child, cur_path)
 
-    for r in roots:
-        walk(r, base_dir)
-    return plan
+    def walk_all(self) -> Iterator[Any]:
+        for r in self.roots:
+            yield from self.walk(r, self.base_dir)
+
+    def split(self, parts: int) -> List[Any]:
+        """
+        把完整计划切成按模板顺序排列的块：先按根节点，过大的块再按该层名称变体区间切分，
+        只有一个变体的节点则把其目录/文件条目就地生成、继续向子节点切分。
+        返回的列表元素为现成条目列表，或 (节点索引路径, 变体起, 变体止, 父路径, 起始序号) 任务元组。
+        """
+        units: List[Any] = []
+        pos = 0
+        for i, r in enumerate(self.roots):
+            size = self.subtree_size(r)
+            units.append(((i,), 0, len(self.render_node(r)[0]), self.base_dir, pos, size))
+            pos += size
+        lo, hi = self.lo, self.hi
+        target = max(1, (min(pos, hi) - lo) // max(1, parts))
+        changed = True
+        while changed:
+            changed = False
+            out: List[Any] = []
+            for u in units:
+                if isinstance(u, list) or u[5] <= target or u[4] >= hi or u[4] + u[5] <= lo:
+                    out.append(u)
+                    continue
+                changed = True
+                node_path, first, last, cur, pos, size = u
+                node = self.node_at(node_path)
+                dirnames, fnames, fsources = self.render_node(node)
+                per_variant = len(fnames) + self.children_size(node)
+                if last - first > 1:
+                    # 按累计条目数把变体区间切成不超过 target 的若干段（单个变体过大时自成一段，下一轮再向下切）
+                    start, acc = first, 0
+                    for k in range(first, last):
+                        n = (1 if dirnames[k] else 0) + per_variant
+                        if acc and acc + n > target:
+                            out.append((node_path, start, k, cur, pos, acc))
+                            pos += acc
+                            start, acc = k, 0
+                        acc += n
+                    out.append((node_path, start, last, cur, pos, acc))
+                    continue
+                dirname = dirnames[first]
+                cur_path = os.path.join(cur, dirname) if dirname else cur
+                inline = []
+                if dirname:
+                    if lo <= pos < hi:
+                        inline.append(BuildPlanItem(type="dir", path=cur_path))
+                    pos += 1
+                for fname, (src, tmpl) in zip(fnames, fsources):
+                    if lo <= pos < hi:
+                        inline.append(BuildPlanItem(type="file", path=os.path.join(cur_path, fname),
+                                                    source=src, template=tmpl))
+                    pos += 1
+                if inline:
+                    out.append(inline)
+                for j, child in enumerate(node.dirs):
+                    size = self.subtree_size(child)
+                    if size:
+                        out.append((node_path + (j,), 0, len(self.render_node(child)[0]), cur_path, pos, size))
+                        pos += size
+            units = out
+        # 丢弃完全落在分片区间外的块
+        return [u if isinstance(u, list) else u[:5] for u in units
+                if isinstance(u, list) or (u[4] < hi and u[4] + u[5] > lo)]
+
+
+_worker: Optional[_PlanExpander] = None
+
+
+def _init_worker(template: Dict[str, Any], base_dir: str, context: Context, max_expand: int,
+                 source_root: Optional[str], lo: int, hi: int, sharded: bool) -> None:
+    global _worker
+    _worker = _PlanExpander(template, base_dir, context, max_expand=max_expand, source_root=source_root,
+                            make=_raw_item)
+    _worker.lo, _worker.hi, _worker.sharded = lo, hi, sharded
+
+
+def _expand_chunk(task: tuple) -> Tuple[bytes, List[str], Dict[int, Tuple[Optional[str], Optional[str]]]]:
+    """工作进程：展开一块子树，返回紧凑结果 (类型字节串 1=目录/0=文件, 路径列表, {序号: (source, template)})。"""
+    node_path, first, last, cur, pos = task
+    ex = _worker
+    ex.pos = pos
+    kinds = bytearray()
+    paths: List[str] = []
+    extras: Dict[int, Tuple[Optional[str], Optional[str]]] = {}
+    for kind, path, src, tmpl in ex.walk(ex.node_at(node_path), cur, first, last):
+        if src or tmpl:
+            extras[len(paths)] = (src, tmpl)
+        kinds.append(kind == "dir")
+        paths.append(path)
+    return bytes(kinds), paths, extras
+
+
+def _chunk_items(chunk: tuple) -> List[BuildPlanItem]:
+    kinds, paths, extras = chunk
+    items = list(map(BuildPlanItem, map(_KINDS.__getitem__, kinds), paths))
+    for i, (src, tmpl) in extras.items():
+        items[i].source, items[i].template = src, tmpl
+    return items
+
+
+def _iter_parallel(ex: _PlanExpander, template: Dict[str, Any], units: List[Any],
+                   jobs: int) -> Iterator[BuildPlanItem]:
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                               initargs=(template, ex.base_dir, ex.context, ex.max_expand, ex.source_root,
+                                         ex.lo, ex.hi, ex.sharded))
+    try:
+        # map 按提交顺序返回结果：各块并行展开，合并时保持模板顺序
+        results = pool.map(_expand_chunk, [u for u in units if not isinstance(u, list)])
+        for u in units:
+            if isinstance(u, list):
+                yield from u
+            else:
+                yield from _chunk_items(next(results))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)  # 提前停止消费时不再展开剩余块
+
+
+def iter_plan_items(template: Dict[str, Any], base_dir: str, context: Context, *, max_expand: int = 50_000,
+                    stats: Optional[RunStats] = None, shard: Optional[Tuple[int, int]] = None,
+                    source_root: Optional[str] = None, node_cache: Optional[NodeRenderCache] = None,
+                    jobs: Optional[int] = None, observer: Optional[RunObserver] = None,
+                    analysis: Optional[TemplateAnalysis] = None) -> Iterator[BuildPlanItem]:
+    """
+    与 build_plan 相同的条目序列，但按模板顺序逐条产出，不构造 BuildPlan
+    （check --fail-fast 等只需流式消费、可能提前停止的场景）。分片参数在调用时即校验。
+    observer：每攒满一批先回调 on_items_planned，再逐条产出。
+    """
+    items = _iter_items(template, base_dir, context, max_expand=max_expand, stats=stats, shard=shard,
+                        source_root=source_root, node_cache=node_cache, jobs=jobs, analysis=analysis)
+    if observer is None:
+        return items
+    return _iter_observed(items, observer)
+
+
+def _iter_observed(items: Iterator[BuildPlanItem], observer: RunObserver) -> Iterator[BuildPlanItem]:
+    for chunk in iter_batches(items, observer.batch_size):
+        observer.on_items_planned(chunk)
+        yield from chunk
+
+
+def _iter_items(template: Dict[str, Any], base_dir: str, context: Context, *, max_expand: int,
+                stats: Optional[RunStats], shard: Optional[Tuple[int, int]], source_root: Optional[str],
+                node_cache: Optional[NodeRenderCache], jobs: Optional[int],
+                analysis: Optional[TemplateAnalysis]) -> Iterator[BuildPlanItem]:
+    ex = _PlanExpander(template, base_dir, context, max_expand=max_expand, stats=stats,
+                       source_root=source_root, node_cache=node_cache, analysis=analysis)
+    if shard is not None:
+        ex.set_shard(shard)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs and jobs > 1:
+        total = min(ex.hi, sum(ex.subtree_size(r) for r in ex.roots)) - ex.lo
+        if total >= _PARALLEL_MIN_ITEMS:
+            units = ex.split(jobs * _CHUNKS_PER_JOB)
+            if sum(1 for u in units if not isinstance(u, list)) > 1:
+                return _iter_parallel(ex, template, units, jobs)
+    return ex.walk_all()
@@ -0,0 +1,194 @@
+# src/foldergen/core/report_io.py
+from __future__ import annotations
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+from . import json_io
+from .checker import ECHO_FIELDS, REPORT_LIST_FIELDS, report_counts
+from .models import AuditReport, ConflictItem, NameIssue
+from .path_table import norm_path
+
+_encode_str = json.encoder.encode_basestring  # 与 json.dumps(ensure_ascii=False) 的字符串转义一致
+_CHUNK = 4096
+
+# --filter 的状态名 -> 报告分段
+FILTER_GROUPS: Dict[str, tuple] = {
+    "planned": ("planned_dirs", "planned_files"),
+    "missing": ("missing_dirs", "missing_files"),
+    "existing": ("existing_dirs", "existing_files"),
+    "extra": ("extra_dirs", "extra_files"),
+    "conflict": ("conflicts",),
+    "permission": ("permission_issues",),
+    "name": ("name_issues",),
+    "outside": ("outside_base_issues",),
+    "duplicate": ("duplicate_planned_paths",),
+}
+
+
+def select_sections(*, echo: bool = True, filter_status: Optional[str] = None) -> List[str]:
+    """
+    按 --echo/--no-echo 与 --filter（如 "missing,conflict" 或 "status=missing,conflict"）选出要输出的分段，
+    保持 AuditReport 的字段顺序。
+    """
+    sections = [f for f in REPORT_LIST_FIELDS if echo or f not in ECHO_FIELDS]
+    if filter_status:
+        spec = filter_status.split("=", 1)[1] if filter_status.startswith("status=") else filter_status
+        want = {s.strip().lower() for s in spec.split(",") if s.strip()}
+        unknown = want - FILTER_GROUPS.keys()
+        if unknown:
+            raise ValueError(f"Unknown status in --filter: {sorted(unknown)}; "
+                             f"expected some of {sorted(FILTER_GROUPS)}")
+        keep = {f for w in want for f in FILTER_GROUPS[w]}
+        sections = [f for f in sections if f in keep]
+    return sections
+
+
+def _json_value(value: Any) -> Any:
+    # 显式转换，不依赖 __dict__
+    if isinstance(value, ConflictItem):
+        return {"path": value.path, "expected": value.expected, "found": value.found}
+    if isinstance(value, NameIssue):
+        return {"path": value.path, "reason": value.reason}
+    return value
+
+
+def _row(section: str, value: Any) -> Dict[str, Any]:
+    v = _json_value(value)
+    if isinstance(v, dict):
+        return v
+    return {"message": v} if section == "permission_issues" else {"path": v}
+
+
+def write_report_json(rep: AuditReport, fw: TextIO, sections: Iterable[str], *,
+                      with_counts: bool = False, compact: bool = False) -> None:
+    """
+    按分段流式写出与 json.dumps(rep, indent=2) 相同格式的 JSON 对象：逐条写入，不构造整串。
+    with_counts=True 时在末尾附加 "counts"（省略回显列表时仍可知道各分类规模）。
+    compact=True 时输出无空白的紧凑 JSON（按块交给 json_io 编码，装有 orjson 时走 orjson）。
+    """
+    if compact:
+        _write_report_compact(rep, fw, sections, with_counts=with_counts)
+        return
+    fw.write("{\n")
+    fw.write(f'  "base_dir": {json.dumps(rep.base_dir, ensure_ascii=False)}')
+    for section in sections:
+        values = getattr(rep, section)
+        fw.write(f',\n  "{section}": ')
+        if not values:
+            fw.write("[]")
+            continue
+        fw.write("[\n    ")
+        if isinstance(values[0], str):
+            # 纯路径分段：直接用编码器转义字符串，按块写出
+            for i in range(0, len(values), _CHUNK):
+                if i:
+                    fw.write(",\n    ")
+                fw.write(",\n    ".join(map(_encode_str, values[i:i + _CHUNK])))
+        else:
+            fw.write(",\n    ".join(json_io.dumps(_json_value(v)).replace("\n", "\n    ") for v in values))
+        fw.write("\n  ]")
+    if with_counts:
+        fw.write(',\n  "counts": ')
+        fw.write(json_io.dumps(rep.counts or report_counts(rep)).replace("\n", "\n  "))
+    fw.write("\n}\n")
+
+
+def _write_report_compact(rep: AuditReport, fw: TextIO, sections: Iterable[str], *, with_counts: bool) -> None:
+    fw.write('{"base_dir":' + json_io.dumps(rep.base_dir, compact=True))
+    for section in sections:
+        values = getattr(rep, section)
+        fw.write(f',"{section}":[')
+        for i in range(0, len(values), _CHUNK):
+            if i:
+                fw.write(",")
+            chunk = values[i:i + _CHUNK]
+            if not isinstance(chunk[0], str):
+                chunk = [_json_value(v) for v in chunk]
+            fw.write(json_io.dumps(chunk, compact=True)[1:-1])  # 去掉块自身的方括号后拼接
+        fw.write("]")
+    if with_counts:
+        fw.write(',"counts":' + json_io.dumps(rep.counts or report_counts(rep), compact=True))
+    fw.write("}\n")
+
+
+def iter_report_records(rep: AuditReport, sections: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    JSONL 记录流：首条 {"section": "meta", "base_dir": ...}，随后每个条目一条
+    {"section": 字段名, "path"/"message"/...}，末条 {"section": "counts", ...各分类计数}。
+    """
+    yield {"section": "meta", "base_dir": rep.base_dir}
+    for section in sections:
+        for v in getattr(rep, section):
+            yield {"section": section, **_row(section, v)}
+    yield {"section": "counts", **(rep.counts or report_counts(rep))}
+
+
+def write_report_jsonl(rep: AuditReport, fw: TextIO, sections: Iterable[str], *, compact: bool = False) -> None:
+    for rec in iter_report_records(rep, sections):
+        fw.write(json_io.dumps_line(rec, compact=compact) + "\n")
+
+
+def report_from_records(rows: Iterable[Dict[str, Any]]) -> AuditReport:
+    """由 check --format jsonl 的记录还原 AuditReport（用于 merge）。"""
+    rep: Optional[AuditReport] = None
+    for row in rows:
+        section = row.get("section")
+        if section == "meta":
+            rep = AuditReport(base_dir=row["base_dir"])
+            continue
+        if rep is None:
+            raise ValueError("JSONL report must start with a 'meta' record.")
+        if section == "counts":
+            rep.counts = {k: v for k, v in row.items() if k != "section"}
+        elif section == "conflicts":
+            rep.conflicts.append(ConflictItem(path=row["path"], expected=row["expected"], found=row["found"]))
+        elif section == "name_issues":
+            rep.name_issues.append(NameIssue(path=row["path"], reason=row["reason"]))
+        elif section == "permission_issues":
+            rep.permission_issues.append(row["message"])
+        elif section in REPORT_LIST_FIELDS:
+            getattr(rep, section).append(row["path"])
+        else:
+            raise ValueError(f"Unknown report section: {section!r}")
+    if rep is None:
+        raise ValueError("Empty JSONL report.")
+    return rep
+
+
+def summarize_subtrees(rep: AuditReport) -> Dict[str, Dict[str, int]]:
+    """
+    按 base 下的顶层子树汇总问题数：{子树名: {missing, conflict, extra, name}}。
+    base 自身记为 "."，base 之外的路径记为 "(outside)"。
+    """
+    base = norm_path(rep.base_dir)
+    # base 为 "." 时规范化后的路径不带 "./" 前缀（同 _walk_actual）：base 内即不以 ".." 开头的相对路径
+    prefix = "" if base == os.curdir else base.rstrip(os.sep) + os.sep
+    out: Dict[str, Dict[str, int]] = {}
+
+    def top(p: str) -> str:
+        if p == base:
+            return "."
+        if prefix:
+            if not p.startswith(prefix):
+                return "(outside)"
+        elif os.path.isabs(p) or p.split(os.sep, 1)[0] == os.pardir:
+            return "(outside)"
+        return p[len(prefix):].split(os.sep, 1)[0]
+
+    def bump(p: str, key: str) -> None:
+        row = out.setdefault(top(p), {"missing": 0, "conflict": 0, "extra": 0, "name": 0})
+        row[key] += 1
+
+    for p in rep.missing_dirs:
+        bump(p, "missing")
+    for p in rep.missing_files:
+        bump(p, "missing")
+    for c in rep.conflicts:
+        bump(c.path, "conflict")
+    for p in rep.extra_dirs:
+        bump(p, "extra")
+    for p in rep.extra_files:
+        bump(p, "extra")
+    for ni in rep.name_issues:
+        bump(ni.path, "name")
+    return dict(sorted(out.items()))
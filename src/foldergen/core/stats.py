@@ -0,0 +1,110 @@
+# src/foldergen/core/stats.py
+from __future__ import annotations
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+try:  # 仅 POSIX 提供；Windows 下退化为不报告 RSS
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .events import RunObserver
+
+
+@dataclass
+class PhaseStats:
+    name: str
+    seconds: float = 0.0  # 累计墙钟时间
+    calls: int = 0  # 进入次数（如 plan.render 会被调用很多次）
+    items: int = 0  # 本阶段产出/处理的条目数
+    syscalls: int = 0  # 本阶段直接发起的文件系统调用数（估计值）
+    peak_kb: int = 0  # 阶段结束时观测到的内存峰值（KiB）
+
+
+@dataclass
+class RunStats:
+    """
+    轻量的分阶段统计。阶段名用 "plan.expand" 这种点号表示嵌套关系，
+    嵌套阶段的时间同时计入父阶段。
+    trace_memory=True 时用 tracemalloc 统计每阶段 Python 堆峰值（有额外开销），
+    否则报告进程 RSS 高水位（仅 POSIX）。
+    observer：每个 phase() 正常结束时收到 on_phase_end（timed 包装的高频子阶段不派发）。
+    """
+    phases: Dict[str, PhaseStats] = field(default_factory=dict)  # 插入顺序即阶段首次出现顺序
+    trace_memory: bool = False
+    observer: Optional["RunObserver"] = field(default=None, repr=False, compare=False)
+
+    def get(self, name: str) -> PhaseStats:
+        rec = self.phases.get(name)
+        if rec is None:
+            rec = self.phases[name] = PhaseStats(name=name)
+        return rec
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseStats]:
+        rec = self.get(name)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec.seconds += time.perf_counter() - t0
+            rec.calls += 1
+            rec.peak_kb = max(rec.peak_kb, _peak_kb(self.trace_memory))
+        if self.observer is not None:
+            self.observer.on_phase_end(rec)
+
+    def timed(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """包装高频调用的函数，把耗时累加到阶段 name（不做内存采样，保持开销最低）。"""
+        if "." in name:
+            self.get(name.rsplit(".", 1)[0])  # 先登记父阶段，保证输出顺序为父在前
+        rec = self.get(name)
+        perf = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            t0 = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                rec.seconds += perf() - t0
+                rec.calls += 1
+
+        return wrapper
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "memory": "tracemalloc" if self.trace_memory else "maxrss",
+            "phases": [asdict(p) for p in self.phases.values()],
+        }
+
+    def format_table(self) -> str:
+        lines: List[str] = [f"{'phase':<24}{'seconds':>10}{'calls':>10}{'items':>12}{'syscalls':>12}{'peak_kb':>12}"]
+        for p in self.phases.values():
+            indent = "  " * p.name.count(".")
+            lines.append(f"{indent + p.name:<24}{p.seconds:>10.4f}{p.calls:>10}{p.items:>12}{p.syscalls:>12}{p.peak_kb:>12}")
+        return "\n".join(lines)
+
+
+def phase(stats: Optional[RunStats], name: str):
+    """stats 为 None 时返回一个丢弃式的空阶段，调用方无需分支判断。"""
+    if stats is None:
+        return nullcontext(PhaseStats(name=name))
+    return stats.phase(name)
+
+
+def _peak_kb(trace_memory: bool) -> int:
+    if trace_memory and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1] // 1024
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以 KiB 为单位
+        return rss // 1024 if sys.platform == "darwin" else rss
+    return 0
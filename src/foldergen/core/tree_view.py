@@ -0,0 +1,132 @@
+# src/foldergen/core/tree_view.py
+from __future__ import annotations
+import os
+from pathlib import PurePath
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from .models import BuildPlanItem
+from .path_table import StatusIndex
+
+
+class TreeNode:
+    """计划前缀树的紧凑节点（只保存渲染所需的字段）。"""
+    __slots__ = ("name", "type", "status", "children")
+
+    def __init__(self, name: str, typ: str = "dir"):
+        self.name = name
+        self.type = typ
+        self.status: Optional[str] = None
+        self.children: Dict[str, "TreeNode"] = {}  # 名称 -> 节点；dict 保持插入（模板）顺序
+
+
+def build_trie(
+    items: Iterable[BuildPlanItem],
+    *,
+    base_dir: Optional[str] = None,
+    relative: bool = True,
+    include_files: bool = True,
+    max_depth: Optional[int] = None,
+    status: Optional[StatusIndex] = None,
+) -> TreeNode:
+    """
+    由计划条目构建前缀树，与 BuildPlan.to_tree 的结构/顺序/状态一致（目录先插入，文件其后），
+    但只保留前 max_depth 层：更深的组件在构建时即被丢弃，不会占用内存。
+    """
+    rel_mode = bool(relative and base_dir)
+    base = str(PurePath(base_dir)) if base_dir else ""
+    root = TreeNode("" if rel_mode else "<root>")
+    prefix = base.rstrip(os.sep) + os.sep
+    items = items if isinstance(items, list) else list(items)  # 目录、文件各遍历一次
+
+    def split(path: str) -> List[str]:
+        # 快速路径：base 下的相对路径按分隔符切分；其余情况退回 PurePath（与 to_relative 一致）
+        if rel_mode:
+            if path.startswith(prefix):
+                rel = path[len(prefix):]
+                if os.altsep:
+                    rel = rel.replace(os.altsep, os.sep)
+                # 有 max_depth 时最多切出 max_depth+1 段，更深的剩余部分整体忽略
+                parts = rel.split(os.sep, max_depth) if max_depth is not None else rel.split(os.sep)
+                return [c for c in parts if c not in ("", ".")]
+            try:
+                return list(PurePath(path).relative_to(PurePath(base)).parts)
+            except ValueError:
+                pass
+        return list(PurePath(path).parts)
+
+    def insert(item: BuildPlanItem, typ: str) -> None:
+        parts = split(item.path)
+        node = root
+        abs_path = base if rel_mode else ""
+        for i, part in enumerate(parts):
+            if part in (".", ""):
+                continue
+            if max_depth is not None and i >= max_depth:
+                return
+            is_leaf = i == len(parts) - 1
+            kind = "file" if (typ == "file" and is_leaf) else "dir"
+            key = part if kind == "dir" else "\0" + part  # 同名的目录与文件分开存放
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = TreeNode(part, kind)
+            node = child
+            if status is not None:
+                abs_path = os.path.join(abs_path, part)
+                # 与 to_tree 一致：目录条目的每一级、文件条目的叶子带状态（按路径 ID 取，无需规范化）
+                if typ == "dir" or is_leaf:
+                    child.status = status.status_of(abs_path)
+
+    for it in items:
+        if it.type == "dir":
+            insert(it, "dir")
+    if include_files:
+        for it in items:
+            if it.type == "file":
+                insert(it, "file")
+    return root
+
+
+def _children(node: TreeNode, sort: str, max_children: Optional[int]) -> Iterator[Tuple[Optional[TreeNode], bool, int]]:
+    kids = list(node.children.values())
+    if sort == "alpha":
+        kids.sort(key=lambda c: (c.type != "dir", c.name.lower()))
+    hidden = 0
+    if max_children is not None and len(kids) > max_children:
+        hidden = len(kids) - max_children
+        kids = kids[:max_children]
+    for i, c in enumerate(kids):
+        yield c, (i == len(kids) - 1 and not hidden), 0
+    if hidden:
+        yield None, True, hidden
+
+
+def iter_tree_lines(
+    root: TreeNode,
+    *,
+    max_depth: Optional[int] = None,
+    max_children: Optional[int] = None,
+    sort: Literal["template", "alpha"] = "template",
+    label: Optional[Callable[[TreeNode], str]] = None,
+) -> Iterator[str]:
+    """
+    逐行产出 ASCII 树（格式与 to_tree + 整串渲染一致），不构造嵌套 dict，也不拼接整串。
+    max_children：每个目录最多显示 N 个子项，其余折叠为 "… and K more"。
+    """
+    fmt = label or (lambda n: n.name or ".")
+    yield fmt(root)
+    if max_depth is not None and max_depth <= 0:
+        return
+    # 显式栈代替递归，极深的树也不会触发递归上限
+    stack = [(_children(root, sort, max_children), "   ", 1)]
+    while stack:
+        it, prefix, level = stack[-1]
+        nxt = next(it, None)
+        if nxt is None:
+            stack.pop()
+            continue
+        child, last, hidden = nxt
+        if child is None:
+            yield f"{prefix}└─ … and {hidden} more"
+            continue
+        yield f"{prefix}{'└─ ' if last else '├─ '}{fmt(child)}"
+        if child.children and (max_depth is None or level < max_depth):
+            stack.append((_children(child, sort, max_children), prefix + ("   " if last else "│  "), level + 1))
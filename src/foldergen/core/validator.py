@@ -1,9 +1,14 @@
 # src/foldergen/core/validator.py
+import os
 import re
-from typing import Any, Dict, Set
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+from .models import TemplateAnalysis
+from .parser import load_content_template, render_string
 
 _GEN_RE = re.compile(r"\{\{[^{}]*\}\}")
 _VAR_RE = re.compile(r"(?<!\{)\{([^{}|]+?)(?:\|[^{}]*)?\}(?!\})")
+# 单次扫描同时识别生成器（group(1) 为 None）与变量占位符
+_TOKEN_RE = re.compile(r"\{\{[^{}]*\}\}|(?<!\{)\{([^{}|]+?)(?:\|[^{}]*)?\}(?!\})")
 
 def collect_placeholders(s: str) -> Set[str]:
     if not s:
@@ -11,39 +16,103 @@ def collect_placeholders(s: str) -> Set[str]:
     cleaned = _GEN_RE.sub("", s)
     return {m.group(1).strip() for m in _VAR_RE.finditer(cleaned)}
 
+def _scan(s: str) -> Tuple[FrozenSet[str], int]:
+    # 返回 (变量集合, 生成器个数)
+    if not s:
+        return frozenset(), 0
+    names = set()
+    gens = 0
+    for m in _TOKEN_RE.finditer(s):
+        if m.group(1) is None:
+            gens += 1
+        else:
+            names.add(m.group(1).strip())
+    return frozenset(names), gens
+
+def analyze_template(template: Dict[str, Any], context: Optional[Dict[str, Any]] = None, *,
+                     source_root: Optional[str] = None) -> TemplateAnalysis:
+    """
+    单遍遍历模板：结构校验 + 变量使用/缺失/未使用 + 生成器计数 + 每节点变量依赖。
+    同一字符串（如各层重复的 README.md / LOD_{{...}}）只扫描一次。
+    给出 source_root 时还会编译文件对象引用的内容模板（路径规则同 build_plan），
+    其中的占位符计入 used_vars / missing_vars（不计入 node_deps：不影响计划路径）；读不到的模板记为错误。
+    路径含生成器或缺变量时无法静态确定，跳过。
+    """
+    ana = TemplateAnalysis()
+    if "dirs" not in template or not isinstance(template["dirs"], list):
+        ana.valid = False
+        ana.errors.append("Template root must have a 'dirs' list.")
+        return ana
+
+    memo: Dict[str, Tuple[FrozenSet[str], int]] = {}
+    content_paths: Dict[str, None] = {}  # 去重且保序
+
+    def scan(s: str) -> FrozenSet[str]:
+        hit = memo.get(s)
+        if hit is None:
+            hit = memo[s] = _scan(s)
+        ana.generator_count += hit[1]
+        return hit[0]
+
+    def walk(node: Any, key: Tuple[int, ...]) -> None:
+        if not isinstance(node, dict):
+            ana.errors.append(f"Template node at {list(key)} must be an object.")
+            return
+        deps = set(scan(node.get("name", "")))
+        files = node.get("files", []) or []
+        if not isinstance(files, list):
+            ana.errors.append(f"Template node at {list(key)}: 'files' must be a list.")
+            files = []
+        for f in files:
+            if isinstance(f, dict):
+                # {"name": ..., "source"/"template": ...} 形式：name 与路径都可含占位符
+                if not f.get("name"):
+                    ana.errors.append(f"Template node at {list(key)}: file object requires 'name'.")
+                    continue
+                deps.update(scan(f["name"]))
+                deps.update(scan(f.get("source") or ""))
+                if f.get("template"):
+                    deps.update(scan(f["template"]))
+                    content_paths[f["template"]] = None
+            else:
+                deps.update(scan(f))
+        ana.node_deps[key] = frozenset(deps)
+        ana.used_vars.update(deps)
+        for i, c in enumerate(node.get("dirs", []) or []):
+            walk(c, key + (i,))
+
+    for i, root in enumerate(template["dirs"]):
+        walk(root, (i,))
+
+    if source_root is not None:
+        for raw in content_paths:
+            names = memo[raw][0]
+            if memo[raw][1] or (names and (context is None or not names.issubset(context))):
+                continue
+            try:
+                path = os.path.join(source_root, render_string(raw, context) if names else raw)
+            except (KeyError, ValueError):
+                continue
+            try:
+                ana.used_vars.update(load_content_template(path).variables())
+            except OSError as e:
+                ana.errors.append(f"Content template not readable: {path} ({e.strerror or e})")
+
+    ana.valid = not ana.errors
+    if context is not None:
+        ana.missing_vars = {v for v in ana.used_vars if v not in context}
+        ana.unused_vars = set(context.keys()) - ana.used_vars
+    return ana
+
 def validate_template_dict(template: Dict[str, Any]) -> None:
     if "dirs" not in template or not isinstance(template["dirs"], list):
         raise ValueError("Template root must have a 'dirs' list.")
 
 def find_missing_vars(template: Dict[str, Any], context: Dict[str, Any]) -> Set[str]:
-    missing: Set[str] = set()
-    def walk(node: Dict[str, Any]) -> None:
-        name = node.get("name","")
-        for var in collect_placeholders(name):
-            if var not in context:
-                missing.add(var)
-        for f in node.get("files",[]) or []:
-            for var in collect_placeholders(f):
-                if var not in context:
-                    missing.add(var)
-        for c in node.get("dirs",[]) or []:
-            walk(c)
-    for root in template.get("dirs",[]) or []:
-        walk(root)
-    return missing
+    return analyze_template(template, context).missing_vars
 
 def find_used_vars(template: Dict[str, Any]) -> Set[str]:
-    used: Set[str] = set()
-    def walk(node: Dict[str, Any]) -> None:
-        used.update(collect_placeholders(node.get("name","")))
-        for f in node.get("files",[]) or []:
-            used.update(collect_placeholders(f))
-        for c in node.get("dirs",[]) or []:
-            walk(c)
-    for root in template.get("dirs",[]) or []:
-        walk(root)
-    return used
+    return analyze_template(template).used_vars
 
 def find_unused_vars(template: Dict[str, Any], context: Dict[str, Any]) -> Set[str]:
-    used = find_used_vars(template)
-    return set(context.keys()) - used
+    return analyze_template(template, context).unused_vars
@@ -0,0 +1,211 @@
+# src/foldergen/core/watch.py
+from __future__ import annotations
+import gzip
+import json
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+from .path_table import norm_path as _norm
+
+_Stamp = Tuple[int, int]  # (st_mtime_ns, st_ino)
+_SNAPSHOT_VERSION = 1
+# 目录 mtime 落在保存时刻之前这段时间内的，下次视为“可能已变”并重新列出（同一时间刻度内的修改不会改变 mtime）
+_RACY_NS = 2_000_000_000
+
+
+class DirSnapshot:
+    """
+    base 目录的增量快照（供 watch 轮询与 check --snapshot 使用，仅依赖标准库）。
+    记录每个目录的 (mtime, inode) 与直接子项；目录 mtime 只在其直接子项增删/改名时变化，
+    因此每轮只需 stat 已知目录，mtime/inode 变了才重新 scandir 该目录，新出现的子目录递归扫描。
+    分类与 os.walk 一致：指向目录的链接算目录，但不跟随时不进入其中。
+    """
+
+    def __init__(self, base_dir: str, *, follow_symlinks: bool = False):
+        self.base = _norm(base_dir)
+        self.follow_symlinks = follow_symlinks
+        self.dirs: Set[str] = set()
+        self.files: Set[str] = set()
+        # 目录 -> ((mtime_ns, inode), 子目录集合, 子文件集合)
+        self._entries: Dict[str, Tuple[_Stamp, Set[str], Set[str]]] = {}
+        self._links: Set[str] = set()  # 未跟随的目录链接（只算目录，不列出）
+        self._racy_ns: Optional[int] = None
+        # POSIX 下由已规范化目录拼出的 entry.path 本身即为规范形式；Windows 或 base 为 "." 时逐项规范化
+        self._norm_entries = os.name == "nt" or self.base == os.curdir
+        self.syscalls = 0
+
+    def kind(self, path: str) -> Optional[str]:
+        if path in self.dirs:
+            return "dir"
+        if path in self.files:
+            return "file"
+        return None
+
+    def scan(self) -> Set[str]:
+        """完整扫描（首次或 base 被重建时），返回涉及的目录集合。"""
+        touched = set(self._entries)
+        self._drop(self.base, touched)
+        if self._stamp(self.base) is not None:
+            self._scan_dir(self.base, touched)
+        return touched
+
+    def refresh(self) -> Set[str]:
+        """
+        增量刷新：返回子项可能变化的目录集合（已重新列出或已被删除的目录）。
+        未变化时返回空集合，且只花费“已知目录数”次 stat。
+        """
+        touched: Set[str] = set()
+        if self.base not in self._entries:
+            if self._stamp(self.base) is not None:
+                self._scan_dir(self.base, touched)
+            return touched
+        racy = self._racy_ns
+        for d in sorted(self._entries):  # 父目录先于子目录，子树删除后跳过其成员
+            entry = self._entries.get(d)
+            if entry is None:
+                continue
+            stamp = self._stamp(d)
+            if stamp is None:
+                self._drop(d, touched)
+                parent = os.path.dirname(d)
+                if parent in self._entries:
+                    touched.add(parent)
+            elif stamp != entry[0] or (racy is not None and stamp[0] >= racy):
+                self._rescan(d, touched)
+        self._racy_ns = None  # 刚核对过的结果已是最新，此后只按 stamp 判断
+        return touched
+
+    def save(self, path: str) -> None:
+        """
+        写出紧凑索引（gzip JSON）：每个目录一行 [相对路径, mtime_ns, inode, 子目录名, 子文件名]，
+        只存名称而非完整路径。经临时文件 + os.replace 原子覆盖。
+        """
+        base = self.base
+        cut = 0 if base == os.curdir else len(base.rstrip(os.sep)) + 1
+        rel = (lambda p: "" if p == base else p[cut:])
+        dirs = []
+        for d, (st, sub_dirs, sub_files) in self._entries.items():
+            n = 0 if d == os.curdir else len(d.rstrip(os.sep)) + 1  # 子项 = 目录前缀 + 名称，直接切片取名
+            dirs.append([rel(d), st[0], st[1], sorted(p[n:] for p in sub_dirs), sorted(p[n:] for p in sub_files)])
+        doc = {
+            "version": _SNAPSHOT_VERSION,
+            "base": base,
+            "cwd": os.getcwd() if not os.path.isabs(base) else "",
+            "follow_symlinks": self.follow_symlinks,
+            "clock": time.time_ns(),
+            "dirs": dirs,
+            "links": sorted(rel(p) for p in self._links),
+        }
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as fw:
+            json.dump(doc, fw, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, base_dir: str, *, follow_symlinks: bool = False) -> Optional["DirSnapshot"]:
+        """读取 save 写出的索引；文件不存在、已损坏或与 base/选项不匹配时返回 None（应改做完整扫描）。"""
+        snap = cls(base_dir, follow_symlinks=follow_symlinks)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fr:
+                doc = json.load(fr)
+        except (OSError, EOFError, ValueError):
+            return None
+        cwd = os.getcwd() if not os.path.isabs(snap.base) else ""
+        if (doc.get("version") != _SNAPSHOT_VERSION or doc.get("base") != snap.base
+                or doc.get("cwd") != cwd or doc.get("follow_symlinks") != follow_symlinks):
+            return None
+        base = snap.base
+
+        def prefix(d: str) -> str:
+            return "" if d == os.curdir else d.rstrip(os.sep) + os.sep  # 与 _list 对 "./x" 的规范化一致
+
+        base_prefix = prefix(base)
+        absolute = (lambda r: base_prefix + r if r else base)
+        entries, dirs, files = snap._entries, snap.dirs, snap.files
+        for r, mtime, ino, sub_dirs, sub_files in doc["dirs"]:
+            d = absolute(r)
+            pre = prefix(d)
+            sd = {pre + n for n in sub_dirs}
+            sf = {pre + n for n in sub_files}
+            entries[d] = ((mtime, ino), sd, sf)
+            dirs.add(d)
+            dirs |= sd
+            files |= sf
+        snap._links = {absolute(r) for r in doc.get("links", [])}
+        snap._racy_ns = doc["clock"] - _RACY_NS
+        return snap
+
+    def _stamp(self, d: str) -> Optional[_Stamp]:
+        self.syscalls += 1
+        try:
+            st = os.stat(d, follow_symlinks=self.follow_symlinks or d == self.base)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def _list(self, d: str) -> Tuple[_Stamp, Set[str], Set[str]]:
+        sub_dirs, sub_files = set(), set()
+        stamp = self._stamp(d) or (0, 0)
+        self.syscalls += 1
+        norm = self._norm_entries
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    p = _norm(e.path) if norm else e.path
+                    try:
+                        is_dir = e.is_dir()  # 与 os.walk 一致：指向目录的链接也算目录
+                        if is_dir and not self.follow_symlinks and e.is_symlink():
+                            self._links.add(p)
+                    except OSError:
+                        is_dir = False
+                    (sub_dirs if is_dir else sub_files).add(p)
+        except OSError:
+            pass
+        return stamp, sub_dirs, sub_files
+
+    def _scan_dir(self, d: str, touched: Set[str]) -> None:
+        stack = [d]
+        while stack:
+            cur = stack.pop()
+            self.dirs.add(cur)
+            if cur in self._links:
+                continue  # 不跟随的目录链接：不列出其内容
+            entry = self._entries[cur] = self._list(cur)
+            self.files.update(entry[2])
+            stack.extend(entry[1])
+            touched.add(cur)
+
+    def _rescan(self, d: str, touched: Set[str]) -> None:
+        _, old_dirs, old_files = self._entries[d]
+        for p in old_dirs:
+            self._links.discard(p)  # 由重新列出的结果重新判定
+        entry = self._entries[d] = self._list(d)
+        _, new_dirs, new_files = entry
+        touched.add(d)
+        self.files.difference_update(old_files - new_files)
+        self.files.update(new_files)
+        for gone in old_dirs - new_dirs:
+            self._drop(gone, touched)
+        for added in new_dirs - old_dirs:
+            self._scan_dir(added, touched)
+        for kept in old_dirs & new_dirs:
+            # 同名子项在目录与链接之间互换：按新类型重新扫描
+            is_link = kept in self._links
+            if is_link == (kept in self._entries):
+                self._drop(kept, touched)
+                if is_link:
+                    self._links.add(kept)
+                self._scan_dir(kept, touched)
+
+    def _drop(self, d: str, touched: Set[str]) -> None:
+        stack = [d]
+        while stack:
+            cur = stack.pop()
+            entry = self._entries.pop(cur, None)
+            self.dirs.discard(cur)
+            self._links.discard(cur)
+            if entry is None:
+                continue
+            touched.add(cur)
+            self.files.difference_update(entry[2])
+            stack.extend(entry[1])
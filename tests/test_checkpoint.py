@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+
+import foldergen
+from foldergen.core.fs_backend import RecordingFS
+from foldergen.core.fs_ops import apply_plan
+from foldergen.core.plan_builder import build_plan
+
+TEMPLATE = {"dirs": [{"name": "root", "dirs": [{"name": "d{{int: start=1; stop=20}}",
+                                                "files": ["f{{int: start=1; stop=100}}.txt"]}]}]}
+
+# 子进程中构建：检查点文件周期性落盘后再写 after 个文件即 os._exit（不执行任何 except/finally，
+# 与 SIGKILL / 断电一样来不及补存检查点）；每个写完的文件逐行记入 log
+_CHILD = r"""
+import json, os, sys, threading
+from foldergen.core.fs_backend import LocalFS
+from foldergen.core.fs_ops import apply_plan
+from foldergen.core.plan_builder import build_plan
+
+template, base, cp_path, log_path, jobs, after = sys.argv[1:]
+after = int(after)
+lock = threading.Lock()
+log = open(log_path, "w", encoding="utf-8")
+
+class KillAfterCheckpoint(LocalFS):
+    def touch(self, path):
+        global after
+        with lock:
+            if os.path.exists(cp_path):
+                after -= 1
+                if after < 0:
+                    os._exit(9)
+            super().touch(path)
+            log.write(path + "\n")
+            log.flush()
+
+apply_plan(build_plan(json.loads(template), base, {}), jobs=int(jobs), batch_size=32,
+           checkpoint_path=cp_path, echo=False, fs=KillAfterCheckpoint())
+"""
+
+
+def _tree(base: str):
+    out = set()
+    for root, dirs, files in os.walk(base):
+        rel = os.path.relpath(root, base)
+        out.update(os.path.join(rel, n) for n in dirs + files)
+    return out
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_killed_build_resumes_from_checkpoint(tmp_path, jobs):
+    base = str(tmp_path / "out")
+    cp_path = str(tmp_path / "build.checkpoint")
+    log_path = str(tmp_path / "written.log")
+    plan = build_plan(TEMPLATE, base, {})
+    assert len(plan.items) == 2021
+
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(list(foldergen.__path__)[0]))
+    proc = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(TEMPLATE), base, cp_path, log_path,
+                           str(jobs), "100"], env=env, capture_output=True, text=True)
+    assert proc.returncode == 9, proc.stderr
+    with open(cp_path, encoding="utf-8") as fr:
+        done = json.load(fr)["done"]
+    assert 255 <= done < 511  # 第一次周期性保存（every=256）的值
+    with open(log_path, encoding="utf-8") as fr:
+        killed_written = fr.read().splitlines()
+    assert len(killed_written) == len(set(killed_written))
+    # 被杀前检查点之后又写完了一批文件，却来不及补存检查点
+    after_cp = set(killed_written) - {it.path for it in plan.items[:done + 1]}
+    assert len(after_cp) >= 100  # 并行时还包括先于前缀完成的批次
+
+    rec = RecordingFS(keep_log=True)
+    apply_plan(plan, jobs=jobs, batch_size=32, checkpoint_path=cp_path, echo=False, fs=rec)
+    assert not os.path.exists(cp_path)
+
+    # 检查点之前的文件不再被探测或写入；其中的目录只会作为后续文件的父目录被 mkdir(exist_ok)
+    before_files = {it.path for it in plan.items[:done + 1] if it.type == "file"}
+    before_dirs = {it.path for it in plan.items[:done + 1] if it.type == "dir"}
+    parents = {os.path.dirname(it.path) for it in plan.items[done + 1:]}
+    assert before_files <= set(killed_written)
+    assert not [(op, p) for op, p in rec.log if p in before_files]
+    assert not [p for op, p in rec.log if op == "mkdir" and p in before_dirs - parents]
+
+    # 每个文件恰好写一次：被杀前已写完的（含检查点之后的）靠 exists 跳过，其余由续跑补齐
+    resumed_written = [p for op, p in rec.log if op == "touch"]
+    assert max(Counter(resumed_written).values()) == 1
+    assert not set(resumed_written) & set(killed_written)
+    assert set(resumed_written) | set(killed_written) == {it.path for it in plan.items if it.type == "file"}
+
+    clean = str(tmp_path / "clean")
+    apply_plan(build_plan(TEMPLATE, clean, {}), echo=False)
+    assert _tree(base) == _tree(clean)
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from foldergen.core.fs_backend import FileSystem, LocalFS, MemoryFS, RecordingFS, ThrottledFS
+
+
+class _NoRealpath(FileSystem):
+    def mkdir(self, path, *, exist_ok=True):
+        pass
+
+    def touch(self, path):
+        pass
+
+    def write_text(self, path, chunks):
+        return 0
+
+    def copy_file(self, src, dst, mode="copy"):
+        return "copy"
+
+    def scandir(self, path):
+        return iter(())
+
+    def stat(self, path, *, follow_symlinks=True):
+        raise FileNotFoundError(path)
+
+    def access(self, path, mode):
+        return False
+
+
+def test_incomplete_backend_fails_at_construction():
+    with pytest.raises(TypeError, match="realpath"):
+        _NoRealpath()
+
+
+@pytest.mark.parametrize("make", [LocalFS, MemoryFS, RecordingFS, ThrottledFS])
+def test_shipped_backends_are_complete(make):
+    assert isinstance(make(), FileSystem)
+
+
+def test_memory_fs_matches_local_walk(tmp_path):
+    base = str(tmp_path / "b")
+    mem = MemoryFS()
+    for fs in (LocalFS(), mem):
+        fs.mkdir(os.path.join(base, "a", "x"))
+        fs.touch(os.path.join(base, "a", "f.txt"))
+        with pytest.raises(FileExistsError):
+            fs.mkdir(os.path.join(base, "a", "f.txt"))
+
+    def walk(fs):
+        return sorted((root, sorted(dirs), sorted(files)) for root, dirs, files in fs.walk(base))
+
+    assert walk(mem) == walk(LocalFS())
+
+
+@pytest.mark.parametrize("make", [LocalFS, MemoryFS])
+def test_failed_write_leaves_no_partial_file(tmp_path, make):
+    fs = make()
+    fs.mkdir(str(tmp_path))
+    path = str(tmp_path / "out.txt")
+
+    def chunks():
+        yield "x" * 100_000
+        raise KeyError("Missing variable: owner")
+
+    with pytest.raises(KeyError):
+        fs.write_text(path, chunks())
+    assert not fs.exists(path)
+    assert os.listdir(tmp_path) == []
+    assert fs.write_text(path, iter(["ok"])) == 2 and fs.exists(path)
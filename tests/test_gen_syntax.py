@@ -0,0 +1,39 @@
+import pytest
+
+from foldergen.core.gen_syntax import (GeneratorCache, GeneratorSpec, GeneratorSyntaxError, expand_generators,
+                                       parse_generator)
+from foldergen.core.plan_builder import build_plan
+
+
+def test_int_pad():
+    assert expand_generators("v{{int: start=-1; stop=1; pad=2}}") == ["v-1", "v00", "v01"]
+    assert expand_generators("{{int: start=1; stop=2; pad=0}}") == ["1", "2"]
+
+
+@pytest.mark.parametrize("pad", ["-2", "x"])
+def test_bad_int_pad_is_syntax_error(pad):
+    with pytest.raises(GeneratorSyntaxError):
+        parse_generator(f"int: start=1; stop=2; pad={pad}")
+    with pytest.raises(GeneratorSyntaxError):
+        build_plan({"dirs": [{"name": f"d{{{{int: start=1; stop=2; pad={pad}}}}}"}]}, "base", {})
+
+
+def test_generator_spec_is_abstract():
+    with pytest.raises(TypeError):
+        GeneratorSpec(kind="x", expr="x")
+
+    class Partial(GeneratorSpec):
+        def count(self) -> int:
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial(kind="x", expr="x")
+
+
+def test_cache_is_per_instance():
+    cache = GeneratorCache()
+    s = "a{{alpha: start=A; stop=C}}_{{int: start=1; stop=2}}"
+    assert expand_generators(s, cache) == ["aA_1", "aA_2", "aB_1", "aB_2", "aC_1", "aC_2"]
+    assert cache.estimate(s) == 6
+    assert list(cache.expanded) == [s]
+    assert GeneratorCache().expanded == {}
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from foldergen.core.fs_ops import write_rendered
+from foldergen.core.fs_backend import MemoryFS
+from foldergen.core.parser import CompiledTemplate, load_content_template
+
+
+def test_content_template_keeps_literal_json_braces(tmp_path):
+    tpl = tmp_path / "pkg.json.tpl"
+    tpl.write_text('{"name": "{proj|slug}", "opts": {"x": 1, "nested": {"y": [2]}}}\n', encoding="utf-8")
+    dst = tmp_path / "package.json"
+    write_rendered(str(tpl), str(dst), {"proj": "My Proj"})
+    assert dst.read_text(encoding="utf-8") == '{"name": "my_proj", "opts": {"x": 1, "nested": {"y": [2]}}}\n'
+
+
+def test_content_template_escape_and_variables():
+    tpl = CompiledTemplate('a={{a}} b={ b | pad(3) } c={"k": 1} d=f"{x!r}"', content=True)
+    assert tpl.variables() == {"b"}
+    assert tpl.render({"b": 7}) == 'a={a} b=007 c={"k": 1} d=f"{x!r}"'
+
+
+def test_content_template_missing_variable():
+    fs = MemoryFS()
+    with pytest.raises(KeyError, match="proj"):
+        fs.write_text("/x", CompiledTemplate('{"k": "{proj}"}', content=True).iter_render({}))
+    assert not fs.exists("/x")
+
+
+def test_content_template_recompiled_after_edit(tmp_path):
+    tpl = tmp_path / "a.tpl"
+    tpl.write_text("v1 {x}", encoding="utf-8")
+    os.utime(tpl, ns=(1_000_000_000, 1_000_000_000))
+    assert load_content_template(str(tpl)).render({"x": 1}) == "v1 1"
+    tpl.write_text("version2 {x}", encoding="utf-8")
+    os.utime(tpl, ns=(2_000_000_000, 2_000_000_000))
+    assert load_content_template(str(tpl)).render({"x": 1}) == "version2 1"
@@ -0,0 +1,29 @@
+import os
+
+from foldergen.core.plan_builder import NodeRenderCache, build_plan
+from foldergen.core.validator import analyze_template
+
+TEMPLATE = {"dirs": [
+    {"name": "{proj}", "files": ["a.txt", {"name": "c_{{int: start=1; stop=2}}.txt", "template": "t_{shot}.txt"}],
+     "dirs": [{"name": "s{{int: start=1; stop=3}}", "files": ["x.txt"]}, {"name": "{shot}_out"}]},
+]}
+
+
+def test_node_cache_keys_from_analysis_match_scanned_keys():
+    ctx = {"proj": "P", "shot": "S"}
+    scanned, analysed = NodeRenderCache(), NodeRenderCache()
+    plan = build_plan(TEMPLATE, "base", ctx, node_cache=scanned)
+    assert build_plan(TEMPLATE, "base", ctx, node_cache=analysed,
+                      analysis=analyze_template(TEMPLATE, ctx)).items == plan.items
+    assert set(analysed.entries) == set(scanned.entries)
+
+
+def test_node_cache_reuses_nodes_that_do_not_reference_changed_var():
+    cache = NodeRenderCache()
+    ctx = {"proj": "P", "shot": "S"}
+    build_plan(TEMPLATE, "base", ctx, node_cache=cache, analysis=analyze_template(TEMPLATE, ctx))
+    cache.prune()
+    ctx = {"proj": "P", "shot": "T"}
+    plan = build_plan(TEMPLATE, "base", ctx, node_cache=cache, analysis=analyze_template(TEMPLATE, ctx))
+    assert (cache.misses, cache.hits) == (2, 1)  # 根节点（内容模板引用 shot）与 {shot}_out 重新展开
+    assert os.path.join("base", "P", "T_out") in {it.path for it in plan.items}
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from foldergen.core.checker import merge_reports
+from foldergen.core.models import AuditReport, ConflictItem, NameIssue
+from foldergen.core.report_io import summarize_subtrees
+
+
+def _report(base: str, join) -> AuditReport:
+    return AuditReport(
+        base_dir=base,
+        missing_dirs=[join("a")],
+        missing_files=[join("a", "x.txt"), join("b", "y.txt")],
+        extra_files=[join("c.txt")],
+        conflicts=[ConflictItem(path=join("b", "z"), expected="dir", found="file")],
+        name_issues=[NameIssue(path=join("a", "bad?"), reason="illegal char")],
+    )
+
+
+def _expected():
+    return {
+        "a": {"missing": 2, "conflict": 0, "extra": 0, "name": 1},
+        "b": {"missing": 1, "conflict": 1, "extra": 0, "name": 0},
+        "c.txt": {"missing": 0, "conflict": 0, "extra": 1, "name": 0},
+    }
+
+
+def test_summarize_subtrees_absolute_base(tmp_path):
+    base = str(tmp_path)
+    rep = _report(base, lambda *parts: os.path.join(base, *parts))
+    assert summarize_subtrees(rep) == _expected()
+
+
+def test_summarize_subtrees_relative_base():
+    # base 为 "." 时报告路径已规范化为不带 "./" 的相对路径
+    rep = _report(".", os.path.join)
+    assert summarize_subtrees(rep) == _expected()
+
+
+def test_summarize_subtrees_relative_base_outside():
+    rep = AuditReport(base_dir=".", missing_files=[os.path.join(os.pardir, "x"), os.path.abspath("y")])
+    assert summarize_subtrees(rep) == {"(outside)": {"missing": 2, "conflict": 0, "extra": 0, "name": 0}}
+
+
+def test_merge_recomputes_case_collisions_across_shards():
+    a = AuditReport(base_dir="b", planned_dirs=["b/Docs"], missing_dirs=["b/Docs"])
+    b = AuditReport(base_dir="b", planned_dirs=["b/docs", "b/x"], missing_dirs=["b/docs", "b/x"])
+    merged = merge_reports([a, b], portable="windows")
+    assert [(ni.path, ni.reason) for ni in merged.name_issues] == [("b/docs", "case-collision with b/Docs")]
+    assert merge_reports([a, b], portable="posix").name_issues == []
+
+
+def test_merge_rejects_incomplete_reports():
+    full = AuditReport(base_dir="b", planned_dirs=["b/a"], missing_dirs=["b/a"],
+                       counts={"planned_dirs": 1, "missing_dirs": 1})
+    no_echo = AuditReport(base_dir="b", missing_dirs=["b/c"], counts={"planned_dirs": 1, "missing_dirs": 1})
+    capped = AuditReport(base_dir="b", planned_dirs=["b/d", "b/e"], missing_dirs=["b/d"],
+                         counts={"planned_dirs": 2, "missing_dirs": 2})
+    assert merge_reports([full]).missing_dirs == ["b/a"]
+    with pytest.raises(ValueError, match="Report 2 is incomplete.*planned_dirs"):
+        merge_reports([full, no_echo])
+    with pytest.raises(ValueError, match="missing_dirs"):
+        merge_reports([full, capped])
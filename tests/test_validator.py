@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from foldergen.api.plan_api import make_plan
+from foldergen.core.validator import analyze_template
+
+TEMPLATE = {"dirs": [{"name": "{proj}", "files": [{"name": "cfg.json", "template": "tpl/{kind}.json"}]}]}
+
+
+def test_content_template_vars_count_as_used_and_missing(tmp_path):
+    (tmp_path / "tpl").mkdir()
+    (tmp_path / "tpl" / "shot.json").write_text('{"fps": {fps}, "owner": "{owner|slug}", "x": {"y": 1}}',
+                                                encoding="utf-8")
+    ana = analyze_template(TEMPLATE, {"proj": "P", "kind": "shot", "fps": 24}, source_root=str(tmp_path))
+    assert ana.valid
+    assert ana.used_vars == {"proj", "kind", "fps", "owner"}
+    assert ana.missing_vars == {"owner"}
+    assert ana.node_deps[(0,)] == {"proj", "kind"}
+
+
+def test_unreadable_content_template_is_an_error(tmp_path):
+    ana = analyze_template(TEMPLATE, {"proj": "P", "kind": "nope"}, source_root=str(tmp_path))
+    assert not ana.valid and "nope.json" in ana.errors[0]
+
+
+def test_make_plan_rejects_missing_content_var(tmp_path):
+    (tmp_path / "tpl").mkdir()
+    (tmp_path / "tpl" / "shot.json").write_text('{"owner": "{owner}"}', encoding="utf-8")
+    (tmp_path / "t.json").write_text(json.dumps(TEMPLATE), encoding="utf-8")
+    (tmp_path / "v.json").write_text(json.dumps({"proj": "P", "kind": "shot"}), encoding="utf-8")
+    with pytest.raises(KeyError, match="owner"):
+        make_plan(tmp_path / "t.json", tmp_path / "out", tmp_path / "v.json")